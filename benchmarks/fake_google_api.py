@@ -0,0 +1,183 @@
+"""A local stand-in for the Calendar, Tasks and Gmail REST endpoints used by google_tools.
+
+Point the app at it with JARVIS_GOOGLE_API_ROOT=http://127.0.0.1:<port>. It keeps its data in
+memory, hands out sync tokens / history IDs like the real APIs, and can add latency per request.
+"""
+import re
+import json
+import time
+import uuid
+import threading
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def now_rfc3339():
+    return dt.datetime.now(dt.timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class FakeGoogleState:
+    def __init__(self, n_events=20, n_tasks=20, n_emails=50):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.events, self.tasks, self.messages = {}, {}, {}
+        self.event_versions, self.history = {}, []  # history: (history_id, kind, message_id)
+        self.requests = {"single": 0, "batch": 0, "batched_calls": 0}
+        start = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+        for i in range(n_events):
+            t = start + dt.timedelta(hours=6 * (i + 1))
+            self.add_event({"summary": f"Event {i}", "start": {"dateTime": t.isoformat()},
+                            "end": {"dateTime": (t + dt.timedelta(hours=1)).isoformat()}})
+        for i in range(n_tasks):
+            self.add_task({"title": f"Task {i}"})
+        for i in range(n_emails):
+            self.add_message(f"Subject {i}", f"sender{i}@example.com")
+
+    def _bump(self):
+        self.version += 1
+        return self.version
+
+    def add_event(self, body):
+        event = dict(body, id=body.get("id") or uuid.uuid4().hex, status="confirmed",
+                     htmlLink="http://calendar.local/event", updated=now_rfc3339())
+        self.events[event["id"]] = event
+        self.event_versions[event["id"]] = self._bump()
+        return event
+
+    def cancel_event(self, event_id):
+        self.events[event_id]["status"] = "cancelled"
+        self.event_versions[event_id] = self._bump()
+
+    def add_task(self, body):
+        task = dict(body, id=body.get("id") or uuid.uuid4().hex, status="needsAction",
+                    position=f"{len(self.tasks):020d}", updated=now_rfc3339())
+        self.tasks[task["id"]] = task
+        return task
+
+    def add_message(self, subject, sender, labels=("INBOX", "UNREAD")):
+        message_id = uuid.uuid4().hex[:16]
+        self.messages[message_id] = {
+            "id": message_id, "threadId": message_id, "labelIds": list(labels),
+            "internalDate": str(int(time.time() * 1000) + len(self.messages)),
+            "payload": {"headers": [{"name": "Subject", "value": subject}, {"name": "From", "value": sender},
+                                    {"name": "Date", "value": dt.datetime.now().strftime("%a, %d %b %Y %H:%M:%S")}]},
+        }
+        self.history.append((self._bump(), "messagesAdded", message_id))
+        return message_id
+
+    def mark_read(self, message_id):
+        self.messages[message_id]["labelIds"].remove("UNREAD")
+        self.history.append((self._bump(), "labelsRemoved", message_id))
+
+    # --- Routing ---
+    def handle(self, method, url, body):
+        parsed = urlparse(url)
+        path, qs = parsed.path, {k: v if len(v) > 1 else v[0] for k, v in parse_qs(parsed.query).items()}
+        with self.lock:
+            for pattern, handler in self.routes():
+                match = re.fullmatch(pattern, f"{method} {path}")
+                if match: return handler(qs, body, *match.groups())
+        return 404, {"error": {"code": 404, "message": f"Not found: {method} {path}"}}
+
+    def routes(self):
+        return [
+            (r"GET /calendar/v3/calendars/primary/events", self.list_events),
+            (r"POST /calendar/v3/calendars/primary/events", lambda qs, body: (200, self.add_event(body))),
+            (r"GET /tasks/v1/users/@me/lists", lambda qs, body: (200, {"items": [{"id": "primary-list", "title": "My Tasks"}]})),
+            (r"GET /tasks/v1/lists/([^/]+)/tasks", self.list_tasks),
+            (r"POST /tasks/v1/lists/([^/]+)/tasks", lambda qs, body, _: (200, self.add_task(body))),
+            (r"GET /gmail/v1/users/me/profile", lambda qs, body: (200, {"emailAddress": "me@example.com", "historyId": str(self.version)})),
+            (r"GET /gmail/v1/users/me/messages", self.list_messages),
+            (r"GET /gmail/v1/users/me/messages/([^/]+)", self.get_message),
+            (r"GET /gmail/v1/users/me/history", self.list_history),
+        ]
+
+    def list_events(self, qs, body):
+        if "syncToken" in qs:
+            since = int(qs["syncToken"])
+            items = [e for i, e in self.events.items() if self.event_versions[i] > since]
+        else:
+            time_min = qs.get("timeMin")
+            items = [e for e in self.events.values() if e["status"] != "cancelled"
+                     and (not time_min or e["end"]["dateTime"] >= time_min.replace("Z", "+00:00"))]
+            items.sort(key=lambda e: e["start"]["dateTime"])
+            items = items[:int(qs.get("maxResults", 250))]
+        return 200, {"items": items, "nextSyncToken": str(self.version)}
+
+    def list_tasks(self, qs, body, tasklist):
+        items = list(self.tasks.values())
+        if "updatedMin" in qs: items = [t for t in items if t["updated"] >= qs["updatedMin"]]
+        if qs.get("showCompleted") == "false": items = [t for t in items if t["status"] != "completed"]
+        return 200, {"items": items[:int(qs.get("maxResults", 100))]}
+
+    def list_messages(self, qs, body):
+        labels = qs.get("labelIds", [])
+        labels = [labels] if isinstance(labels, str) else labels
+        ids = [m["id"] for m in sorted(self.messages.values(), key=lambda m: m["internalDate"], reverse=True)
+               if all(label in m["labelIds"] for label in labels)]
+        start, size = int(qs.get("pageToken", 0)), int(qs.get("maxResults", 100))
+        result = {"messages": [{"id": i} for i in ids[start:start + size]]}
+        if start + size < len(ids): result["nextPageToken"] = str(start + size)
+        return 200, result
+
+    def get_message(self, qs, body, message_id):
+        if message_id not in self.messages: return 404, {"error": {"code": 404, "message": "Not Found"}}
+        return 200, self.messages[message_id]
+
+    def list_history(self, qs, body):
+        since = int(qs["startHistoryId"])
+        history = [{"id": str(h), kind: [{"message": {"id": m}}]} for h, kind, m in self.history if h > since]
+        return 200, {"history": history, "historyId": str(self.version)}
+
+
+class FakeGoogleHandler(BaseHTTPRequestHandler):
+    state = None
+    latency = 0.0
+
+    def log_message(self, *args): pass
+
+    def do_GET(self): self.dispatch()
+    def do_POST(self): self.dispatch()
+
+    def dispatch(self):
+        if self.latency: time.sleep(self.latency)
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/batch/"):
+            return self.batch(raw)
+        self.state.requests["single"] += 1
+        status, payload = self.state.handle(self.command, self.path, json.loads(raw) if raw else None)
+        self.reply(status, "application/json", json.dumps(payload).encode())
+
+    def batch(self, raw):
+        """Answers a multipart/mixed batch the way googleapiclient's BatchHttpRequest expects."""
+        self.state.requests["batch"] += 1
+        boundary = self.headers["Content-Type"].split("boundary=")[1].strip('"')
+        out_boundary = "batch_" + uuid.uuid4().hex
+        out = []
+        for part in raw.decode().split("--" + boundary):
+            content_id = re.search(r"Content-ID: <(.*?)>", part)
+            request_line = re.search(r"^(GET|POST|PUT|PATCH|DELETE) (\S+) HTTP", part, re.M)
+            if not content_id or not request_line: continue
+            self.state.requests["batched_calls"] += 1
+            status, payload = self.state.handle(request_line.group(1), request_line.group(2), None)
+            data = json.dumps(payload)
+            out.append(f"--{out_boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id.group(1)}>\r\n\r\n"
+                       f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n{data}\r\n")
+        body = ("".join(out) + f"--{out_boundary}--\r\n").encode()
+        self.reply(200, f"multipart/mixed; boundary={out_boundary}", body)
+
+    def reply(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(state=None, latency=0.0, port=0):
+    """Starts the fake API on a background thread. Returns (server, root_url)."""
+    handler = type("Handler", (FakeGoogleHandler,), {"state": state or FakeGoogleState(), "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
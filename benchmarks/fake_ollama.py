@@ -0,0 +1,148 @@
+"""A local stand-in for the Ollama HTTP API with deterministic embeddings and configurable token latency.
+
+Point the app at it with OLLAMA_HOST=http://127.0.0.1:<port>. Embeddings are hashed bags of
+words, so texts sharing words are close in cosine space and retrieval results are stable
+from run to run. Chat and generate stream a canned reply one token at a time.
+"""
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+import datetime as dt
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_DIM = 768
+DEFAULT_REPLY = ("Certainly, Sir. Here is a considered answer drawn from your notes and the conversation so far. "
+                 "Let me know if you would like me to expand on any part of it.")
+
+
+def embed_text(text, dim=EMBED_DIM):
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    token_latency = 0.0     # seconds between streamed tokens
+    load_latency = 0.0      # delay whenever a model that is not loaded is used (cold load)
+    max_loaded = 0          # like OLLAMA_MAX_LOADED_MODELS: loading one more evicts the least recently used; 0 = no limit
+    model_size = 1 << 30    # bytes reported by /api/ps per loaded model
+    embed_latency = 0.0     # per embedding request
+    reply = DEFAULT_REPLY
+    stats = None
+    loaded = None
+
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            return self.send_json({"models": [{"name": m, "model": m} for m in sorted(self.loaded)]})
+        if self.path == "/api/ps":
+            with self.stats_lock:
+                loaded = list(self.loaded)
+            return self.send_json({"models": [{"name": m, "model": m, "size": self.model_size, "size_vram": self.model_size}
+                                              for m in loaded]})
+        if self.path in ("/", "/api/version"):
+            return self.send_json({"version": "0.0.0-fake"})
+        self.send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with self.stats_lock:
+            self.stats[self.path] = self.stats.get(self.path, 0) + 1
+        if self.path == "/api/embed":
+            inputs = body.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.use_model(body)
+            if self.embed_latency: time.sleep(self.embed_latency)
+            return self.send_json({"model": body.get("model"), "embeddings": [embed_text(t) for t in inputs]})
+        if self.path == "/api/embeddings":
+            if self.embed_latency: time.sleep(self.embed_latency)
+            return self.send_json({"embedding": embed_text(body.get("prompt", ""))})
+        if self.path == "/api/show":
+            return self.send_json({"details": {"parameter_size": "4B"}, "model_info": {"general.context_length": 8192}})
+        if self.path in ("/api/chat", "/api/generate"):
+            return self.generate(body, chat=self.path == "/api/chat")
+        self.send_json({"error": "not found"}, status=404)
+
+    def use_model(self, body):
+        """Loads the request's model if needed (evicting the least recently used one when full),
+        or unloads it when the request asks for keep_alive 0."""
+        model = body.get("model", "")
+        unload = body.get("keep_alive") in (0, "0", "0s")
+        with self.stats_lock:
+            cold = model not in self.loaded
+            if cold and unload and not (body.get("prompt") or body.get("messages")): return
+            if cold:
+                self.stats["loads"] = self.stats.get("loads", 0) + 1
+                while self.max_loaded and len(self.loaded) >= self.max_loaded:
+                    self.loaded.popitem(last=False)
+                    self.stats["evictions"] = self.stats.get("evictions", 0) + 1
+            self.loaded[model] = True
+            self.loaded.move_to_end(model)
+            if unload:
+                del self.loaded[model]
+                self.stats["unloads"] = self.stats.get("unloads", 0) + 1
+        if cold and self.load_latency: time.sleep(self.load_latency)
+
+    def generate(self, body, chat):
+        model = body.get("model", "")
+        self.use_model(body)
+        prompt = body.get("prompt", "") if not chat else (body.get("messages") or [{}])[-1].get("content", "")
+        if not prompt and not chat:  # an empty generate request only loads the model
+            return self.send_json({"model": model, "response": "", "done": True, "done_reason": "load"})
+        tokens = re.findall(r"\S+\s*", self.reply)
+        stream = body.get("stream", True)
+        if not stream:
+            if self.token_latency: time.sleep(self.token_latency * len(tokens))
+            return self.send_json(self.chunk(model, self.reply, chat, done=True))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            if self.token_latency: time.sleep(self.token_latency)
+            self.write_chunk(self.chunk(model, token, chat, done=False))
+        self.write_chunk(self.chunk(model, "", chat, done=True, eval_count=len(tokens)))
+        self.wfile.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def chunk(model, text, chat, done, **extra):
+        payload = {"model": model, "created_at": dt.datetime.now(dt.timezone.utc).isoformat(), "done": done, **extra}
+        if chat: payload["message"] = {"role": "assistant", "content": text}
+        else: payload["response"] = text
+        if done: payload["done_reason"] = "stop"
+        return payload
+
+    def write_chunk(self, payload):
+        data = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(token_latency=0.0, load_latency=0.0, embed_latency=0.0, reply=DEFAULT_REPLY, port=0, max_loaded=0):
+    """Starts the fake server on a background thread. Returns (server, base_url); server.stats counts calls."""
+    handler = type("Handler", (FakeOllamaHandler,), {
+        "token_latency": token_latency, "load_latency": load_latency, "embed_latency": embed_latency,
+        "reply": reply, "stats": {}, "stats_lock": threading.Lock(), "loaded": OrderedDict(), "max_loaded": max_loaded,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.stats = handler.stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,351 @@
+"""Offline benchmark suite for JARVIS.
+
+Runs against local stand-ins for Ollama and the Google APIs, on a synthetic vault and chat
+history in a throwaway directory, so results are repeatable and need no models or accounts.
+
+    python benchmarks/run_benchmarks.py --size small --output before.json
+    python benchmarks/run_benchmarks.py --size small --output after.json --compare before.json
+
+Every metric is a flat "group.name" key in the output JSON. Lower is better, except for
+metrics ending in "_per_s".
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+import fake_ollama
+import fake_google_api
+import synthetic
+
+# --- Configuration ---
+SIZES = {
+    "small": {"notes": 100, "messages": 1_000},
+    "medium": {"notes": 1_000, "messages": 10_000},
+    "large": {"notes": 10_000, "messages": 100_000},
+}
+CHAT_MODEL = "gemma3:4b-it-qat"
+SAMPLES = 50                # repetitions for per-call latency metrics
+CHAT_SAMPLES = 5            # streamed replies per TTFT metric
+APPEND_TURNS = 100          # user/assistant turns appended to one growing session
+REGRESSION_THRESHOLD = 0.10 # --compare flags changes worse than this...
+NOISE_FLOOR_MS = 0.5        # ...unless a latency moved by less than this, which is timer noise
+
+
+def summarize(samples, prefix, scale=1000.0):
+    """p50/p95/mean of `samples` (seconds) as milliseconds."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {f"{prefix}.p50_ms": round(statistics.median(ordered) * scale, 3),
+            f"{prefix}.p95_ms": round(p95 * scale, 3),
+            f"{prefix}.mean_ms": round(statistics.fmean(ordered) * scale, 3)}
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def sample(fn, inputs):
+    return [timed(fn, item)[0] for item in inputs]
+
+
+class NullPlaceholder:
+    """Stands in for st.empty() so the renderer's throttling can be measured without Streamlit."""
+
+    def markdown(self, text): pass
+
+
+# --- Benchmarks ---
+def bench_database(database, n_messages, rng):
+    metrics = {}
+    elapsed, session_ids = timed(synthetic.populate_database, database, n_messages)
+    metrics["db.save_sessions_s"] = round(elapsed, 3)
+    metrics["db.save_messages_per_s"] = round(n_messages / elapsed, 1)
+    metrics["db.sessions"] = len(session_ids)
+
+    # A chat growing turn by turn, the way save_or_update_chat appends after each reply
+    transcript = synthetic.make_history(rng, 2)
+    session_id = database.save_chat_session("Benchmark chat", transcript)
+    def append_turn(turn):
+        transcript.extend(turn)
+        database.append_messages(session_id, transcript)
+    turns = [synthetic.make_history(rng, 2) for _ in range(APPEND_TURNS)]
+    metrics.update(summarize(sample(append_turn, turns), "db.append_turn"))
+
+    picks = [rng.choice(session_ids) for _ in range(SAMPLES)]
+    metrics.update(summarize(sample(database.get_messages_for_session, picks), "db.load_session"))
+    metrics.update(summarize(sample(lambda _: database.get_chat_sessions_page(20), range(SAMPLES)), "db.sidebar_first_page"))
+    # "Load more" pressed until the middle of the history
+    cursor = None
+    for _ in range(len(session_ids) // 40):
+        _, next_cursor = database.get_chat_sessions_page(20, cursor)
+        if next_cursor is None: break
+        cursor = next_cursor
+    metrics.update(summarize(sample(lambda _: database.get_chat_sessions_page(20, cursor), range(SAMPLES)), "db.sidebar_deep_page"))
+    queries = [" ".join(rng.sample(synthetic.WORDS, 2)) for _ in range(SAMPLES)]
+    metrics.update(summarize(sample(database.search_chat_sessions, queries), "db.search"))
+    return metrics
+
+
+def bench_ingest(ingest, embed_model, n_notes, rng):
+    metrics = {}
+    vault_bytes = synthetic.write_vault(ingest.KNOWLEDGE_VAULT_PATH, n_notes)
+    metrics["ingest.vault_mb"] = round(vault_bytes / 1e6, 3)
+    collection = ingest.open_collection()
+
+    elapsed, _ = timed(ingest.run_ingestion, collection=collection, embed_model=embed_model)
+    chunks = collection.count()
+    metrics["ingest.full_s"] = round(elapsed, 3)
+    metrics["ingest.chunks"] = chunks
+    metrics["ingest.files_per_s"] = round(n_notes / elapsed, 1)
+    metrics["ingest.chunks_per_s"] = round(chunks / elapsed, 1)
+
+    elapsed, _ = timed(ingest.run_ingestion, collection=collection, embed_model=embed_model)
+    metrics["ingest.unchanged_rerun_s"] = round(elapsed, 3)
+
+    # One edited note, indexed in place the way consolidation does it
+    notes = sorted(ingest.scan_vault(ingest.KNOWLEDGE_VAULT_PATH))
+    edits = rng.sample(notes, min(10, len(notes)))
+    def edit_and_ingest(path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("\n" + synthetic.make_paragraph(rng) + "\n")
+        ingest.ingest_paths([path], collection=collection, embed_model=embed_model)
+    metrics.update(summarize(sample(edit_and_ingest, edits), "ingest.single_edit"))
+    return metrics
+
+
+def bench_retrieval(ingest, query_cache, embed_model, rng):
+    import chromadb # type: ignore
+    from llama_index.core import VectorStoreIndex # type: ignore
+    from llama_index.vector_stores.chroma import ChromaVectorStore # type: ignore
+    metrics = {}
+
+    def open_index():
+        client = chromadb.PersistentClient(path=ingest.CHROMA_DB_PATH)
+        store = ChromaVectorStore(chroma_collection=client.get_or_create_collection(ingest.COLLECTION_NAME))
+        return VectorStoreIndex.from_vector_store(vector_store=store, embed_model=embed_model)
+    elapsed, index = timed(open_index)
+    metrics["retrieval.open_index_ms"] = round(elapsed * 1000, 3)
+
+    retriever = index.as_retriever(similarity_top_k=2)
+    queries = [synthetic.make_sentence(rng, 4, 10) for _ in range(SAMPLES)]
+    metrics.update(summarize(sample(retriever.retrieve, queries), "retrieval.uncached"))
+
+    cached = query_cache.CachedRetriever(retriever, embed_model, query_cache.QueryCache(ingest.EMBED_MODEL_NAME), 2)
+    metrics.update(summarize(sample(cached.retrieve, queries), "retrieval.cache_miss"))
+    metrics.update(summarize(sample(cached.retrieve, queries), "retrieval.cache_hit"))
+    return metrics, cached
+
+
+def bench_numpy_store(ingest, embed_model, rng):
+    import chromadb # type: ignore
+    import numpy_store
+    from llama_index.core.vector_stores import MetadataFilter, MetadataFilters # type: ignore
+    metrics = {}
+    collection = chromadb.PersistentClient(path=ingest.CHROMA_DB_PATH).get_or_create_collection(ingest.COLLECTION_NAME)
+    for dtype in ("float32", "float16"):
+        path = os.path.join(numpy_store.NUMPY_STORE_PATH, dtype)
+        elapsed, _ = timed(numpy_store.export_collection, collection, ingest.get_collection_version(), path, dtype)
+        metrics[f"numpy_{dtype}.export_ms"] = round(elapsed * 1000, 3)
+        store = numpy_store.NumpyVectorStore(path)
+        elapsed, snapshot = timed(store.snapshot)
+        metrics[f"numpy_{dtype}.open_index_ms"] = round(elapsed * 1000, 3)
+
+        retriever = numpy_store.NumpyRetriever(store, embed_model, similarity_top_k=2)
+        queries = [synthetic.make_sentence(rng, 4, 10) for _ in range(SAMPLES)]
+        metrics.update(summarize(sample(retriever.retrieve, queries), f"numpy_{dtype}.retrieve"))
+        embeddings = [embed_model.get_query_embedding(query) for query in queries]
+        metrics.update(summarize(sample(lambda q: snapshot.search(q, 2), embeddings), f"numpy_{dtype}.search"))
+        metrics[f"numpy_{dtype}.top2_agreement"] = round(numpy_store.compare_with_chroma(collection, snapshot, embeddings, 2), 3)
+
+        file_path = snapshot.record(0)[2]["file_path"]
+        filtered = numpy_store.NumpyRetriever(store, embed_model, similarity_top_k=2,
+                                              filters=MetadataFilters(filters=[MetadataFilter(key="file_path", value=file_path)]))
+        metrics.update(summarize(sample(filtered.retrieve, queries), f"numpy_{dtype}.filtered_retrieve"))
+    return metrics
+
+
+def bench_chat(context_window, stream_renderer, llm, retriever, rng):
+    from llama_index.core.llms import ChatMessage # type: ignore
+    from llama_index.core.chat_engine import ContextChatEngine # type: ignore
+    metrics = {}
+    history = synthetic.make_history(rng, 40)
+    context = context_window.build_context(history, "", 0, 3000)
+    messages = [ChatMessage(role="system", content="You are JARVIS.")] + [
+        ChatMessage(role=m["role"], content=m["content"]) for m in context]
+
+    def stream_llm(prompt):
+        return (chunk.delta for chunk in llm.stream_chat(messages + [ChatMessage(role="user", content=prompt)]))
+    def stream_rag(prompt):
+        engine = ContextChatEngine.from_defaults(retriever=retriever, llm=llm, system_prompt="You are JARVIS.")
+        return engine.stream_chat(prompt).response_gen
+
+    for name, stream in (("llm", stream_llm), ("rag", stream_rag)):
+        ttft, total = [], []
+        for _ in range(CHAT_SAMPLES):
+            started = time.perf_counter()
+            first = None
+            for token in stream(synthetic.make_sentence(rng)):
+                if first is None and token: first = time.perf_counter() - started
+            ttft.append(first)
+            total.append(time.perf_counter() - started)
+        metrics.update(summarize(ttft, f"chat.{name}_ttft"))
+        metrics.update(summarize(total, f"chat.{name}_reply"))
+
+    # Renderer cost on a long reply arriving with no gap between tokens
+    tokens = [f"{synthetic.make_sentence(rng, 1, 2)} " for _ in range(2000)]
+    _, stats = stream_renderer.render_stream(iter(tokens), NullPlaceholder())
+    metrics["render.renders_per_2000_tokens"] = stats["renders"]
+    metrics["render.tokens_per_s"] = round(stats["tokens_per_s"], 1)
+    return metrics
+
+
+def bench_tools(google_tools, google_mirror):
+    metrics = {}
+    calls = [(name, {}) for name in google_tools.READ_TOOLS]
+
+    google_tools.USE_MIRROR = False
+    serial = [timed(lambda: [google_tools.TOOLS[name][0](**kwargs) for name, kwargs in calls])[0] for _ in range(5)]
+    metrics.update(summarize(serial, "tools.live_serial"))
+    concurrent = [timed(google_tools.run_tools_concurrently, calls)[0] for _ in range(5)]
+    metrics.update(summarize(concurrent, "tools.live_concurrent"))
+
+    google_tools.USE_MIRROR = True
+    google_mirror.init_mirror()
+    elapsed, _ = timed(google_mirror.sync_all)
+    metrics["tools.mirror_full_sync_s"] = round(elapsed, 3)
+    incremental = [timed(google_mirror.sync_all)[0] for _ in range(5)]
+    metrics.update(summarize(incremental, "tools.mirror_incremental_sync"))
+    mirrored = [timed(google_tools.run_tools_concurrently, calls)[0] for _ in range(SAMPLES)]
+    metrics.update(summarize(mirrored, "tools.mirror_concurrent"))
+    return metrics
+
+
+# --- Reporting ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def higher_is_better(metric):
+    return metric.endswith("_per_s")
+
+
+def compare(baseline, current):
+    """Prints the relative change of every metric present in both runs. Returns the regressions."""
+    regressions = []
+    print(f"\n{'metric':<42} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric in sorted(set(baseline["metrics"]) & set(current["metrics"])):
+        old, new = baseline["metrics"][metric], current["metrics"][metric]
+        if not old: continue
+        change = (new - old) / old
+        worse = -change if higher_is_better(metric) else change
+        noise = metric.endswith("_ms") and abs(new - old) < NOISE_FLOOR_MS
+        flag = "  REGRESSION" if worse > REGRESSION_THRESHOLD and not noise else ""
+        if flag: regressions.append(metric)
+        print(f"{metric:<42} {old:>12g} {new:>12g} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the JARVIS benchmarks offline against local API stand-ins.")
+    parser.add_argument("--size", choices=SIZES, default="small", help="Preset vault and chat history size.")
+    parser.add_argument("--notes", type=int, help="Number of vault notes (overrides --size).")
+    parser.add_argument("--messages", type=int, help="Number of chat messages (overrides --size).")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds between streamed tokens.")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per embedding request.")
+    parser.add_argument("--google-latency", type=float, default=0.05, help="Seconds per Google API request.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results JSON here.")
+    parser.add_argument("--compare", help="A previous results JSON to compare against.")
+    args = parser.parse_args()
+    notes = args.notes if args.notes is not None else SIZES[args.size]["notes"]
+    n_messages = args.messages if args.messages is not None else SIZES[args.size]["messages"]
+    output = os.path.abspath(args.output) if args.output else None
+    rng = random.Random(args.seed)
+
+    # The app reads these at import time, so the stand-ins must be up before any app module is imported
+    ollama_server, ollama_url = fake_ollama.start_server(token_latency=args.token_latency, embed_latency=args.embed_latency)
+    google_server, google_root = fake_google_api.start_server(latency=args.google_latency)
+    os.environ["OLLAMA_HOST"] = ollama_url
+    os.environ["JARVIS_GOOGLE_API_ROOT"] = google_root
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+    import database
+    import ingest
+    import query_cache
+    import context_window
+    import stream_renderer
+    import google_tools
+    import google_mirror
+    from llama_index.embeddings.ollama import OllamaEmbedding # type: ignore
+    from llama_index.llms.ollama import Ollama # type: ignore
+
+    database.init_db()
+    embed_model = OllamaEmbedding(model_name=ingest.EMBED_MODEL_NAME, base_url=ollama_url, embed_batch_size=ingest.EMBED_BATCH_SIZE)
+    llm = Ollama(model=CHAT_MODEL, base_url=ollama_url, request_timeout=120.0)
+
+    print(f"Benchmarking {notes} notes and {n_messages} messages in {workdir}")
+    metrics = {}
+    started = time.perf_counter()
+    print("--- Database ---")
+    metrics.update(bench_database(database, n_messages, rng))
+    print("--- Ingest ---")
+    metrics.update(bench_ingest(ingest, embed_model, notes, rng))
+    print("--- Retrieval ---")
+    retrieval_metrics, retriever = bench_retrieval(ingest, query_cache, embed_model, rng)
+    metrics.update(retrieval_metrics)
+    print("--- NumPy vector store ---")
+    metrics.update(bench_numpy_store(ingest, embed_model, rng))
+    print("--- Chat ---")
+    metrics.update(bench_chat(context_window, stream_renderer, llm, retriever, rng))
+    print("--- Google tools ---")
+    metrics.update(bench_tools(google_tools, google_mirror))
+    ollama_server.shutdown()
+    google_server.shutdown()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "duration_s": round(time.perf_counter() - started, 1),
+            "params": {"notes": notes, "messages": n_messages, "token_latency": args.token_latency,
+                       "embed_latency": args.embed_latency, "google_latency": args.google_latency, "seed": args.seed},
+            "fake_ollama_calls": dict(ollama_server.stats),
+        },
+        "metrics": metrics,
+    }
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), results)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {REGRESSION_THRESHOLD:.0%}.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
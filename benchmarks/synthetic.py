@@ -0,0 +1,62 @@
+"""Deterministic synthetic data for the benchmarks: knowledge vault notes and chat histories."""
+import os
+import random
+
+WORDS = """
+project meeting deadline budget review plan goal team client report design draft launch budget travel
+flight hotel dinner family birthday gym run marathon training diet sleep habit morning evening weekend
+book article idea research paper experiment result analysis data model python code bug release server
+garden plant water kitchen recipe bread coffee tea market price invoice contract lawyer bank account
+car insurance doctor appointment dentist health exercise yoga meditation focus energy stress calm
+friend sister brother mother father colleague manager mentor interview offer salary promotion career
+course lecture exam study notes summary chapter lesson language spanish japanese music piano guitar
+movie series podcast episode history science space planet ocean mountain forest river city village
+phoenix globex alpha beta gamma delta orion atlas apollo zephyr nova vega lyra sirius polaris
+""".split()
+
+
+def make_sentence(rng, min_words=6, max_words=18):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_paragraph(rng, min_sentences=2, max_sentences=7):
+    return " ".join(make_sentence(rng) for _ in range(rng.randint(min_sentences, max_sentences)))
+
+
+def make_note(rng, index):
+    sections = [f"# Note {index}: {make_sentence(rng, 2, 5)[:-1]}"]
+    for _ in range(rng.randint(2, 8)):
+        sections.append(f"## {make_sentence(rng, 1, 4)[:-1]}")
+        sections.extend(make_paragraph(rng) for _ in range(rng.randint(1, 4)))
+    return "\n\n".join(sections) + "\n"
+
+
+def write_vault(vault_path, n_notes, seed=0, notes_per_folder=200):
+    """Writes `n_notes` markdown notes spread over subfolders. Returns the total size in bytes."""
+    rng = random.Random(seed)
+    total = 0
+    for i in range(n_notes):
+        folder = os.path.join(vault_path, f"folder_{i // notes_per_folder:03d}")
+        os.makedirs(folder, exist_ok=True)
+        text = make_note(rng, i)
+        with open(os.path.join(folder, f"note_{i:05d}.md"), 'w', encoding='utf-8') as f:
+            f.write(text)
+        total += len(text.encode("utf-8"))
+    return total
+
+
+def make_history(rng, n_messages):
+    return [{"role": "user" if i % 2 == 0 else "assistant",
+             "content": make_sentence(rng) if i % 2 == 0 else make_paragraph(rng, 1, 5)} for i in range(n_messages)]
+
+
+def populate_database(database, n_messages, seed=0, session_sizes=(10, 200)):
+    """Saves chat sessions totalling `n_messages` messages. Returns their ids."""
+    rng = random.Random(seed)
+    session_ids, remaining = [], n_messages
+    while remaining > 0:
+        size = min(remaining, rng.randint(*session_sizes))
+        session_ids.append(database.save_chat_session(make_sentence(rng, 3, 6)[:-1], make_history(rng, size)))
+        remaining -= size
+    return session_ids
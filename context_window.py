@@ -0,0 +1,59 @@
+# --- Configuration ---
+KEEP_RECENT_TURNS = 4       # user/assistant exchanges always passed to the model verbatim
+CHARS_PER_TOKEN = 4         # rough estimate; good enough to stay inside a budget without a tokenizer
+MESSAGE_OVERHEAD = 4        # tokens for the role and separators the chat template adds per message
+SUMMARY_WORD_LIMIT = 250
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD
+
+
+def count_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier part of this conversation:\n{summary}"}
+
+
+def build_context(messages, summary, summary_count, budget):
+    """Returns the history to send with the next prompt.
+
+    That is the rolling summary (covering the first `summary_count` messages) followed by the newest
+    unsummarised messages that fit in `budget` tokens. The last KEEP_RECENT_TURNS exchanges are
+    always included, so the work per turn stays bounded however long the conversation gets.
+    """
+    context = [summary_message(summary)] if summary else []
+    used = count_tokens(context)
+    kept = []
+    for i, message in enumerate(reversed(messages[summary_count:])):
+        cost = estimate_tokens(message["content"])
+        if i >= KEEP_RECENT_TURNS * 2 and used + cost > budget: break
+        kept.append(message)
+        used += cost
+    return context + kept[::-1]
+
+
+def messages_to_fold(messages, summary_count, budget):
+    """Returns the messages due to be folded into the summary: everything before the recent turns,
+    once the unsummarised history no longer fits the budget. Returns [] while it still fits."""
+    fold_end = len(messages) - KEEP_RECENT_TURNS * 2
+    if fold_end <= summary_count or count_tokens(messages[summary_count:]) <= budget: return []
+    return messages[summary_count:fold_end]
+
+
+def build_summary_prompt(summary, new_messages):
+    transcript = "\n".join(f"<{m['role']}>: {m['content']}" for m in new_messages)
+    return f"""You maintain the running summary of a conversation between a user and their assistant, JARVIS.
+Update the current summary with the new messages below. Keep every fact, decision, name, date, number and open question that later turns may rely on; drop greetings and filler.
+Write at most {SUMMARY_WORD_LIMIT} words. Respond only with the updated summary.
+
+CURRENT SUMMARY:
+{summary or "(none yet)"}
+
+NEW MESSAGES:
+{transcript}
+
+UPDATED SUMMARY:
+"""
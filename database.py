@@ -1,83 +1,297 @@
+import re
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+import tracing
 
 DATABASE_NAME = "jarvis_history.db"
 
+# --- Connection Management ---
+# Connections are pooled per database file. A thread checks one out on first use and keeps it
+# until the thread exits, when it goes back to the pool. Streamlit runs every rerun on a new
+# thread, so the pool is what lets reruns reuse a connection and its prepared statements;
+# at most POOL_SIZE idle connections are kept per file and the rest are closed.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",  # Safe under WAL; fsyncs only at checkpoints
+    "PRAGMA foreign_keys = ON;",  # Per-connection setting, needed for cascade deletes
+    "PRAGMA busy_timeout = 5000;",
+    "PRAGMA temp_store = MEMORY;",
+)
+STATEMENT_CACHE_SIZE = 128
+POOL_SIZE = 8
+
+_local = threading.local()
+_pools = {}
+_pools_lock = threading.Lock()
+_write_generation = 0
+
+
+class _ThreadConnections(dict):
+    """The connections checked out by one thread; they go back to the pool when the thread exits."""
+
+    def __del__(self):
+        for path, conn in self.items():
+            _release(path, conn)
+
+
+def _pool(path):
+    with _pools_lock:
+        return _pools.setdefault(path, queue.LifoQueue(POOL_SIZE))
+
+
+def _connect(path):
+    # cached_statements keeps parsed statements prepared between calls. A connection is only
+    # ever used by the thread holding it, but it may be a different thread than the one that opened it.
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _release(path, conn):
+    try:
+        if conn.in_transaction: conn.rollback()
+        _pool(path).put_nowait(conn)
+    except Exception:
+        # Pool full, or the interpreter is shutting down
+        try: conn.close()
+        except Exception: pass
+
+
+def get_connection(path=None):
+    """Returns this thread's connection to the given database, taking one from the pool on first use."""
+    path = path or DATABASE_NAME
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = _ThreadConnections()
+    conn = conns.get(path)
+    if conn is None:
+        try: conn = _pool(path).get_nowait()
+        except queue.Empty: conn = _connect(path)
+        conns[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(path=None, changes_history=False):
+    """Yields a cursor inside a transaction that is committed on success and rolled back on error.
+
+    Pass changes_history=True for writes to chat_sessions or messages; only those move the
+    write generation, so mirror, cache and job writes leave the cached sidebar pages alone.
+    """
+    global _write_generation
+    conn = get_connection(path)
+    with conn:
+        yield conn.cursor()
+    if changes_history:
+        with _pools_lock:
+            _write_generation += 1
+
+
+def get_write_generation():
+    """Returns a counter that changes after every committed change to the chat history, for invalidating read caches."""
+    return _write_generation
+
+
+# --- SQL Statements ---
+INSERT_SESSION_SQL = "INSERT INTO chat_sessions (title, message_count, updated_at) VALUES (?, ?, ?)"
+INSERT_MESSAGE_SQL = "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+UPDATE_SESSION_SQL = "UPDATE chat_sessions SET title = ?, updated_at = ? WHERE id = ?"
+SELECT_MESSAGE_COUNT_SQL = "SELECT message_count FROM chat_sessions WHERE id = ?"
+UPDATE_MESSAGE_COUNT_SQL = "UPDATE chat_sessions SET message_count = ?, updated_at = ? WHERE id = ?"
+SELECT_SESSIONS_SQL = "SELECT id, title, updated_at FROM chat_sessions ORDER BY updated_at DESC, id DESC"
+SELECT_SESSIONS_PAGE_SQL = "SELECT id, title, updated_at FROM chat_sessions ORDER BY updated_at DESC, id DESC LIMIT ?"
+SELECT_SESSIONS_PAGE_AFTER_SQL = """
+    SELECT id, title, updated_at FROM chat_sessions
+    WHERE (updated_at, id) < (?, ?) ORDER BY updated_at DESC, id DESC LIMIT ?
+"""
+SELECT_SESSION_SQL = "SELECT id, title, updated_at FROM chat_sessions WHERE id = ?"
+SELECT_SUMMARY_SQL = "SELECT summary, summary_count FROM chat_sessions WHERE id = ?"
+# Leaves updated_at alone: folding old turns into the summary is not activity in the chat
+UPDATE_SUMMARY_SQL = "UPDATE chat_sessions SET summary = ?, summary_count = ? WHERE id = ?"
+# The bare f.rowid column takes its value from the row holding MIN(rank), i.e. each session's best hit
+SEARCH_SESSIONS_SQL = """
+    SELECT s.id, s.title, s.updated_at, f.rowid, MIN(f.rank) AS best_rank
+    FROM messages_fts f JOIN messages m ON m.id = f.rowid JOIN chat_sessions s ON s.id = m.session_id
+    WHERE messages_fts MATCH ? GROUP BY s.id ORDER BY best_rank LIMIT ?
+"""
+SEARCH_SNIPPET_SQL = "SELECT snippet(messages_fts, 0, '**', '**', '…', 12) FROM messages_fts WHERE messages_fts MATCH ? AND rowid = ?"
+
+# --- Full-Text Search ---
+# messages_fts is an external-content FTS5 index over messages.content; triggers keep it in sync
+FTS_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+)
+fts_enabled = True
+SELECT_MESSAGES_SQL = "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id ASC"
+DELETE_SESSION_SQL = "DELETE FROM chat_sessions WHERE id = ?"
+
+
 def init_db():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    # Enable foreign key support to ensure cascade deletes work
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS chat_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER, role TEXT NOT NULL, content TEXT NOT NULL,
-            timestamp TEXT, FOREIGN KEY (session_id) REFERENCES chat_sessions (id) ON DELETE CASCADE
-        )
-    """)
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER, role TEXT NOT NULL, content TEXT NOT NULL,
+                timestamp TEXT, FOREIGN KEY (session_id) REFERENCES chat_sessions (id) ON DELETE CASCADE
+            )
+        """)
+        # message_count is the per-session high-water mark used by append_messages
+        if add_column_if_missing(cursor, "chat_sessions", "message_count", "INTEGER NOT NULL DEFAULT 0"):
+            cursor.execute("""
+                UPDATE chat_sessions SET message_count =
+                    (SELECT COUNT(*) FROM messages WHERE messages.session_id = chat_sessions.id)
+            """)
+        # Rolling summary of the first summary_count messages, maintained by the app's context window
+        add_column_if_missing(cursor, "chat_sessions", "summary", "TEXT")
+        add_column_if_missing(cursor, "chat_sessions", "summary_count", "INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_at ON chat_sessions (updated_at DESC, id DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id, id)")
+        init_fts(cursor)
 
+def init_fts(cursor):
+    global fts_enabled
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+    try:
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+    except sqlite3.OperationalError as e:
+        # SQLite builds without FTS5 still get a working app, just no search
+        print(f"Full-text search disabled: {e}")
+        fts_enabled = False
+        return
+    if not exists:
+        # Index messages saved before the FTS table existed
+        cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Adds a column to an existing table, returning True if it had to be created."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column in columns: return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+@tracing.traced("db.save_chat_session")
 def save_chat_session(title, messages):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO chat_sessions (title) VALUES (?)", (title,))
-    session_id = cursor.lastrowid
-    cursor.executemany("INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-                       [(session_id, m['role'], m['content'], m.get('timestamp', '')) for m in messages])
-    conn.commit()
-    conn.close()
+    with transaction(changes_history=True) as cursor:
+        cursor.execute(INSERT_SESSION_SQL, (title, len(messages), datetime.now()))
+        session_id = cursor.lastrowid
+        cursor.executemany(INSERT_MESSAGE_SQL,
+                           [(session_id, m['role'], m['content'], m.get('timestamp', '')) for m in messages])
     return session_id
 
+@tracing.traced("db.append_messages")
+def append_messages(session_id, messages):
+    """Persists only the messages past the session's high-water mark. Returns how many were added.
+
+    `messages` is the full transcript; everything before the stored message_count is
+    assumed to be saved already, so the cost depends on the new turns only.
+    """
+    with transaction(changes_history=True) as cursor:
+        return _append_messages(cursor, session_id, messages)
+
+def _append_messages(cursor, session_id, messages):
+    row = cursor.execute(SELECT_MESSAGE_COUNT_SQL, (session_id,)).fetchone()
+    if row is None: return 0
+    new_messages = messages[row[0]:]
+    if not new_messages: return 0
+    cursor.executemany(INSERT_MESSAGE_SQL,
+                       [(session_id, m['role'], m['content'], m.get('timestamp', '')) for m in new_messages])
+    cursor.execute(UPDATE_MESSAGE_COUNT_SQL, (len(messages), datetime.now(), session_id))
+    return len(new_messages)
+
 def update_chat_session(session_id, new_title, messages):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE chat_sessions SET title = ?, updated_at = ? WHERE id = ?",
-                   (new_title, datetime.now(), session_id))
-    cursor.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-    cursor.executemany("INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-                       [(session_id, m['role'], m['content'], m.get('timestamp', '')) for m in messages])
-    conn.commit()
-    conn.close()
+    """Appends any unsaved messages and updates the title; nothing already saved is rewritten."""
+    with transaction(changes_history=True) as cursor:
+        cursor.execute(UPDATE_SESSION_SQL, (new_title, datetime.now(), session_id))
+        _append_messages(cursor, session_id, messages)
 
 def get_chat_sessions():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title, updated_at FROM chat_sessions ORDER BY updated_at DESC")
-    sessions = cursor.fetchall()
-    conn.close()
-    return sessions
+    return get_connection().execute(SELECT_SESSIONS_SQL).fetchall()
+
+@tracing.traced("db.get_chat_sessions_page")
+def get_chat_sessions_page(limit, cursor=None):
+    """Returns one page of sessions, newest first, and the cursor for the next page (None at the end).
+
+    Pages are keyed on (updated_at, id) rather than OFFSET, so each page is a single
+    index range scan no matter how deep into the history it is.
+    """
+    conn = get_connection()
+    if cursor is None:
+        sessions = conn.execute(SELECT_SESSIONS_PAGE_SQL, (limit,)).fetchall()
+    else:
+        sessions = conn.execute(SELECT_SESSIONS_PAGE_AFTER_SQL, (cursor[0], cursor[1], limit)).fetchall()
+    next_cursor = (sessions[-1][2], sessions[-1][0]) if len(sessions) == limit else None
+    return sessions, next_cursor
+
+def get_chat_session(session_id):
+    return get_connection().execute(SELECT_SESSION_SQL, (session_id,)).fetchone()
 
+@tracing.traced("db.get_messages_for_session")
 def get_messages_for_session(session_id):
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id ASC", (session_id,))
-    messages = cursor.fetchall()
-    conn.close()
+    messages = get_connection().execute(SELECT_MESSAGES_SQL, (session_id,)).fetchall()
     return [{"role": row[0], "content": row[1], "timestamp": row[2]} for row in messages]
 
+def get_session_summary(session_id):
+    """Returns (summary, number of messages it covers) for a session; (None, 0) if there is none."""
+    row = get_connection().execute(SELECT_SUMMARY_SQL, (session_id,)).fetchone()
+    return (row[0], row[1]) if row else (None, 0)
+
+@tracing.traced("db.save_session_summary")
+def save_session_summary(session_id, summary, summary_count):
+    with transaction() as cursor:
+        cursor.execute(UPDATE_SUMMARY_SQL, (summary, summary_count, session_id))
+
+def build_fts_query(text):
+    """Turns free text into a safe FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", text)
+    if not words: return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+@tracing.traced("db.search_chat_sessions")
+def search_chat_sessions(text, limit=20):
+    """Returns (id, title, updated_at, snippet) for the sessions best matching `text`, best first."""
+    query = build_fts_query(text)
+    if not query or not fts_enabled: return []
+    conn = get_connection()
+    hits = conn.execute(SEARCH_SESSIONS_SQL, (query, limit)).fetchall()
+    # Snippets are only built for the returned hits, not for every matching message
+    return [(session_id, title, updated_at, conn.execute(SEARCH_SNIPPET_SQL, (query, rowid)).fetchone()[0])
+            for session_id, title, updated_at, rowid, _ in hits]
+
 # --- NEW FUNCTIONS ---
 def delete_chat_session(session_id):
     """Deletes a chat session and all its associated messages."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    # With "ON DELETE CASCADE" enabled, this will also delete all associated messages
-    cursor.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
-    conn.commit()
-    conn.close()
+    with transaction(changes_history=True) as cursor:
+        # With "ON DELETE CASCADE" enabled, this will also delete all associated messages
+        cursor.execute(DELETE_SESSION_SQL, (session_id,))
     print(f"Deleted chat session with ID: {session_id}")
 
+@tracing.traced("db.rename_chat_session")
 def rename_chat_session(session_id, new_title):
     """Renames a specific chat session."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE chat_sessions SET title = ?, updated_at = ? WHERE id = ?",
-                   (new_title, datetime.now(), session_id))
-    conn.commit()
-    conn.close()
-    print(f"Renamed chat session {session_id} to '{new_title}'")
\ No newline at end of file
+    with transaction(changes_history=True) as cursor:
+        cursor.execute(UPDATE_SESSION_SQL, (new_title, datetime.now(), session_id))
+    print(f"Renamed chat session {session_id} to '{new_title}'")
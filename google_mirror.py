@@ -0,0 +1,262 @@
+import time
+import threading
+import datetime as dt
+from googleapiclient.errors import HttpError
+import database
+import google_tools
+import tracing
+
+# --- Configuration ---
+MIRROR_DB = "google_mirror.db"
+MIRROR_MAX_AGE = 300        # seconds before a read triggers an incremental sync first
+REFRESH_INTERVAL = 60       # background refresher period
+CALENDAR_PAST_DAYS = 30     # the initial calendar sync starts this far back
+EMAIL_MIRROR_LIMIT = 200    # unread inbox messages fetched by a full Gmail sync
+RESOURCES = ("calendar", "tasks", "gmail")
+
+_initialized = False
+
+# --- Schema ---
+def init_mirror():
+    global _initialized
+    if _initialized: return
+    with database.transaction(MIRROR_DB) as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                resource TEXT PRIMARY KEY, token TEXT, synced_at REAL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS calendar_events (
+                id TEXT PRIMARY KEY, summary TEXT, location TEXT, start_raw TEXT,
+                start_utc TEXT, end_utc TEXT, html_link TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_calendar_events_start ON calendar_events (start_utc)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY, tasklist_id TEXT, title TEXT, notes TEXT, status TEXT,
+                due TEXT, position TEXT, updated TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS emails (
+                id TEXT PRIMARY KEY, thread_id TEXT, subject TEXT, sender TEXT, date TEXT,
+                internal_date INTEGER, unread INTEGER, inbox INTEGER
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_emails_internal_date ON emails (internal_date DESC)")
+    _initialized = True
+
+def get_sync_state(resource):
+    row = database.get_connection(MIRROR_DB).execute(
+        "SELECT token, synced_at FROM sync_state WHERE resource = ?", (resource,)).fetchone()
+    return row if row else (None, None)
+
+def set_sync_state(cursor, resource, token):
+    cursor.execute("INSERT OR REPLACE INTO sync_state (resource, token, synced_at) VALUES (?, ?, ?)",
+                   (resource, token, time.time()))
+
+def clear_resource(resource):
+    """Forgets a resource's rows and sync token, forcing the next sync to be a full one."""
+    table = {"calendar": "calendar_events", "tasks": "tasks", "gmail": "emails"}[resource]
+    with database.transaction(MIRROR_DB) as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("DELETE FROM sync_state WHERE resource = ?", (resource,))
+
+# --- Row Conversion ---
+def to_utc(value):
+    """Normalises a Calendar dateTime or all-day date to a sortable UTC ISO string."""
+    parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=dt.timezone.utc)
+    return parsed.astimezone(dt.timezone.utc).isoformat()
+
+def upsert_event(event, cursor=None):
+    if cursor is None:
+        with database.transaction(MIRROR_DB) as cursor: return upsert_event(event, cursor)
+    if event.get("status") == "cancelled":
+        cursor.execute("DELETE FROM calendar_events WHERE id = ?", (event["id"],))
+        return
+    start = event["start"].get("dateTime", event["start"].get("date"))
+    end = event.get("end", {}).get("dateTime", event.get("end", {}).get("date", start))
+    cursor.execute("INSERT OR REPLACE INTO calendar_events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   (event["id"], event.get("summary", "(No title)"), event.get("location", ""), start,
+                    to_utc(start), to_utc(end), event.get("htmlLink")))
+
+def upsert_task(tasklist_id, task, cursor=None):
+    if cursor is None:
+        with database.transaction(MIRROR_DB) as cursor: return upsert_task(tasklist_id, task, cursor)
+    if task.get("deleted"):
+        cursor.execute("DELETE FROM tasks WHERE id = ?", (task["id"],))
+        return
+    cursor.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (task["id"], tasklist_id, task.get("title", ""), task.get("notes", ""), task.get("status"),
+                    task.get("due"), task.get("position"), task.get("updated")))
+
+def upsert_email(message, cursor):
+    labels = message.get("labelIds", [])
+    cursor.execute("INSERT OR REPLACE INTO emails VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (message["id"], message.get("threadId"), google_tools.get_header(message, 'Subject', 'No Subject'),
+                    google_tools.get_header(message, 'From', 'Unknown Sender'), google_tools.get_header(message, 'Date', ''),
+                    int(message.get("internalDate", 0)), int("UNREAD" in labels), int("INBOX" in labels)))
+
+# --- Incremental Sync ---
+def sync_calendar(service=None):
+    """Applies Calendar changes since the stored syncToken (full sync when there is none or it expired)."""
+    service = service or google_tools.get_service("calendar", "v3")
+    token, _ = get_sync_state("calendar")
+    if token:
+        params = {"syncToken": token}
+    else:
+        time_min = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=CALENDAR_PAST_DAYS)
+        params = {"timeMin": time_min.isoformat().replace("+00:00", "Z")}
+    items, page_token = [], None
+    try:
+        while True:
+            result = service.events().list(calendarId="primary", singleEvents=True, maxResults=2500,
+                                           pageToken=page_token, **params).execute()
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token: break
+    except HttpError as e:
+        if token and e.resp.status == 410:  # sync token expired: start over
+            clear_resource("calendar")
+            return sync_calendar(service)
+        raise
+    with database.transaction(MIRROR_DB) as cursor:
+        for event in items:
+            upsert_event(event, cursor)
+        set_sync_state(cursor, "calendar", result.get("nextSyncToken", token))
+    return len(items)
+
+def sync_tasks(service=None):
+    """Applies Tasks changes since the last sync using updatedMin (full sync on first run)."""
+    service = service or google_tools.get_service("tasks", "v1")
+    tasklist_id = google_tools.get_primary_tasklist_id(service)
+    if not tasklist_id: return 0
+    token, _ = get_sync_state("tasks")
+    # Taken before the request, so changes made while it runs are picked up next time
+    sync_started = dt.datetime.now(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+    params = {"updatedMin": token, "showDeleted": True} if token else {}
+    items, page_token = [], None
+    while True:
+        result = service.tasks().list(tasklist=tasklist_id, maxResults=100, showCompleted=True, showHidden=True,
+                                      pageToken=page_token, **params).execute()
+        items.extend(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token: break
+    with database.transaction(MIRROR_DB) as cursor:
+        if not token: cursor.execute("DELETE FROM tasks")
+        for task in items:
+            upsert_task(tasklist_id, task, cursor)
+        set_sync_state(cursor, "tasks", sync_started)
+    return len(items)
+
+def sync_gmail(service=None):
+    """Applies Gmail changes since the stored historyId (full sync of recent unread mail on first run)."""
+    service = service or google_tools.get_service("gmail", "v1")
+    token, _ = get_sync_state("gmail")
+    if not token:
+        # The profile's historyId is read first so nothing between it and the listing is missed
+        history_id = service.users().getProfile(userId="me").execute()["historyId"]
+        message_ids = google_tools.list_unread_email_ids(service, EMAIL_MIRROR_LIMIT)
+        messages = google_tools.fetch_email_metadata(service, message_ids)
+        with database.transaction(MIRROR_DB) as cursor:
+            cursor.execute("DELETE FROM emails")
+            for message in messages.values():
+                upsert_email(message, cursor)
+            set_sync_state(cursor, "gmail", str(history_id))
+        return len(messages)
+    changed, deleted, page_token, history_id = set(), set(), None, token
+    try:
+        while True:
+            result = service.users().history().list(
+                userId="me", startHistoryId=token, pageToken=page_token,
+                historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]).execute()
+            for record in result.get("history", []):
+                for key in ("messagesAdded", "labelsAdded", "labelsRemoved"):
+                    changed.update(item["message"]["id"] for item in record.get(key, []))
+                deleted.update(item["message"]["id"] for item in record.get("messagesDeleted", []))
+            history_id = result.get("historyId", history_id)
+            page_token = result.get("nextPageToken")
+            if not page_token: break
+    except HttpError as e:
+        if e.resp.status == 404:  # history too old: start over
+            clear_resource("gmail")
+            return sync_gmail(service)
+        raise
+    changed -= deleted
+    messages = google_tools.fetch_email_metadata(service, sorted(changed)) if changed else {}
+    with database.transaction(MIRROR_DB) as cursor:
+        # Messages that could not be fetched were deleted after the history record was written
+        for message_id in deleted | (changed - messages.keys()):
+            cursor.execute("DELETE FROM emails WHERE id = ?", (message_id,))
+        for message in messages.values():
+            upsert_email(message, cursor)
+        set_sync_state(cursor, "gmail", str(history_id))
+    return len(changed) + len(deleted)
+
+SYNC_FUNCTIONS = {"calendar": sync_calendar, "tasks": sync_tasks, "gmail": sync_gmail}
+_sync_locks = {resource: threading.Lock() for resource in RESOURCES}
+
+def sync(resource):
+    with _sync_locks[resource], tracing.span("google.sync", resource=resource) as sync_span:
+        changed = SYNC_FUNCTIONS[resource]()
+        sync_span.set(changed=changed)
+        return changed
+
+def sync_all():
+    for resource in RESOURCES:
+        try:
+            sync(resource)
+        except Exception as e:
+            print(f"Google mirror sync failed for {resource}: {e}")
+
+def ensure_fresh(resource):
+    """Syncs a resource first if its mirror is older than MIRROR_MAX_AGE."""
+    init_mirror()
+    _, synced_at = get_sync_state(resource)
+    if synced_at is None or time.time() - synced_at > MIRROR_MAX_AGE:
+        sync(resource)
+
+# --- Mirror Reads ---
+def upcoming_events(limit):
+    now = dt.datetime.now(dt.timezone.utc).isoformat()
+    rows = database.get_connection(MIRROR_DB).execute(
+        "SELECT start_raw, summary FROM calendar_events WHERE end_utc > ? ORDER BY start_utc LIMIT ?", (now, limit)).fetchall()
+    return [{"start": start, "summary": summary} for start, summary in rows]
+
+def active_tasks(limit):
+    rows = database.get_connection(MIRROR_DB).execute(
+        "SELECT title FROM tasks WHERE status != 'completed' ORDER BY position LIMIT ?", (limit,)).fetchall()
+    return [{"title": title} for (title,) in rows]
+
+def unread_emails(limit):
+    rows = database.get_connection(MIRROR_DB).execute(
+        "SELECT sender, subject, date FROM emails WHERE unread = 1 AND inbox = 1 ORDER BY internal_date DESC LIMIT ?",
+        (limit,)).fetchall()
+    return [{"sender": sender, "subject": subject, "date": date} for sender, subject, date in rows]
+
+# --- Background Refresher ---
+_refresher = None
+
+def start_refresher(interval=REFRESH_INTERVAL):
+    """Starts (once per process) a daemon thread that keeps the mirror current."""
+    global _refresher
+    if _refresher is not None: return _refresher
+    init_mirror()
+    stop_event = threading.Event()
+    def loop():
+        while True:
+            sync_all()
+            if stop_event.wait(interval): return
+    _refresher = threading.Thread(target=loop, name="google-mirror-refresher", daemon=True)
+    _refresher.stop_event = stop_event
+    _refresher.start()
+    return _refresher
+
+def stop_refresher():
+    global _refresher
+    if _refresher is None: return
+    _refresher.stop_event.set()
+    _refresher = None
@@ -1,9 +1,22 @@
 import os.path
+import time
+import queue
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import datetime as dt
+import httplib2
+import google_auth_httplib2
+from google.auth.credentials import AnonymousCredentials
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+import google_mirror
+import tracing
 
 # --- IMPORTANT: NEW SCOPES ---
 # These scopes grant read/write access. The old token.json will be invalid.
@@ -13,42 +26,165 @@ SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly" # Read-Only for Gmail
 ]
 
+HTTP_TIMEOUT = 30
+GMAIL_BATCH_SIZE = 50  # Gmail allows 100 calls per batch but throttles large batches
+GMAIL_LIST_PAGE_SIZE = 500
+# Point every API at a local stand-in (e.g. "http://127.0.0.1:8765") for tests and benchmarks.
+# Requests then go to <root>/<service path> unauthenticated, mirroring the real URL layout.
+GOOGLE_API_ROOT = os.environ.get("JARVIS_GOOGLE_API_ROOT")
+SERVICE_PATHS = {"calendar": "calendar/v3/"}
+BATCH_PATHS = {"gmail": "batch/gmail/v1"}
+# Read tools answer from the local SQLite mirror (see google_mirror.py) and only call the
+# live API if the mirror cannot be synced.
+USE_MIRROR = True
+
+# --- Client Registry ---
+# Credentials are loaded once per process and refreshed in memory. Service clients are built
+# from the discovery documents bundled with googleapiclient and keep their HTTP connections
+# open between calls. httplib2 connections are not thread-safe, so a thread checks a client out
+# of a process-level pool on first use and holds it until the thread exits. Streamlit reruns
+# run on fresh threads, so without the pool every rerun would rebuild its clients.
+CLIENT_POOL_SIZE = 8        # idle clients kept per API
+_creds = None
+_creds_lock = threading.Lock()
+_thread_clients = threading.local()
+_client_pools = {}
+_client_pools_lock = threading.Lock()
+_primary_tasklist_id = None
+
+
+class _ThreadClients(dict):
+    """The clients checked out by one thread; they go back to the pool when the thread exits."""
+
+    def __del__(self):
+        for key, client in self.items():
+            _release_client(key, client)
+
+
+def _client_pool(key):
+    with _client_pools_lock:
+        return _client_pools.setdefault(key, queue.LifoQueue(CLIENT_POOL_SIZE))
+
+
+def _release_client(key, client):
+    try:
+        _client_pool(key).put_nowait(client)
+    except Exception:
+        pass  # Pool full, or the interpreter is shutting down; the client is dropped
+
+
 def get_google_creds():
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    return creds
+    global _creds
+    with _creds_lock:
+        if GOOGLE_API_ROOT:
+            # One shared object, so clients built with it are not rebuilt on every call
+            if _creds is None: _creds = AnonymousCredentials()
+            return _creds
+        creds = _creds
+        if creds is None and os.path.exists("token.json"):
+            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+                creds = flow.run_local_server(port=0)
+            with open("token.json", "w") as token:
+                token.write(creds.to_json())
+        _creds = creds
+        return creds
+
+
+def get_service(api, version):
+    """Returns this thread's client for a Google API, taking one from the pool or building it on first use."""
+    creds = get_google_creds()
+    services = getattr(_thread_clients, "services", None)
+    if services is None:
+        services = _thread_clients.services = _ThreadClients()
+    if (api, version) not in services:
+        try: services[(api, version)] = _client_pool((api, version)).get_nowait()
+        except queue.Empty: services[(api, version)] = (None, None)
+    # A client built with credentials that have since been replaced is rebuilt
+    built_with, service = services[(api, version)]
+    if built_with is not creds:
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        client_options = {"api_endpoint": f"{GOOGLE_API_ROOT}/{SERVICE_PATHS.get(api, '')}"} if GOOGLE_API_ROOT else None
+        service = build(api, version, http=http, cache_discovery=False, static_discovery=True, client_options=client_options)
+        services[(api, version)] = (creds, service)
+    return service
+
+
+def new_batch(service, api, callback):
+    """Starts a batch request, sent to the local stand-in when GOOGLE_API_ROOT is set."""
+    if GOOGLE_API_ROOT:
+        return BatchHttpRequest(callback=callback, batch_uri=f"{GOOGLE_API_ROOT}/{BATCH_PATHS[api]}")
+    return service.new_batch_http_request(callback=callback)
+
+
+def get_primary_tasklist_id(service):
+    """Returns the ID of the first Google Tasks list, looking it up only once per process."""
+    global _primary_tasklist_id
+    if _primary_tasklist_id is None:
+        tasklists = service.tasklists().list(maxResults=1).execute().get('items', [])
+        if tasklists: _primary_tasklist_id = tasklists[0]['id']
+    return _primary_tasklist_id
+
+
+def reset_clients():
+    """Drops cached credentials and clients, e.g. after token.json was replaced."""
+    global _creds, _primary_tasklist_id
+    with _creds_lock:
+        _creds = None
+    _primary_tasklist_id = None
+    _thread_clients.__dict__.pop("services", None)
+    with _client_pools_lock:
+        _client_pools.clear()
+
+def write_through(update, *args):
+    """Applies a successful write to the mirror too; a failure here must not fail the tool."""
+    if not USE_MIRROR: return
+    try:
+        google_mirror.init_mirror()
+        update(*args)
+    except Exception as e:
+        print(f"Could not update the Google mirror: {e}")
+
 
 # --- Google Calendar Tools ---
+def read_from_mirror(resource, read):
+    """Returns mirror rows for a read tool, or None when the live API should be used instead."""
+    if not USE_MIRROR: return None
+    try:
+        google_mirror.ensure_fresh(resource)
+        return read()
+    except Exception as e:
+        print(f"Google mirror unavailable for {resource}, using the live API: {e}")
+        return None
+
+
+@tracing.traced("google.get_calendar_events")
 def get_calendar_events(number_of_events: int = 5) -> str:
     try:
-        creds = get_google_creds()
-        service = build("calendar", "v3", credentials=creds)
-        now = dt.datetime.utcnow().isoformat() + "Z"
-        events_result = service.events().list(calendarId="primary", timeMin=now, maxResults=number_of_events, singleEvents=True, orderBy="startTime").execute()
-        events = events_result.get("items", [])
+        events = read_from_mirror("calendar", lambda: google_mirror.upcoming_events(number_of_events))
+        if events is None:
+            service = get_service("calendar", "v3")
+            now = dt.datetime.utcnow().isoformat() + "Z"
+            events_result = service.events().list(calendarId="primary", timeMin=now, maxResults=number_of_events, singleEvents=True, orderBy="startTime").execute()
+            events = [{"start": e["start"].get("dateTime", e["start"].get("date")), "summary": e.get("summary", "(No title)")}
+                      for e in events_result.get("items", [])]
         if not events: return "No upcoming events found, Sir."
         event_list = "Sir, here are your upcoming events:\n"
         for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            event_list += f"- {start}: {event['summary']}\n"
+            event_list += f"- {event['start']}: {event['summary']}\n"
         return event_list
     except Exception as e: return f"An error occurred: {e}"
 
 
+@tracing.traced("google.create_calendar_event")
 def create_calendar_event(summary: str, start_time: str, end_time: str, location: str = "") -> str:
     if len(start_time) == 19:
         try:
-            creds = get_google_creds()
-            service = build("calendar", "v3", credentials=creds)
+            service = get_service("calendar", "v3")
             event = {
                 'summary': summary,
                 'location': location,
@@ -56,6 +192,7 @@ def create_calendar_event(summary: str, start_time: str, end_time: str, location
                 'end': {'dateTime': end_time }
             }
             created_event = service.events().insert(calendarId='primary', body=event).execute()
+            write_through(google_mirror.upsert_event, created_event)
             return f"Event created successfully, Sir. View it here: {created_event.get('htmlLink')}"
         except Exception as e:
             return f"An error occurred: {e}"
@@ -64,8 +201,7 @@ def create_calendar_event(summary: str, start_time: str, end_time: str, location
             timezone = '+03:00'
             start_time = start_time[:-1]
             end_time = end_time[:-1]
-            creds = get_google_creds()
-            service = build("calendar", "v3", credentials=creds)
+            service = get_service("calendar", "v3")
             event = {
                 'summary': summary,
                 'location': location,
@@ -73,6 +209,7 @@ def create_calendar_event(summary: str, start_time: str, end_time: str, location
                 'end': {'dateTime': f'{end_time+timezone}'} 
             }
             created_event = service.events().insert(calendarId='primary', body=event).execute()
+            write_through(google_mirror.upsert_event, created_event)
             return f"Event created successfully, Sir. View it here: {created_event.get('htmlLink')}"
         except Exception as e:
             return f"An error occurred: {e}"
@@ -81,8 +218,7 @@ def create_calendar_event(summary: str, start_time: str, end_time: str, location
             timezone = '+03:00'
             start_time = start_time[:-6]
             end_time = end_time[:-6]
-            creds = get_google_creds()
-            service = build("calendar", "v3", credentials=creds)
+            service = get_service("calendar", "v3")
             event = {
                 'summary': summary,
                 'location': location,
@@ -90,20 +226,22 @@ def create_calendar_event(summary: str, start_time: str, end_time: str, location
                 'end': {'dateTime': f'{end_time+timezone}'} 
             }
             created_event = service.events().insert(calendarId='primary', body=event).execute()
+            write_through(google_mirror.upsert_event, created_event)
             return f"Event created successfully, Sir. View it here: {created_event.get('htmlLink')}"
         except Exception as e:
             return f"An error occurred: {e}"
 
 # --- Google Tasks Tools ---
+@tracing.traced("google.list_google_tasks")
 def list_google_tasks(max_tasks: int = 20) -> str:
     try:
-        creds = get_google_creds()
-        service = build('tasks', 'v1', credentials=creds)
-        tasklists = service.tasklists().list().execute().get('items', [])
-        if not tasklists: return "No Google Tasks lists found."
-        primary_list_id = tasklists[0]['id']
-        results = service.tasks().list(tasklist=primary_list_id, maxResults=max_tasks, showCompleted=False).execute()
-        items = results.get('items', [])
+        items = read_from_mirror("tasks", lambda: google_mirror.active_tasks(max_tasks))
+        if items is None:
+            service = get_service('tasks', 'v1')
+            primary_list_id = get_primary_tasklist_id(service)
+            if not primary_list_id: return "No Google Tasks lists found."
+            results = service.tasks().list(tasklist=primary_list_id, maxResults=max_tasks, showCompleted=False).execute()
+            items = results.get('items', [])
         if not items: return "No active tasks found, Sir."
         task_list_str = "Sir, here are your current tasks:\n"
         for item in items:
@@ -112,37 +250,132 @@ def list_google_tasks(max_tasks: int = 20) -> str:
     except Exception as e: return f"An error occurred: {e}"
 
 
+@tracing.traced("google.create_google_task")
 def create_google_task(title: str, notes: str = "") -> str:
     try:
-        creds = get_google_creds()
-        service = build('tasks', 'v1', credentials=creds)
-        tasklists = service.tasklists().list().execute().get('items', [])
-        if not tasklists: return "No Google Tasks lists found."
-        primary_list_id = tasklists[0]['id']
+        service = get_service('tasks', 'v1')
+        primary_list_id = get_primary_tasklist_id(service)
+        if not primary_list_id: return "No Google Tasks lists found."
         task = {'title': title, 'notes': notes}
         result = service.tasks().insert(tasklist=primary_list_id, body=task).execute()
+        write_through(google_mirror.upsert_task, primary_list_id, result)
         return f"Task '{result['title']}' created successfully, Sir."
     except Exception as e: return f"An error occurred: {e}"
 
 # --- Gmail Tools ---
+def list_unread_email_ids(service, limit):
+    """Returns up to `limit` unread inbox message IDs, newest first, following list pagination."""
+    ids, page_token = [], None
+    while len(ids) < limit:
+        results = service.users().messages().list(
+            userId="me", maxResults=min(GMAIL_LIST_PAGE_SIZE, limit - len(ids)), labelIds=['INBOX', 'UNREAD'],
+            pageToken=page_token, fields="messages/id,nextPageToken").execute()
+        ids.extend(m['id'] for m in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token: break
+    return ids[:limit]
+
+
+def fetch_email_metadata(service, message_ids):
+    """Fetches Subject/From/Date headers for many messages in as few batch round-trips as possible.
+
+    Returns {message_id: message resource}; messages that failed to fetch are left out.
+    """
+    results = {}
+    def on_response(request_id, response, exception):
+        if exception is None: results[request_id] = response
+        else: print(f"Failed to fetch email {request_id}: {exception}")
+    for i in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        batch = new_batch(service, "gmail", on_response)
+        for message_id in message_ids[i:i + GMAIL_BATCH_SIZE]:
+            batch.add(service.users().messages().get(
+                userId='me', id=message_id, format='metadata', metadataHeaders=['Subject', 'From', 'Date'],
+                fields="id,threadId,labelIds,internalDate,payload/headers"), request_id=message_id)
+        batch.execute()
+    return results
+
+
+def get_header(message, name, default):
+    headers = message.get('payload', {}).get('headers', [])
+    return next((h['value'] for h in headers if h['name'] == name), default)
+
+
+@tracing.traced("google.read_emails")
 def read_emails(number_of_emails: int = 5) -> str:
     try:
-        creds = get_google_creds()
-        service = build("gmail", "v1", credentials=creds)
-        results = service.users().messages().list(userId="me", maxResults=number_of_emails, labelIds=['INBOX', 'UNREAD']).execute()
-        messages = results.get('messages', [])
-        if not messages: return "No new unread emails found, Sir."
+        emails = read_from_mirror("gmail", lambda: google_mirror.unread_emails(number_of_emails))
+        if emails is None:
+            service = get_service("gmail", "v1")
+            message_ids = list_unread_email_ids(service, number_of_emails)
+            messages = fetch_email_metadata(service, message_ids)
+            emails = [{"sender": get_header(messages[i], 'From', 'Unknown Sender'),
+                       "subject": get_header(messages[i], 'Subject', 'No Subject'),
+                       "date": get_header(messages[i], 'Date', '')} for i in message_ids if i in messages]
+        if not emails: return "No new unread emails found, Sir."
         email_list = "Sir, here is a summary of your latest unread emails:\n"
-        for message in messages:
-            msg = service.users().messages().get(userId='me', id=message['id']).execute()
-            headers = msg['payload']['headers']
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown Sender')
-            email_list += f"- From: {sender}\n  Subject: {subject}\n"
+        for email in emails:
+            email_list += f"- From: {email['sender']}\n  Subject: {email['subject']}\n" + (f"  Date: {email['date']}\n" if email['date'] else "")
         return email_list
     except Exception as e: return f"An error occurred: {e}"
 
 
+# --- Async Variants & Concurrent Runner ---
+TOOL_TIMEOUT = 20.0
+TOOL_TIMEOUTS = {"create_calendar_event": 30.0, "create_google_task": 30.0}
+TOOL_WORKERS = 5
+# One long-lived pool for every tool call: asyncio.run() would otherwise create a new default
+# executor, and new threads without clients, on each run_tools_concurrently() call
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="google-tool")
+
+
+def to_async(fn):
+    """Wraps a blocking tool so it runs on a worker thread and can be awaited alongside others."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        # Like asyncio.to_thread, the call runs in a copy of the caller's context (e.g. its trace)
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(_tool_executor, call)
+    return wrapper
+
+
+aget_calendar_events = to_async(get_calendar_events)
+acreate_calendar_event = to_async(create_calendar_event)
+alist_google_tasks = to_async(list_google_tasks)
+acreate_google_task = to_async(create_google_task)
+aread_emails = to_async(read_emails)
+
+# name -> (sync function, async variant); read-only tools can safely run side by side
+TOOLS = {
+    "get_calendar_events": (get_calendar_events, aget_calendar_events),
+    "create_calendar_event": (create_calendar_event, acreate_calendar_event),
+    "list_google_tasks": (list_google_tasks, alist_google_tasks),
+    "create_google_task": (create_google_task, acreate_google_task),
+    "read_emails": (read_emails, aread_emails),
+}
+READ_TOOLS = ("get_calendar_events", "list_google_tasks", "read_emails")
+
+
+async def arun_tools(calls):
+    """Runs independent tool calls concurrently, each under its own timeout.
+
+    `calls` is a list of (tool_name, kwargs). Returns {tool_name: (result_text, seconds)}.
+    """
+    async def run_one(name, kwargs):
+        started = time.perf_counter()
+        timeout = TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+        try:
+            result = await asyncio.wait_for(TOOLS[name][1](**kwargs), timeout)
+        except asyncio.TimeoutError:
+            result = f"The {name} tool timed out after {timeout:g} seconds."
+        return name, (result, time.perf_counter() - started)
+    return dict(await asyncio.gather(*(run_one(name, kwargs) for name, kwargs in calls)))
+
+
+def run_tools_concurrently(calls):
+    """Synchronous entry point for arun_tools, for callers without an event loop (e.g. Streamlit)."""
+    return asyncio.run(arun_tools(calls))
+
+
 #example usages:
 #create_calendar_event(summary="Team sync-up", start_time="2025-06-23T10:00:00+03:00", end_time="2025-06-23T11:00:00+03:00",location="Zoom")
 #create_google_task("Project Phase-1")
\ No newline at end of file
@@ -1,110 +1,446 @@
-import os
-import json
-import hashlib
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, StorageContext
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.ollama import OllamaEmbedding
-import chromadb
-
-# --- Configuration ---
-KNOWLEDGE_VAULT_PATH = "./knowledge_vault"
-CHROMA_DB_PATH = "./chroma_db"
-HASHES_FILE_PATH = "./hashes.json"
-EMBED_MODEL_NAME = 'nomic-embed-text'
-
-# --- Functions ---
-def get_file_hash(filepath):
-    h = hashlib.sha256()
-    with open(filepath, 'rb') as f:
-        while True:
-            chunk = f.read(h.block_size)
-            if not chunk: break
-            h.update(chunk)
-    return h.hexdigest()
-
-def load_hashes():
-    if os.path.exists(HASHES_FILE_PATH):
-        with open(HASHES_FILE_PATH, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_hashes(hashes):
-    with open(HASHES_FILE_PATH, 'w') as f:
-        json.dump(hashes, f, indent=4)
-
-# --- Main Ingestion Logic ---
-print("Starting ingestion process...")
-
-# 1. Initialize ChromaDB client and collection
-db = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-chroma_collection = db.get_or_create_collection("jarvis_memory")
-vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-print("ChromaDB connection established.")
-
-# 2. Handle Deletions ("Orphan" Cleanup)
-print("Scanning for deleted files...")
-# Get all files currently in the database
-db_files = set()
-all_docs_in_db = chroma_collection.get(include=["metadatas"])
-for metadata in all_docs_in_db['metadatas']:
-    if 'file_name' in metadata:
-        db_files.add(metadata['file_name'])
-
-# Get all files currently on disk
-disk_files = set()
-for dirpath, _, filenames in os.walk(KNOWLEDGE_VAULT_PATH):
-    for filename in filenames:
-        disk_files.add(filename)
-
-# Find files that are in the DB but not on disk
-files_to_delete = db_files - disk_files
-if files_to_delete:
-    print(f"Found {len(files_to_delete)} file(s) to delete from memory: {files_to_delete}")
-    for filename in files_to_delete:
-        chroma_collection.delete(where={"file_name": filename})
-    print("Deleted orphan files from ChromaDB.")
-else:
-    print("No files to delete.")
-
-# 3. Handle New and Modified Files
-previous_hashes = load_hashes()
-current_hashes = {}
-files_to_process = []
-print(f"Scanning '{KNOWLEDGE_VAULT_PATH}' for new or modified files...")
-for dirpath, _, filenames in os.walk(KNOWLEDGE_VAULT_PATH):
-    for filename in filenames:
-        if filename.endswith(('.md', '.txt')):
-            filepath = os.path.join(dirpath, filename)
-            file_hash = get_file_hash(filepath)
-            current_hashes[filepath] = file_hash
-            if previous_hashes.get(filepath) != file_hash:
-                files_to_process.append(filepath)
-                print(f"  - Found new/changed file: {filename}")
-
-if not files_to_process:
-    print("No new or modified files to process.")
-else:
-    print(f"Processing {len(files_to_process)} file(s)...")
-    reader = SimpleDirectoryReader(
-        input_files=files_to_process,
-        file_metadata=lambda filename: {"file_name": os.path.basename(filename)}
-    )
-    documents = reader.load_data()
-    print(f"Loaded {len(documents)} document(s).")
-    
-    node_parser = SentenceSplitter(chunk_size=512, chunk_overlap=50)
-    nodes = node_parser.get_nodes_from_documents(documents, show_progress=True)
-    print(f"Split documents into {len(nodes)} nodes (chunks).")
-    
-    embed_model = OllamaEmbedding(model_name=EMBED_MODEL_NAME)
-    index = VectorStoreIndex(
-        nodes, 
-        embed_model=embed_model,
-        storage_context=StorageContext.from_defaults(vector_store=vector_store)
-    )
-    print("Ingestion complete. Memory has been updated.")
-
-# 4. Save the new hashes for the next run
-save_hashes(current_hashes)
-print("File hashes have been updated.")
\ No newline at end of file
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser.node_utils import build_nodes_from_splits
+from llama_index.core.utils import get_tokenizer
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from llama_index.embeddings.ollama import OllamaEmbedding
+import chromadb
+import tracing
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- Configuration ---
+KNOWLEDGE_VAULT_PATH = "./knowledge_vault"
+CHROMA_DB_PATH = "./chroma_db"
+HASHES_FILE_PATH = "./hashes.json"
+MANIFEST_LOCK_PATH = HASHES_FILE_PATH + ".lock"
+# Rewritten after every change to the collection; readers key cached retrieval results on it
+COLLECTION_VERSION_PATH = os.path.join(CHROMA_DB_PATH, "collection_version")
+COLLECTION_NAME = "jarvis_memory"
+EMBED_MODEL_NAME = 'nomic-embed-text'
+SUPPORTED_EXTENSIONS = ('.md', '.txt')
+HASH_BUFFER_SIZE = 1024 * 1024
+HASH_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 50
+# A paragraph whose hash is divisible by this always ends a chunk, so chunk boundaries
+# resynchronise shortly after an edit instead of shifting for the rest of the file.
+BOUNDARY_MODULUS = 4
+# Embedding pipeline: chunks are embedded EMBED_BATCH_SIZE at a time by EMBED_WORKERS threads.
+# At most MAX_PENDING_BATCHES batches are in flight, so reading and splitting wait for the
+# embedder instead of buffering a whole bulk import in memory.
+EMBED_BATCH_SIZE = 32
+EMBED_WORKERS = 4
+MAX_PENDING_BATCHES = EMBED_WORKERS * 2
+UPSERT_BATCH_SIZE = 256
+CHECKPOINT_INTERVAL = 10.0  # seconds between manifest saves during a run
+PROGRESS_INTERVAL = 2.0
+# "numpy" also exports every change to the memory-mapped snapshot in numpy_store.py, which the app then searches
+VECTOR_BACKEND = os.environ.get("JARVIS_VECTOR_BACKEND", "chroma")
+
+# --- Functions ---
+def get_file_hash(filepath):
+    h = hashlib.sha256()
+    buffer = bytearray(HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(filepath, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n: break
+            h.update(view[:n])
+    return h.hexdigest()
+
+def load_hashes():
+    """Loads the manifest of {filepath: {size, mtime_ns, inode, hash}} from the last run."""
+    if not os.path.exists(HASHES_FILE_PATH):
+        return {}
+    with open(HASHES_FILE_PATH, 'r') as f:
+        manifest = json.load(f)
+    # Older runs stored only the hash; those entries get re-hashed once and upgraded
+    return {path: entry if isinstance(entry, dict) else {"hash": entry} for path, entry in manifest.items()}
+
+_manifest_lock = threading.Lock()
+
+@contextmanager
+def manifest_lock():
+    """Serialises manifest read-modify-write between threads and between the app, watcher and worker processes."""
+    with _manifest_lock, open(MANIFEST_LOCK_PATH, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        # Closing the file releases the lock
+        yield
+
+def save_hashes(hashes):
+    # Written aside and swapped in, so a crash never leaves a truncated manifest
+    tmp_path = f"{HASHES_FILE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(hashes, f, indent=4)
+    os.replace(tmp_path, HASHES_FILE_PATH)
+
+def scan_vault(vault_path):
+    """Walks the vault once and returns {filepath: stat_result} for every supported file."""
+    files = {}
+    for dirpath, _, filenames in os.walk(vault_path):
+        for filename in filenames:
+            if filename.endswith(SUPPORTED_EXTENSIONS):
+                filepath = os.path.join(dirpath, filename)
+                files[filepath] = os.stat(filepath)
+    return files
+
+def stat_unchanged(entry, stat):
+    return (entry is not None and entry.get("size") == stat.st_size
+            and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("inode") == stat.st_ino)
+
+def find_changed_files(disk_files, previous_hashes):
+    """Returns (manifest, changed_paths). Only files whose size, mtime or inode moved are read and hashed."""
+    manifest, to_hash = {}, []
+    for filepath, stat in disk_files.items():
+        entry = previous_hashes.get(filepath)
+        if stat_unchanged(entry, stat):
+            manifest[filepath] = entry
+        else:
+            to_hash.append(filepath)
+    changed = []
+    if to_hash:
+        # hashlib releases the GIL on large buffers, so threads hash files in parallel
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            hashes = pool.map(get_file_hash, to_hash)
+            for filepath, file_hash in zip(to_hash, hashes):
+                stat = disk_files[filepath]
+                manifest[filepath] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "inode": stat.st_ino, "hash": file_hash}
+                if previous_hashes.get(filepath, {}).get("hash") != file_hash:
+                    changed.append(filepath)
+    return manifest, changed
+
+def make_chunk_id(filepath, text, occurrence=0):
+    """Deterministic chunk ID: the same text in the same file always maps to the same ID."""
+    file_key = hashlib.sha256(filepath.encode('utf-8')).hexdigest()[:16]
+    chunk_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+    return f"{file_key}-{chunk_hash}" + (f"-{occurrence}" if occurrence else "")
+
+def assign_chunk_ids(nodes):
+    """Replaces the random node IDs with content-hashed ones. Repeated chunks within a file get an occurrence suffix."""
+    seen = {}
+    for node in nodes:
+        filepath = node.metadata["file_path"]
+        key = (filepath, node.text)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        node.id_ = make_chunk_id(filepath, node.text, occurrence)
+    return nodes
+
+def split_document(document, splitter):
+    """Packs whole paragraphs into chunks of up to CHUNK_SIZE tokens with content-defined boundaries.
+
+    Greedy packing alone would shift every later chunk when one paragraph grows, and
+    every shifted chunk gets a new ID and a new embedding. Paragraphs longer than a
+    chunk fall back to the sentence splitter.
+    """
+    tokenizer = get_tokenizer()
+    chunks, current, current_tokens = [], [], 0
+    def flush():
+        nonlocal current, current_tokens
+        if current: chunks.append("\n\n".join(current))
+        current, current_tokens = [], 0
+    for paragraph in re.split(r"\n\s*\n", document.text):
+        paragraph = paragraph.strip()
+        if not paragraph: continue
+        n_tokens = len(tokenizer(paragraph))
+        if n_tokens > CHUNK_SIZE:
+            flush()
+            chunks.extend(splitter.split_text(paragraph))
+            continue
+        if current and current_tokens + n_tokens > CHUNK_SIZE: flush()
+        current.append(paragraph)
+        current_tokens += n_tokens
+        if int(hashlib.sha256(paragraph.encode('utf-8')).hexdigest()[:8], 16) % BOUNDARY_MODULUS == 0: flush()
+    flush()
+    nodes = build_nodes_from_splits(chunks, document)
+    for node in nodes:
+        node.metadata = dict(document.metadata)
+        node.excluded_embed_metadata_keys = list(document.excluded_embed_metadata_keys)
+        node.excluded_llm_metadata_keys = list(document.excluded_llm_metadata_keys)
+    return nodes
+
+def get_file_metadata(filepath):
+    return {"file_name": os.path.basename(filepath), "file_path": filepath}
+
+@tracing.traced("ingest.read")
+def load_file_nodes(filepath, splitter):
+    """Reads one vault file and returns its chunks, each with its stable ID."""
+    reader = SimpleDirectoryReader(input_files=[filepath], filename_as_id=True)
+    nodes = []
+    for document in reader.load_data():
+        # Set here rather than via file_metadata, which receives the reader's normalised path
+        document.metadata = get_file_metadata(filepath)
+        # Bookkeeping keys stay out of the embedded and prompted text
+        document.excluded_embed_metadata_keys = ["file_path"]
+        document.excluded_llm_metadata_keys = ["file_path"]
+        nodes.extend(split_document(document, splitter))
+    return assign_chunk_ids(nodes)
+
+def iter_file_changes(filepaths, collection, splitter):
+    """Read and split stage: yields (filepath, chunks to embed, stale chunk IDs) one file at a time."""
+    for filepath in filepaths:
+        nodes = load_file_nodes(filepath, splitter)
+        # Diff against what is stored: keep matches, drop vanished chunks, embed only new ones
+        stored_ids = set(collection.get(where={"file_path": filepath}, include=[])['ids'])
+        stale_ids = list(stored_ids - {node.id_ for node in nodes})
+        yield filepath, [node for node in nodes if node.id_ not in stored_ids], stale_ids
+
+@tracing.traced("ingest.embed")
+def embed_nodes(embed_model, nodes):
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    for node, embedding in zip(nodes, embed_model.get_text_embedding_batch(texts)):
+        node.embedding = embedding
+    return nodes
+
+@tracing.traced("ingest.upsert")
+def upsert_nodes(collection, nodes):
+    """Writes embedded nodes in the same layout ChromaVectorStore.add uses, so the app reads them unchanged."""
+    metadatas = []
+    for node in nodes:
+        metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+        metadatas.append({k: ("" if v is None else v) for k, v in metadata.items()})
+    collection.upsert(
+        ids=[node.node_id for node in nodes],
+        embeddings=[node.embedding for node in nodes],
+        metadatas=metadatas,
+        documents=[node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes],
+    )
+    mark_collection_changed()
+
+def mark_collection_changed(version=None):
+    """Bumps the collection version, invalidating cached retrieval results in every process."""
+    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+    tmp_path = f"{COLLECTION_VERSION_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(version or f"{time.time_ns()}-{os.getpid()}")
+    os.replace(tmp_path, COLLECTION_VERSION_PATH)
+
+def get_collection_version():
+    try:
+        with open(COLLECTION_VERSION_PATH, 'r') as f: return f.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+def export_snapshot(collection, force=False):
+    """Re-exports the NumPy snapshot after a change. Chroma stays the store of record.
+
+    Exports whenever that backend is selected or a snapshot already exists, so a process started
+    without JARVIS_VECTOR_BACKEND (the watcher, the job worker) still keeps the app's snapshot current.
+    """
+    import numpy_store
+    if not force and VECTOR_BACKEND != "numpy" and numpy_store.current_snapshot() is None: return
+    # The snapshot goes live before the version changes, so no result from the old snapshot is cached under the new version
+    version = f"{time.time_ns()}-{os.getpid()}"
+    numpy_store.export_collection(collection, version)
+    mark_collection_changed(version)
+
+def run_pipeline(filepaths, collection, embed_model, on_file_done):
+    """Streams files through read -> split -> embed -> upsert.
+
+    `on_file_done(filepath)` is called once every chunk of a file is stored, which is
+    what makes an interrupted run resumable: finished files are checkpointed, and the
+    stable IDs let a half-finished file skip the chunks that already made it in.
+    """
+    splitter = SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    pending, upsert_buffer = deque(), []
+    remaining = {}
+    stats = {"queued": 0, "embedded": 0, "files_done": 0, "started": time.perf_counter(), "last_report": 0.0}
+
+    def finish_file(filepath):
+        del remaining[filepath]
+        stats["files_done"] += 1
+        on_file_done(filepath)
+
+    def flush_upserts():
+        if not upsert_buffer: return
+        upsert_nodes(collection, upsert_buffer)
+        for node in upsert_buffer:
+            filepath = node.metadata["file_path"]
+            remaining[filepath] -= 1
+            if remaining[filepath] == 0: finish_file(filepath)
+        upsert_buffer.clear()
+
+    def report(force=False):
+        now = time.perf_counter()
+        if not force and now - stats["last_report"] < PROGRESS_INTERVAL: return
+        stats["last_report"] = now
+        rate = stats["embedded"] / max(now - stats["started"], 1e-9)
+        print(f"  ... {stats['embedded']}/{stats['queued']} chunks embedded ({rate:.1f} chunks/s), "
+              f"{stats['files_done']}/{len(filepaths)} files done")
+
+    def drain_oldest():
+        nodes = pending.popleft().result()
+        stats["embedded"] += len(nodes)
+        upsert_buffer.extend(nodes)
+        if len(upsert_buffer) >= UPSERT_BATCH_SIZE: flush_upserts()
+        report()
+
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        for filepath, new_nodes, stale_ids in iter_file_changes(filepaths, collection, splitter):
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+                mark_collection_changed()
+            remaining[filepath] = len(new_nodes)
+            if not new_nodes:
+                finish_file(filepath)
+                continue
+            stats["queued"] += len(new_nodes)
+            for i in range(0, len(new_nodes), EMBED_BATCH_SIZE):
+                # Backpressure: wait for the oldest batch before queueing more work
+                while len(pending) >= MAX_PENDING_BATCHES: drain_oldest()
+                pending.append(pool.submit(tracing.bind(embed_nodes), embed_model, new_nodes[i:i + EMBED_BATCH_SIZE]))
+        while pending: drain_oldest()
+        flush_upserts()
+    report(force=True)
+    return stats
+
+# --- Incremental API ---
+def open_collection():
+    db = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    return db.get_or_create_collection(COLLECTION_NAME)
+
+def get_embed_model():
+    return OllamaEmbedding(model_name=EMBED_MODEL_NAME, embed_batch_size=EMBED_BATCH_SIZE)
+
+def vault_key(path):
+    """Normalises a path to the './knowledge_vault/...' form used as manifest and file_path key."""
+    return os.path.join(KNOWLEDGE_VAULT_PATH, os.path.relpath(path, KNOWLEDGE_VAULT_PATH))
+
+def update_manifest(entries, removed=(), vault_files=None):
+    """Merges per-file entries into hashes.json without touching the other files' entries.
+
+    `vault_files`, from a full scan, also drops the entries of files that are no longer in the vault.
+    """
+    with manifest_lock():
+        manifest = load_hashes()
+        manifest.update(entries)
+        for path in removed:
+            manifest.pop(path, None)
+        if vault_files is not None:
+            manifest = {path: entry for path, entry in manifest.items() if path in vault_files or path in entries}
+        save_hashes(manifest)
+
+@tracing.traced("ingest.ingest_paths")
+def ingest_paths(paths, collection=None, embed_model=None):
+    """Indexes (or re-indexes) just the given vault files, skipping any whose content is unchanged.
+
+    Pass the app's already-open collection and embed model to avoid reopening Chroma.
+    Missing files are removed from the index. Returns the pipeline stats.
+    """
+    collection = collection if collection is not None else open_collection()
+    keys = [vault_key(path) for path in paths]
+    removed = [key for key in keys if not os.path.exists(key)]
+    if removed: remove_paths(removed, collection)
+    disk_files = {key: os.stat(key) for key in keys if key not in removed}
+    current_hashes, changed = find_changed_files(disk_files, load_hashes())
+    done = {key: entry for key, entry in current_hashes.items() if key not in changed}
+    stats = {"embedded": 0, "files_done": 0}
+    try:
+        if changed:
+            embed_model = embed_model if embed_model is not None else get_embed_model()
+            stats = run_pipeline(changed, collection, embed_model, lambda key: done.__setitem__(key, current_hashes[key]))
+    finally:
+        update_manifest(done)
+    if changed: export_snapshot(collection)
+    return stats
+
+def remove_paths(paths, collection=None):
+    """Deletes every chunk of the given vault files from the index and forgets them in the manifest."""
+    collection = collection if collection is not None else open_collection()
+    keys = [vault_key(path) for path in paths]
+    for key in keys:
+        collection.delete(where={"file_path": key})
+    mark_collection_changed()
+    update_manifest({}, removed=keys)
+    export_snapshot(collection)
+
+# --- Main Ingestion Logic ---
+@tracing.traced("ingest.run")
+def run_ingestion(collection=None, embed_model=None):
+    print("Starting ingestion process...")
+
+    # 1. Initialize ChromaDB client and collection
+    chroma_collection = collection if collection is not None else open_collection()
+    print("ChromaDB connection established.")
+
+    # 2. Handle Deletions ("Orphan" Cleanup)
+    print("Scanning for deleted files...")
+    # Get all files currently on disk (this single walk also feeds step 3)
+    disk_files = scan_vault(KNOWLEDGE_VAULT_PATH)
+
+    # Find chunks whose file is no longer on disk. Chunks written before stable IDs existed
+    # carry no file_path; they are dropped too and their files re-ingested below.
+    ids_to_delete, deleted_files, legacy_file_names = [], set(), set()
+    all_docs_in_db = chroma_collection.get(include=["metadatas"])
+    for chunk_id, metadata in zip(all_docs_in_db['ids'], all_docs_in_db['metadatas']):
+        filepath = (metadata or {}).get('file_path')
+        if filepath is None:
+            ids_to_delete.append(chunk_id)
+            legacy_file_names.add((metadata or {}).get('file_name'))
+        elif filepath not in disk_files:
+            ids_to_delete.append(chunk_id)
+            deleted_files.add(filepath)
+    if ids_to_delete:
+        print(f"Found {len(deleted_files)} file(s) to delete from memory: {deleted_files or ''}")
+        chroma_collection.delete(ids=ids_to_delete)
+        mark_collection_changed()
+        print(f"Deleted {len(ids_to_delete)} orphan chunk(s) from ChromaDB.")
+    else:
+        print("No files to delete.")
+
+    # 3. Handle New and Modified Files
+    previous_hashes = load_hashes()
+    print(f"Scanning '{KNOWLEDGE_VAULT_PATH}' for new or modified files...")
+    current_hashes, files_to_process = find_changed_files(disk_files, previous_hashes)
+    if legacy_file_names:
+        files_to_process += [f for f in disk_files if os.path.basename(f) in legacy_file_names and f not in files_to_process]
+    for filepath in files_to_process:
+        print(f"  - Found new/changed file: {os.path.basename(filepath)}")
+
+    # The checkpoint manifest only lists files whose chunks are fully stored
+    pending_files = set(files_to_process)
+    checkpoint = {path: entry for path, entry in current_hashes.items() if path not in pending_files}
+    last_checkpoint = time.perf_counter()
+    def on_file_done(filepath):
+        nonlocal last_checkpoint
+        checkpoint[filepath] = current_hashes[filepath]
+        if time.perf_counter() - last_checkpoint >= CHECKPOINT_INTERVAL:
+            update_manifest(checkpoint, removed=pending_files - checkpoint.keys(), vault_files=disk_files)
+            last_checkpoint = time.perf_counter()
+
+    try:
+        if not files_to_process:
+            print("No new or modified files to process.")
+        else:
+            print(f"Processing {len(files_to_process)} file(s)...")
+            embed_model = embed_model if embed_model is not None else get_embed_model()
+            stats = run_pipeline(files_to_process, chroma_collection, embed_model, on_file_done)
+            elapsed = time.perf_counter() - stats["started"]
+            print(f"Ingestion complete. Embedded {stats['embedded']} chunk(s) from {stats['files_done']} file(s) "
+                  f"in {elapsed:.1f}s. Memory has been updated.")
+    finally:
+        # 4. Save the new hashes for the next run (also after an interruption, so it can resume)
+        update_manifest(checkpoint, removed=pending_files - checkpoint.keys(), vault_files=disk_files)
+        print("File hashes have been updated.")
+    if ids_to_delete or files_to_process: export_snapshot(chroma_collection)
+
+if __name__ == "__main__":
+    run_ingestion()
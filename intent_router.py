@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter, OrderedDict, deque
+import numpy as np
+
+# --- Configuration ---
+ROUTE_THRESHOLD = 0.50      # a tool intent needs at least this cosine similarity to its nearest prototype...
+MIN_MARGIN = 0.03           # ...and must beat the best plain-chat prototype by this much
+MULTI_INTENT_MARGIN = 0.05  # other read intents this close to the best one are fetched too
+PROMPT_CACHE_SIZE = 512
+PROTOTYPE_CACHE_PATH = "./intent_prototypes.json"
+LABELED_PROMPTS_PATH = "./intent_prompts.jsonl"
+CHAT_INTENT = "chat"
+READ_INTENTS = ("get_calendar_events", "list_google_tasks", "read_emails")
+
+# Example prompts per intent. Routing compares a prompt's embedding with these; keep them
+# disjoint from the labeled prompt set so the evaluation measures generalisation.
+PROTOTYPES = {
+    CHAT_INTENT: [
+        "How are you doing today?",
+        "Explain how photosynthesis works.",
+        "Give me some advice on staying motivated.",
+        "What do you remember about my goals?",
+        "Write a short poem about the ocean.",
+        "Help me think through a difficult decision.",
+        "Make a list of pros and cons for moving abroad.",
+        "What is the difference between a list and a tuple in Python?",
+        "How can I prevent procrastination?",
+        "Summarise what we talked about earlier.",
+        "Tell me a fun fact.",
+        "What should I cook for dinner tonight?",
+    ],
+    "get_calendar_events": [
+        "What's on my calendar?",
+        "Do I have any meetings tomorrow?",
+        "Show me my upcoming events.",
+        "What does my schedule look like this week?",
+        "Am I free on Friday afternoon?",
+        "When is my next appointment?",
+    ],
+    "create_calendar_event": [
+        "Schedule a meeting with Sarah tomorrow at 3pm.",
+        "Add an event to my calendar for Monday morning.",
+        "Book a dentist appointment next Thursday at 10.",
+        "Put lunch with Tom on my calendar for Friday at noon.",
+        "Create a calendar event called project review on the 12th.",
+    ],
+    "list_google_tasks": [
+        "What's on my to-do list?",
+        "Show me my tasks.",
+        "What do I still need to get done?",
+        "List my open tasks.",
+        "Which tasks are pending?",
+    ],
+    "create_google_task": [
+        "Add a task to buy groceries.",
+        "Remind me to call the bank.",
+        "Create a new task: renew my passport.",
+        "Put 'finish the report' on my to-do list.",
+        "Add pay the electricity bill to my tasks.",
+    ],
+    "read_emails": [
+        "Do I have any new emails?",
+        "Check my inbox.",
+        "Read my unread mail.",
+        "Who has emailed me recently?",
+        "Summarise my latest emails.",
+    ],
+}
+
+# The substring router this replaces, kept as the baseline for the evaluation
+KEYWORD_BASELINE = ["calendar", "event", "schedule", "meeting", "email", "mail", "task", "to-do", "list", "gmail", "tasks"]
+
+
+def normalize_prompt(text):
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+def keyword_route(prompt):
+    return "tools" if any(keyword in prompt.lower() for keyword in KEYWORD_BASELINE) else CHAT_INTENT
+
+
+class IntentRouter:
+    """Routes prompts by cosine similarity between their embedding and cached per-intent prototypes.
+
+    Prototype embeddings are computed once per embedding model and kept on disk; prompt
+    embeddings are kept in an in-memory LRU, so a repeated prompt is routed without a model call.
+    The prototypes are loaded on the first route, so building a router never calls the model and
+    an unreachable embedding server only sends prompts to the keyword fallback until it is back.
+    """
+
+    def __init__(self, embed_model, model_name=None, threshold=ROUTE_THRESHOLD, cache_path=PROTOTYPE_CACHE_PATH, verbose=True):
+        self.embed_model = embed_model
+        self.verbose = verbose
+        self.model_name = model_name or getattr(embed_model, "model_name", "default")
+        self.threshold = threshold
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._prompt_cache = OrderedDict()
+        self._prototype_lock = threading.Lock()
+        self._intents = self._matrix = None
+        self.stats = {"routes": Counter(), "cache_hits": 0, "cache_misses": 0, "fallbacks": 0,
+                      "total_ms": 0.0, "recent": deque(maxlen=50)}
+
+    # --- Prototypes ---
+    def _prototype_key(self):
+        payload = json.dumps([self.model_name, PROTOTYPES], sort_keys=True).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def prototypes(self):
+        """Returns (intent per row, normalised prototype matrix), embedding them on first use."""
+        with self._prototype_lock:
+            if self._matrix is None: self._intents, self._matrix = self._load_prototypes()
+            return self._intents, self._matrix
+
+    def _load_prototypes(self):
+        key = self._prototype_key()
+        cached = {}
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as f: cached = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                cached = {}
+        if cached.get("key") != key:
+            texts = [text for examples in PROTOTYPES.values() for text in examples]
+            cached = {"key": key, "model": self.model_name,
+                      "intents": [intent for intent, examples in PROTOTYPES.items() for _ in examples],
+                      "embeddings": self.embed_model.get_text_embedding_batch(texts)}
+            with open(self.cache_path, 'w') as f: json.dump(cached, f)
+        matrix = np.asarray(cached["embeddings"], dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        return np.asarray(cached["intents"]), matrix
+
+    # --- Prompt Embeddings ---
+    def embed_prompt(self, prompt):
+        key = normalize_prompt(prompt)
+        with self._lock:
+            if key in self._prompt_cache:
+                self._prompt_cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._prompt_cache[key], True
+        vector = np.asarray(self.embed_model.get_text_embedding(prompt), dtype=np.float32)
+        vector /= np.linalg.norm(vector) + 1e-12
+        with self._lock:
+            self.stats["cache_misses"] += 1
+            self._prompt_cache[key] = vector
+            if len(self._prompt_cache) > PROMPT_CACHE_SIZE: self._prompt_cache.popitem(last=False)
+        return vector, False
+
+    # --- Routing ---
+    def scores(self, prompt):
+        """Returns ({intent: best prototype similarity}, cached)."""
+        intents, matrix = self.prototypes()
+        vector, cached = self.embed_prompt(prompt)
+        similarities = matrix @ vector
+        return {intent: float(similarities[intents == intent].max()) for intent in PROTOTYPES}, cached
+
+    def route(self, prompt):
+        """Returns (intents, confidence). Intents is [] for plain chat, otherwise the tools to use."""
+        started = time.perf_counter()
+        try:
+            scores, cached = self.scores(prompt)
+        except Exception as e:
+            # Embedding server unavailable: fall back to the keyword router rather than failing the turn,
+            # offering every tool so the agent decides which one it needs
+            print(f"Intent routing failed, using keywords: {e}")
+            self.stats["fallbacks"] += 1
+            return ([i for i in PROTOTYPES if i != CHAT_INTENT] if keyword_route(prompt) != CHAT_INTENT else []), 0.0
+        chat_score = scores.pop(CHAT_INTENT)
+        best_intent, best_score = max(scores.items(), key=lambda item: item[1])
+        confidence = best_score - chat_score
+        if best_score < self.threshold or confidence < MIN_MARGIN:
+            intents = []
+        elif best_intent in READ_INTENTS:
+            intents = [i for i in READ_INTENTS if scores[i] >= max(self.threshold, best_score - MULTI_INTENT_MARGIN)]
+        else:
+            intents = [best_intent]
+        self._record(prompt, intents, confidence, (time.perf_counter() - started) * 1000, cached)
+        return intents, confidence
+
+    def _record(self, prompt, intents, confidence, elapsed_ms, cached):
+        route = "+".join(intents) or CHAT_INTENT
+        self.stats["routes"][route] += 1
+        self.stats["total_ms"] += elapsed_ms
+        self.stats["recent"].append({"prompt": prompt[:80], "route": route, "confidence": round(confidence, 3),
+                                     "ms": round(elapsed_ms, 2), "cached": cached})
+        if self.verbose: print(f"Routed to {route} (confidence {confidence:+.3f}) in {elapsed_ms:.1f} ms{' [cached]' if cached else ''}")
+
+    def summary(self):
+        routed = sum(self.stats["routes"].values())
+        lookups = self.stats["cache_hits"] + self.stats["cache_misses"]
+        return {"routed": routed, "routes": dict(self.stats["routes"]), "fallbacks": self.stats["fallbacks"],
+                "avg_ms": round(self.stats["total_ms"] / routed, 2) if routed else None,
+                "cache_hit_rate": round(self.stats["cache_hits"] / lookups, 3) if lookups else None}
+
+
+# --- Evaluation ---
+def load_labeled_prompts(path=LABELED_PROMPTS_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(router, examples):
+    """Compares the router with the keyword baseline. Misroutes are counted at the chat/tools
+    decision the baseline makes; intent accuracy also requires the right set of tools."""
+    path_errors = {"keyword": 0, "embedding": 0}
+    intent_errors, latencies, mistakes = 0, [], []
+    for example in examples:
+        expected = set(example["intent"].split("+")) - {CHAT_INTENT}
+        expected_path = "tools" if expected else CHAT_INTENT
+        started = time.perf_counter()
+        intents, confidence = router.route(example["prompt"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        path_errors["keyword"] += keyword_route(example["prompt"]) != expected_path
+        path_errors["embedding"] += ("tools" if intents else CHAT_INTENT) != expected_path
+        if set(intents) != expected:
+            intent_errors += 1
+            mistakes.append({"prompt": example["prompt"], "expected": example["intent"],
+                             "got": "+".join(intents) or CHAT_INTENT, "confidence": round(confidence, 3)})
+    latencies.sort()
+    n = len(examples)
+    return {
+        "examples": n,
+        "keyword_misroutes": path_errors["keyword"], "embedding_misroutes": path_errors["embedding"],
+        "keyword_misroute_rate": round(path_errors["keyword"] / n, 3),
+        "embedding_misroute_rate": round(path_errors["embedding"] / n, 3),
+        "embedding_intent_accuracy": round(1 - intent_errors / n, 3),
+        "p50_ms": round(latencies[n // 2], 2), "p95_ms": round(latencies[min(n - 1, int(n * 0.95))], 2),
+        "mistakes": mistakes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the intent router against the keyword baseline.")
+    parser.add_argument("--prompts", default=LABELED_PROMPTS_PATH, help="Labeled prompts (JSONL with prompt and intent).")
+    parser.add_argument("--threshold", type=float, default=ROUTE_THRESHOLD, help="Similarity threshold for tool intents.")
+    parser.add_argument("--json", action="store_true", help="Print the full result as JSON.")
+    args = parser.parse_args()
+
+    import ingest
+    router = IntentRouter(ingest.get_embed_model(), ingest.EMBED_MODEL_NAME, threshold=args.threshold, verbose=False)
+    result = evaluate(router, load_labeled_prompts(args.prompts))
+    if args.json:
+        print(json.dumps(result, indent=4))
+        return
+    for mistake in result["mistakes"]:
+        print(f"  expected {mistake['expected']:<40} got {mistake['got']:<40} {mistake['prompt']}")
+    print(f"{result['examples']} prompts: keyword router misrouted {result['keyword_misroutes']} "
+          f"({result['keyword_misroute_rate']:.1%}), embedding router misrouted {result['embedding_misroutes']} "
+          f"({result['embedding_misroute_rate']:.1%}); intent accuracy {result['embedding_intent_accuracy']:.1%}, "
+          f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
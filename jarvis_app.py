@@ -1,352 +1,560 @@
-import streamlit as st # type: ignore
-import ollama # type: ignore
-from datetime import datetime
-from llama_index.core import VectorStoreIndex # type: ignore
-from llama_index.vector_stores.chroma import ChromaVectorStore # type: ignore
-from llama_index.embeddings.ollama import OllamaEmbedding # type: ignore
-from llama_index.llms.ollama import Ollama # type: ignore
-from llama_index.core.llms import ChatMessage # type: ignore
-import chromadb # type: ignore
-import database
-import os
-import sys
-import subprocess
-from llama_index.core.tools import FunctionTool # type: ignore
-import google_tools
-from llama_index.core.agent import ReActAgent # type: ignore
-
-st.set_page_config(page_title="JARVIS AI", page_icon="🤖", layout="centered", initial_sidebar_state="expanded")
-
-# --- Constants & Model Config ---
-DEFAULT_MODEL = 'phi4-mini:3.8b-q4_K_M'
-MODELS = { "Fast": 'gemma3:1b-it-qat', "Primary": 'gemma3:4b-it-qat', "Smart": 'phi4-mini:3.8b-q4_K_M', "Genius": "qwen3:8b-Q4_K_M"}
-CHROMA_DB_PATH = "./chroma_db"
-EMBED_MODEL_NAME = 'nomic-embed-text'
-KNOWLEDGE_VAULT_PATH = "./knowledge_vault"
-CONSOLIDATED_MEM_PATH = os.path.join(KNOWLEDGE_VAULT_PATH, "consolidated_memories")
-TOOL_KEYWORDS = ["calendar", "event", "schedule", "meeting", "email", "mail", "task", "to-do", "list", "gmail", "tasks"]
-TITLE_LOCK_THRESHOLD = 10 
-
-# --- NEW: Comprehensive CSS for a clean, minimalist sidebar ---
-st.markdown("""
-<style>
-    /* Reduce top padding of the sidebar */
-    [data-testid="stSidebar"] > div:first-child {
-        padding-top: 1rem;
-    }
-    
-    /* Style all buttons within the sidebar for a uniform look */
-    [data-testid="stSidebar"] button {
-        background-color: transparent;
-        border: none;
-        outline: none;
-        color: inherit;
-        text-align: left;
-        justify-content: flex-start;
-        display: block;
-        width: 100%;
-        padding: 5px; /* Base padding */
-        margin: 0;
-        transition: background-color 0.2s;
-        border-radius: 5px;
-    }
-    
-    /* Specific style for the primary "New Chat" button */
-    [data-testid="stSidebar"] .stButton button[kind="primary"] {
-        border: 1px solid rgba(255, 255, 255, 0.3);
-        background-color: transparent;
-    }
-
-    [data-testid="stSidebar"] .stButton button[kind="primary"]:hover {
-        border-color: #ffffff;
-        background-color: rgba(255, 255, 255, 0.1);
-    }
-    
-    /* Dynamic truncation for history titles */
-    [data-testid="stSidebar"] button > div > p {
-        white-space: nowrap;
-        overflow: hidden;
-        text-overflow: ellipsis;
-    }
-
-    /* Hover effect for feedback on all buttons */
-    [data-testid="stSidebar"] button:hover {
-        background-color: rgba(255, 255, 255, 0.1);
-    }
-    
-    /* Reduce gap between columns for action icons */
-    [data-testid="stSidebar"] [data-testid="stHorizontalBlock"] {
-        gap: 0.2rem; /* Tighter gap */
-        padding: 0;
-        margin: -5px 0; /* Reduce vertical space */
-    }
-
-    /* Reduce font size for the action icons */
-    [data-testid="stSidebar"] [data-testid="stHorizontalBlock"] button {
-        font-size: 0.9em;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-database.init_db()
-os.makedirs(CONSOLIDATED_MEM_PATH, exist_ok=True)
-
-# --- Core Functions (no changes from here down) ---
-def get_current_datetime_string():
-    return datetime.now().strftime("%A, %B %d, %Y at %I:%M %p")
-
-
-@st.cache_data
-def get_file_content(filepath):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f: return f.read()
-    except FileNotFoundError: return ""
-
-
-def get_system_prompt():
-    constitution = get_file_content('constitution.md')
-    time_prompt = f"""The current date and time is: {datetime.now().strftime('%A, %B %d, %Y at %I:%M %p')}. 
-    The user's timezone offset is +03:00. When you need to use a tool, use current date and time to convert 
-    relative time statements like 'tomorrow, next wednesday, etc.'"""
-    return f"{constitution}\n\n{time_prompt}"
-
-
-@st.cache_resource
-def get_index():
-    db = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-    chroma_collection = db.get_or_create_collection("jarvis_memory")
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    embed_model = OllamaEmbedding(model_name=EMBED_MODEL_NAME)
-    return VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
-
-def get_agent(chat_history):
-    llm = Ollama(model="gemma3:4b-it-qat", request_timeout=120.0)
-    
-    return ReActAgent.from_tools(
-        tools=all_tools,
-        llm=llm,
-        chat_history=chat_history,
-        verbose=True
-    )
-
-
-def get_chat_engine(chat_history):
-    system_prompt = get_system_prompt()
-    llm = Ollama(model=st.session_state.selected_model, system_prompt=system_prompt)
-    
-    return get_index().as_chat_engine(
-        chat_mode="context", 
-        llm=llm, 
-        chat_history=chat_history, 
-        verbose=True
-    )
-
-
-def generate_text_with_model(model_name, prompt):
-    messages = [{'role': 'user', 'content': prompt}]
-    try:
-        response = ollama.chat(model=model_name, messages=messages)
-        return response['message']['content'].strip()
-    except Exception as e:
-        print(f"Error generating text with {model_name}: {e}")
-        return None
-
-def save_or_update_chat():
-    if not st.session_state.messages or st.session_state.messages[-1]['role'] != 'assistant': return
-    if st.session_state.chat_id is None:
-        title = generate_text_with_model(MODELS["Fast"], f"Create a 3-7 word title for this conevrsation. Do not respond with any fillers. Do not use multiple lines or any formatting option. Respond only with the title.\n\n" + "\n".join([f"<{m['role']}>: {m['content']}" for m in st.session_state.messages]))
-        if not title: title = f"Conversation ({datetime.now().strftime('%H:%M')})"
-        new_id = database.save_chat_session(title, st.session_state.messages)
-        st.session_state.chat_id, st.session_state.current_chat_title = new_id, title
-    else:
-        if len(st.session_state.messages) < TITLE_LOCK_THRESHOLD:
-            new_title = generate_text_with_model(MODELS["Fast"], f"Create a 3-7 word title for this conevrsation. Do not add any fillers. Do not use multilpe lines or any formatting option. Respond only with the title.\n\n" + "\n".join([f"<{m['role']}>: {m['content']}" for m in st.session_state.messages]))
-            if new_title: 
-                database.update_chat_session(st.session_state.chat_id, new_title, st.session_state.messages)
-                st.session_state.current_chat_title = new_title
-        else:
-            database.update_chat_session(st.session_state.chat_id, st.session_state.current_chat_title, st.session_state.messages)
-
-def consolidate_memory(session_id, chat_title, current_time_str):
-    messages = database.get_messages_for_session(session_id)
-    if len(messages) <= 1:
-        st.toast("Not enough content to consolidate.", icon="🤷")
-        return
-    user_messages = [m['content'] for m in messages if m['role'] == 'user']
-    if not user_messages:
-        st.toast("No user messages to consolidate.", icon="🤷")
-        return
-    user_conv_text = "\n".join(user_messages)
-    consolidation_prompt = f"""
-You are a data extraction bot. Your task is to convert a transcript of a user's statements into a structured list of key facts about the user.
-You MUST ignore conversational filler and only extract permanent facts, goals, and decisions.
-CRITICAL: You MUST convert all relative dates and times into absolute dates and times based on the provided current time.
---- PERFECT EXAMPLE ---
-CURRENT TIME: Sunday, June 22, 2025 at 03:00 PM
-USER STATEMENTS (INPUT):
-"I need to prepare for my meeting tomorrow morning with the Globex team."
-"Okay, my main goal is to secure the new budget."
-"Also, remind me that the presentation slides are due next Friday."
-CORRECT OUTPUT:
-*   Has a meeting with the Globex team on June 23, 2025.
-*   Primary goal for the Globex meeting is to secure the new budget.
-*   A presentation slide deck is due on June 27, 2025.
---- END OF EXAMPLE ---
-Now, perform the exact same task on the following real user statements. Provide only the Markdown list of facts.
-CURRENT TIME: {current_time_str}
-USER STATEMENTS (INPUT):
-{user_conv_text}
-CORRECT OUTPUT:
-"""
-    key_facts = generate_text_with_model(MODELS["Primary"], consolidation_prompt)
-    if not key_facts:
-        st.error("Memory consolidation failed. The AI returned an empty response.")
-        return
-    filename_prompt = f"Generate a single, short, descriptive, snake_case filename for these facts. Example: 'project_phoenix_deadline'. 3 words max. Filename only. No commentary.\n\nFacts:\n{key_facts}"
-    filename_base = generate_text_with_model(MODELS["Fast"], filename_prompt)
-    if filename_base:
-        clean_filename = filename_base.split('\n')[0].strip().replace("`", "").replace("*", "")
-        clean_filename = "".join(c if c.isalnum() or c in ['_'] else '_' for c in clean_filename)
-    else:
-        clean_filename = "consolidated_memory"
-    timestamp = datetime.now().strftime("%Y-%m-%d")
-    filename = f"{timestamp}_{clean_filename}.md"
-    filepath = os.path.join(CONSOLIDATED_MEM_PATH, filename)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(f"# Memory from chat: {chat_title}\n\n{key_facts}")
-    try:
-        subprocess.run([sys.executable, "ingest.py"], capture_output=True, text=True, check=True)
-        st.toast(f"Memory consolidated to '{filename}'!", icon="🧠")
-    except subprocess.CalledProcessError as e:
-        st.error(f"Failed to update knowledge base: {e.stderr}")
-
-all_tools = [
-    FunctionTool.from_defaults(fn=google_tools.get_calendar_events, name="get_calendar_events", description="Use this to get a list of upcoming events from Google Calendar."),
-    FunctionTool.from_defaults(fn=google_tools.create_calendar_event, name="create_calendar_event", description="Use this to create a new event on Google Calendar. Requires a summary, start_time, and end_time in full ISO 8601 format including timezone offset."),
-    FunctionTool.from_defaults(fn=google_tools.list_google_tasks, name="list_google_tasks", description="Use this to get a list of current tasks from Google Tasks."),
-    FunctionTool.from_defaults(fn=google_tools.create_google_task, name="create_google_task", description="Use this to create a new task in Google Tasks. Requires a title."),
-    FunctionTool.from_defaults(fn=google_tools.read_emails, name="read_emails", description="Use this to read a summary of the latest unread emails from Gmail."),
-]
-
-if "messages" not in st.session_state: st.session_state.messages = []
-if "selected_model" not in st.session_state: st.session_state.selected_model = DEFAULT_MODEL
-if "chat_id" not in st.session_state: st.session_state.chat_id = None
-if "current_chat_title" not in st.session_state: st.session_state.current_chat_title = "New Chat"
-if "editing_title_id" not in st.session_state: st.session_state.editing_title_id = None
-if "consolidating_id" not in st.session_state: st.session_state.consolidating_id = None
-
-with st.sidebar:
-    st.title("Settings")
-    model_keys, model_values = list(MODELS.keys()), list(MODELS.values())
-    try: current_model_index = model_values.index(st.session_state.selected_model)
-    except ValueError: current_model_index = 0
-    selected_model_name = st.selectbox("Choose a Model", options=model_keys, index=current_model_index)
-    if MODELS[selected_model_name] != st.session_state.selected_model:
-        st.session_state.selected_model = MODELS[selected_model_name]
-        st.rerun()
-    
-    st.title("Actions")
-    if st.button("New Chat", type="primary"):
-        save_or_update_chat()
-        st.session_state.messages, st.session_state.chat_id, st.session_state.current_chat_title = [], None, "New Chat"
-        st.rerun()
-    
-    st.title("History")
-    past_sessions = database.get_chat_sessions()
-    for session_id, title, timestamp in past_sessions:
-        col1, col2, col3, col4 = st.columns([0.6, 0.13, 0.13, 0.13])
-        with col1:
-            if st.button(f"{title}", key=f"session_{session_id}", help=f"{title}\nUpdated on {timestamp}", use_container_width=True):
-                save_or_update_chat()
-                st.session_state.messages = database.get_messages_for_session(session_id)
-                st.session_state.chat_id, st.session_state.current_chat_title = session_id, title
-                st.session_state.editing_title_id = None
-                st.rerun()
-        with col2:
-            is_consolidating = (st.session_state.consolidating_id == session_id)
-            if is_consolidating:
-                st.button("⏳", key=f"consolidate_spin_{session_id}", help="Consolidating...", disabled=True)
-            else:
-                if st.button("🧠", key=f"consolidate_{session_id}", help="Consolidate Memory"):
-                    st.session_state.consolidating_id = session_id
-                    st.rerun()
-        with col3:
-            if st.button("✏️", key=f"edit_{session_id}", help="Rename chat"):
-                st.session_state.editing_title_id = session_id
-                st.rerun()
-        with col4:
-            if st.button("🗑️", key=f"delete_{session_id}", help="Delete chat"):
-                database.delete_chat_session(session_id)
-                if st.session_state.chat_id == session_id:
-                    st.session_state.messages, st.session_state.chat_id, st.session_state.current_chat_title = [], None, "New Chat"
-                st.rerun()
-
-if st.session_state.editing_title_id is not None:
-    session_to_edit = next((s for s in past_sessions if s[0] == st.session_state.editing_title_id), None)
-    if session_to_edit:
-        st.title("Rename Chat")
-        new_title = st.text_input("Enter new title:", value=session_to_edit[1])
-        if st.button("Save Title"):
-            database.rename_chat_session(st.session_state.editing_title_id, new_title)
-            if st.session_state.chat_id == st.session_state.editing_title_id:
-                st.session_state.current_chat_title = new_title
-            st.session_state.editing_title_id = None
-            st.rerun()
-        if st.button("Cancel"):
-            st.session_state.editing_title_id = None
-            st.rerun()
-else:
-    st.title(st.session_state.current_chat_title)
-
-st.caption("JARVIS, Your Assistant.")
-
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-
-if prompt := st.chat_input("How can I help you, Sir?"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    st.rerun()
-
-if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            latest_prompt = st.session_state.messages[-1]["content"]
-            chat_history = [ChatMessage(role=m["role"], content=m["content"]) for m in st.session_state.messages[:-1]]
-            
-            # --- The Router Logic ---
-            use_agent = any(keyword in latest_prompt.lower() for keyword in TOOL_KEYWORDS)
-
-            if use_agent:
-                st.info("Using Google Tools Agent...", icon="🛠️")
-                agent = get_agent(chat_history)
-                streaming_response = agent.stream_chat(latest_prompt)
-            else:
-                # Default to the simple, reliable RAG Chat Engine
-                chat_engine = get_chat_engine(chat_history)
-                streaming_response = chat_engine.stream_chat(latest_prompt)
-
-            # --- Display Response Stream ---
-            message_placeholder = st.empty()
-            full_response = ""
-            # This robustly handles both agent and chat engine responses
-            if hasattr(streaming_response, 'response_gen'):
-                for token in streaming_response.response_gen:
-                    full_response += token
-                    message_placeholder.markdown(full_response + "▌")
-            else: # Handle non-streaming tool outputs
-                full_response = str(streaming_response)
-            
-            message_placeholder.markdown(full_response)
-            
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
-    save_or_update_chat()
-    st.rerun()
-
-# --- Background Consolidation Trigger ---
-if st.session_state.consolidating_id is not None:
-    session_to_consolidate = next((s for s in past_sessions if s[0] == st.session_state.consolidating_id), None)
-    if session_to_consolidate:
-        consolidate_memory(st.session_state.consolidating_id, session_to_consolidate[1], get_current_datetime_string())
-    st.session_state.consolidating_id = None
-    st.rerun()
\ No newline at end of file
+import streamlit as st # type: ignore
+import startup_profile
+startup_profile.begin_run()
+from datetime import datetime
+import database
+import os
+import sys
+import time
+import uuid
+import threading
+import subprocess
+import job_queue
+import session_cache
+import context_window
+import title_worker
+import summary_worker
+import stream_renderer
+import tracing
+import model_residency
+# llama_index, chromadb, ollama and the Google API client are imported where they are first used,
+# so the chat UI paints before they are loaded
+
+st.set_page_config(page_title="JARVIS AI", page_icon="🤖", layout="centered", initial_sidebar_state="expanded")
+
+# --- Constants & Model Config ---
+DEFAULT_MODEL = 'phi4-mini:3.8b-q4_K_M'
+MODELS = { "Fast": 'gemma3:1b-it-qat', "Primary": 'gemma3:4b-it-qat', "Smart": 'phi4-mini:3.8b-q4_K_M', "Genius": "qwen3:8b-Q4_K_M"}
+# Tokens of conversation history sent per turn; the system prompt and retrieved notes come on top
+CONTEXT_BUDGETS = { MODELS["Fast"]: 1500, MODELS["Primary"]: 3000, MODELS["Smart"]: 3000, MODELS["Genius"]: 4000}
+DEFAULT_CONTEXT_BUDGET = 2000
+# Models that follow the ReAct format reliably; the agent runs on the chat model when it is one of them
+AGENT_MODELS = (MODELS["Primary"], MODELS["Smart"], MODELS["Genius"])
+EMBED_MODEL_NAME = 'nomic-embed-text'
+RETRIEVAL_TOP_K = 2
+JOB_POLL_SECONDS = 3
+TITLE_LOCK_THRESHOLD = 10 
+SESSION_PAGE_SIZE = 20
+
+# --- NEW: Comprehensive CSS for a clean, minimalist sidebar ---
+st.markdown("""
+<style>
+    /* Reduce top padding of the sidebar */
+    [data-testid="stSidebar"] > div:first-child {
+        padding-top: 1rem;
+    }
+    
+    /* Style all buttons within the sidebar for a uniform look */
+    [data-testid="stSidebar"] button {
+        background-color: transparent;
+        border: none;
+        outline: none;
+        color: inherit;
+        text-align: left;
+        justify-content: flex-start;
+        display: block;
+        width: 100%;
+        padding: 5px; /* Base padding */
+        margin: 0;
+        transition: background-color 0.2s;
+        border-radius: 5px;
+    }
+    
+    /* Specific style for the primary "New Chat" button */
+    [data-testid="stSidebar"] .stButton button[kind="primary"] {
+        border: 1px solid rgba(255, 255, 255, 0.3);
+        background-color: transparent;
+    }
+
+    [data-testid="stSidebar"] .stButton button[kind="primary"]:hover {
+        border-color: #ffffff;
+        background-color: rgba(255, 255, 255, 0.1);
+    }
+    
+    /* Dynamic truncation for history titles */
+    [data-testid="stSidebar"] button > div > p {
+        white-space: nowrap;
+        overflow: hidden;
+        text-overflow: ellipsis;
+    }
+
+    /* Hover effect for feedback on all buttons */
+    [data-testid="stSidebar"] button:hover {
+        background-color: rgba(255, 255, 255, 0.1);
+    }
+    
+    /* Reduce gap between columns for action icons */
+    [data-testid="stSidebar"] [data-testid="stHorizontalBlock"] {
+        gap: 0.2rem; /* Tighter gap */
+        padding: 0;
+        margin: -5px 0; /* Reduce vertical space */
+    }
+
+    /* Reduce font size for the action icons */
+    [data-testid="stSidebar"] [data-testid="stHorizontalBlock"] button {
+        font-size: 0.9em;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+@st.cache_resource
+def init_database():
+    # Once per process: init_db is a write transaction, so running it on every rerun would invalidate the sidebar cache
+    database.init_db()
+
+init_database()
+
+
+@st.cache_resource
+def start_google_mirror():
+    import google_tools
+    import google_mirror
+    # Only once Google access has been granted: the background refresher must never open an OAuth flow
+    if os.path.exists("token.json") or google_tools.GOOGLE_API_ROOT:
+        google_mirror.start_refresher()
+
+
+@st.cache_resource
+def preload_backends():
+    """Imports the chat stack on a background thread once the UI is up, so the first message does not wait for it."""
+    def preload():
+        started = time.perf_counter()
+        import query_cache
+        import intent_router
+        from llama_index.llms.ollama import Ollama # type: ignore
+        from llama_index.embeddings.ollama import OllamaEmbedding # type: ignore
+        from llama_index.core.chat_engine import ContextChatEngine # type: ignore
+        from llama_index.vector_stores.chroma import ChromaVectorStore # type: ignore
+        print(f"Preloaded the chat stack in {time.perf_counter() - started:.1f}s")
+    threading.Thread(target=preload, name="preload-backends", daemon=True).start()
+
+# --- Core Functions (no changes from here down) ---
+def get_current_datetime_string():
+    return datetime.now().strftime("%A, %B %d, %Y at %I:%M %p")
+
+
+@st.cache_data
+def get_file_content(filepath):
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f: return f.read()
+    except FileNotFoundError: return ""
+
+
+@st.cache_data(max_entries=4)
+def build_system_prompt(current_time):
+    constitution = get_file_content('constitution.md')
+    time_prompt = f"""The current date and time is: {current_time}. 
+    The user's timezone offset is +03:00. When you need to use a tool, use current date and time to convert 
+    relative time statements like 'tomorrow, next wednesday, etc.'"""
+    return f"{constitution}\n\n{time_prompt}"
+
+
+def get_system_prompt():
+    # The prompt only changes once a minute, so it is formatted once per minute
+    return build_system_prompt(datetime.now().strftime('%A, %B %d, %Y at %I:%M %p'))
+
+
+@st.cache_data(max_entries=100)
+def get_sessions_page(cursor, write_generation):
+    # write_generation is part of the cache key, so any database write invalidates cached pages
+    return database.get_chat_sessions_page(SESSION_PAGE_SIZE, cursor)
+
+
+@st.cache_resource
+def get_collection():
+    import ingest
+    return ingest.open_collection()
+
+
+@st.cache_resource
+def get_embed_model():
+    from llama_index.embeddings.ollama import OllamaEmbedding # type: ignore
+    return OllamaEmbedding(model_name=EMBED_MODEL_NAME, keep_alive=model_residency.PINNED_KEEP_ALIVE)
+
+
+@st.cache_resource
+def get_router():
+    import intent_router
+    return intent_router.IntentRouter(get_embed_model(), EMBED_MODEL_NAME)
+
+
+@st.cache_resource
+def get_residency():
+    return model_residency.start_manager(EMBED_MODEL_NAME)
+
+
+@st.cache_resource
+def get_llm(model_name, keep_alive=model_residency.PINNED_KEEP_ALIVE, request_timeout=120.0):
+    from llama_index.llms.ollama import Ollama # type: ignore
+    return Ollama(model=model_name, keep_alive=keep_alive, request_timeout=request_timeout)
+
+
+@st.cache_resource
+def get_session_cache():
+    return session_cache.SessionCache()
+
+
+def to_chat_message(message):
+    from llama_index.core.llms import ChatMessage # type: ignore
+    return ChatMessage(role=message["role"], content=message["content"])
+
+
+@st.cache_resource
+def get_vector_retriever():
+    import ingest
+    if ingest.VECTOR_BACKEND == "numpy":
+        import numpy_store
+        # Opening the snapshot only maps its files; Chroma is opened only when a query finds the snapshot missing or stale
+        return numpy_store.NumpyRetriever(numpy_store.NumpyVectorStore(), get_embed_model(), RETRIEVAL_TOP_K,
+                                          open_collection=get_collection)
+    from llama_index.core import VectorStoreIndex # type: ignore
+    from llama_index.vector_stores.chroma import ChromaVectorStore # type: ignore
+    index = VectorStoreIndex.from_vector_store(vector_store=ChromaVectorStore(chroma_collection=get_collection()),
+                                               embed_model=get_embed_model())
+    return index.as_retriever(similarity_top_k=RETRIEVAL_TOP_K)
+
+@st.cache_resource
+def get_retriever():
+    import query_cache
+    # Repeated questions skip both the query embedding and the Chroma search until ingest changes the collection
+    return query_cache.CachedRetriever(get_vector_retriever(), get_embed_model(), query_cache.start_cache(EMBED_MODEL_NAME), RETRIEVAL_TOP_K)
+
+def get_agent_model():
+    # Reusing the loaded chat model saves a second model load (and often an eviction) per tool turn
+    selected = st.session_state.selected_model
+    return selected if selected in AGENT_MODELS else MODELS["Primary"]
+
+@st.cache_resource
+def get_tools():
+    # Built on the first tool turn; most sessions never need the Google API client
+    import google_tools
+    from llama_index.core.tools import FunctionTool # type: ignore
+    return [
+        FunctionTool.from_defaults(fn=google_tools.get_calendar_events, async_fn=google_tools.aget_calendar_events, name="get_calendar_events", description="Use this to get a list of upcoming events from Google Calendar."),
+        FunctionTool.from_defaults(fn=google_tools.create_calendar_event, async_fn=google_tools.acreate_calendar_event, name="create_calendar_event", description="Use this to create a new event on Google Calendar. Requires a summary, start_time, and end_time in full ISO 8601 format including timezone offset."),
+        FunctionTool.from_defaults(fn=google_tools.list_google_tasks, async_fn=google_tools.alist_google_tasks, name="list_google_tasks", description="Use this to get a list of current tasks from Google Tasks."),
+        FunctionTool.from_defaults(fn=google_tools.create_google_task, async_fn=google_tools.acreate_google_task, name="create_google_task", description="Use this to create a new task in Google Tasks. Requires a title."),
+        FunctionTool.from_defaults(fn=google_tools.read_emails, async_fn=google_tools.aread_emails, name="read_emails", description="Use this to read a summary of the latest unread emails from Gmail."),
+    ]
+
+def get_agent(history):
+    from llama_index.core.agent import ReActAgent # type: ignore
+    model_name = get_agent_model()
+    keep_alive = get_residency().keep_alive(model_name)
+    # The residency setting is part of the key, so a cached agent never keeps a keep_alive that has since changed
+    agent = get_session_cache().get((st.session_state.conversation_id, "agent", model_name, keep_alive), lambda: ReActAgent.from_tools(
+        tools=get_tools(),
+        llm=get_llm(model_name, keep_alive),
+        verbose=True
+    ))
+    session_cache.sync_memory(agent.memory, history, to_chat_message)
+    return agent
+
+
+def stream_tool_answer(prompt, chat_history, tool_results):
+    """Streams the chat model's answer to a prompt whose tool results were fetched up front."""
+    from llama_index.core.llms import ChatMessage # type: ignore
+    llm = get_llm(st.session_state.selected_model, get_residency().keep_alive(st.session_state.selected_model))
+    results_text = "\n\n".join(f"[{name}]\n{result}" for name, (result, _) in tool_results.items())
+    messages = [ChatMessage(role="system", content=get_system_prompt()), *chat_history, ChatMessage(role="user", content=(
+        f"{prompt}\n\nThe Google tools for this request have already been run. Answer using their results "
+        f"below and do not call any tools.\n\n{results_text}"))]
+    return (chunk.delta for chunk in llm.stream_chat(messages))
+
+
+def get_chat_engine(history):
+    from llama_index.core.llms import ChatMessage # type: ignore
+    from llama_index.core.chat_engine import ContextChatEngine # type: ignore
+    system_prompt = get_system_prompt()
+    model_name = st.session_state.selected_model
+    keep_alive = get_residency().keep_alive(model_name)
+    chat_engine = get_session_cache().get((st.session_state.conversation_id, "chat", model_name, keep_alive), lambda: ContextChatEngine.from_defaults(
+        retriever=get_retriever(),
+        llm=get_llm(model_name, keep_alive),
+        system_prompt=system_prompt,
+        verbose=True
+    ))
+    if chat_engine._prefix_messages[0].content != system_prompt:
+        # Cached engines keep their system message, so refresh it when the time in it changes
+        chat_engine._prefix_messages = [ChatMessage(role="system", content=system_prompt)]
+    session_cache.sync_memory(chat_engine._memory, history, to_chat_message)
+    return chat_engine
+
+
+def generate_text_with_model(model_name, prompt, keep_alive=None):
+    import ollama # type: ignore
+    messages = [{'role': 'user', 'content': prompt}]
+    try:
+        response = ollama.chat(model=model_name, messages=messages, keep_alive=keep_alive)
+        return response['message']['content'].strip()
+    except Exception as e:
+        print(f"Error generating text with {model_name}: {e}")
+        return None
+
+@st.cache_resource
+def get_title_worker():
+    residency = get_residency()
+    # Titles wait for the current turn and use the chat model if the fast one would evict it
+    return title_worker.TitleWorker(lambda prompt: residency.run_auxiliary(
+        MODELS["Fast"], lambda model, keep_alive: generate_text_with_model(model, prompt, keep_alive)))
+
+def save_or_update_chat():
+    if not st.session_state.messages or st.session_state.messages[-1]['role'] != 'assistant': return
+    if st.session_state.chat_id is None:
+        # Saved under a placeholder right away; the title worker replaces it in the background
+        title = f"Conversation ({datetime.now().strftime('%H:%M')})"
+        new_id = database.save_chat_session(title, st.session_state.messages)
+        st.session_state.chat_id, st.session_state.current_chat_title = new_id, title
+    else:
+        # Only the new turn needs to be written
+        database.append_messages(st.session_state.chat_id, st.session_state.messages)
+    if len(st.session_state.messages) < TITLE_LOCK_THRESHOLD:
+        get_title_worker().request(st.session_state.chat_id, st.session_state.messages)
+
+@st.cache_resource
+def get_summary_worker():
+    residency = get_residency()
+    # Same model choice as titles: wait for the turn, and use the chat model if the fast one would evict it
+    return summary_worker.SummaryWorker(lambda prompt: residency.run_auxiliary(
+        MODELS["Fast"], lambda model, keep_alive: generate_text_with_model(model, prompt, keep_alive)))
+
+def update_rolling_summary():
+    """Queues the turns that no longer fit the model's context budget to be folded into the session's summary."""
+    if st.session_state.chat_id is None: return
+    summary, summary_count = st.session_state.summary
+    budget = CONTEXT_BUDGETS.get(st.session_state.selected_model, DEFAULT_CONTEXT_BUDGET)
+    to_fold = context_window.messages_to_fold(st.session_state.messages, summary_count, budget)
+    if to_fold: get_summary_worker().request(st.session_state.chat_id, summary, summary_count, to_fold)
+
+@st.cache_resource
+def get_worker_launcher():
+    return {"started_at": 0.0}
+
+def ensure_job_worker():
+    """Starts a background job worker process unless one is already running."""
+    launcher = get_worker_launcher()
+    # A worker that was just started may not have sent its first heartbeat yet
+    if job_queue.worker_alive() or time.time() - launcher["started_at"] < job_queue.WORKER_STALE_SECONDS: return
+    launcher["started_at"] = time.time()
+    subprocess.Popen([sys.executable, "job_worker.py"], start_new_session=True)
+
+def queue_consolidation(session_id, chat_title):
+    residency = get_residency()
+    facts_model, filename_model = residency.model_for(MODELS["Primary"]), residency.model_for(MODELS["Fast"])
+    job_id = job_queue.enqueue("consolidate", {
+        "session_id": session_id, "chat_title": chat_title, "current_time": get_current_datetime_string(),
+        "facts_model": facts_model, "filename_model": filename_model,
+        "keep_alive": {model: residency.keep_alive(model) for model in (facts_model, filename_model)},
+    }, dedupe_key=str(session_id))
+    st.session_state.watched_jobs[job_id] = chat_title
+    ensure_job_worker()
+
+def show_job_updates():
+    """Reports jobs queued from this browser session once they finish."""
+    finished = False
+    for job_id, (status, attempts, error, result) in job_queue.get_jobs(list(st.session_state.watched_jobs)).items():
+        if status == "done":
+            st.toast(f"Memory consolidated to '{result['filename']}'!", icon="🧠")
+        elif status == "failed":
+            st.toast(f"Memory consolidation failed: {error}", icon="⚠️")
+        else:
+            continue
+        del st.session_state.watched_jobs[job_id]
+        finished = True
+    if finished: st.rerun()
+    if st.session_state.watched_jobs:
+        st.caption(f"🧠 Consolidating {len(st.session_state.watched_jobs)} chat(s) in the background...")
+
+def open_chat_session(session_id, title):
+    save_or_update_chat()
+    st.session_state.messages = database.get_messages_for_session(session_id)
+    st.session_state.chat_id, st.session_state.current_chat_title = session_id, title
+    st.session_state.summary = database.get_session_summary(session_id)
+    st.session_state.conversation_id = uuid.uuid4().hex
+    st.session_state.editing_title_id = None
+    st.rerun()
+
+if "messages" not in st.session_state: st.session_state.messages = []
+if "selected_model" not in st.session_state: st.session_state.selected_model = DEFAULT_MODEL
+if "chat_id" not in st.session_state: st.session_state.chat_id = None
+# Identifies the transcript on screen; cached engines are keyed on it and it changes whenever the transcript is replaced
+if "conversation_id" not in st.session_state: st.session_state.conversation_id = uuid.uuid4().hex
+if "summary" not in st.session_state: st.session_state.summary = (None, 0)
+# Pick up a title the worker generated since the last rerun
+if st.session_state.chat_id is not None:
+    st.session_state.current_chat_title = get_title_worker().titles.get(st.session_state.chat_id, st.session_state.current_chat_title)
+    # ...and a folded summary; until one arrives, build_context keeps the newest turns that fit the budget
+    folded = get_summary_worker().summaries.get(st.session_state.chat_id)
+    if folded and folded[1] > st.session_state.summary[1]: st.session_state.summary = folded
+if "current_chat_title" not in st.session_state: st.session_state.current_chat_title = "New Chat"
+if "editing_title_id" not in st.session_state: st.session_state.editing_title_id = None
+if "watched_jobs" not in st.session_state: st.session_state.watched_jobs = {}
+if "history_pages" not in st.session_state: st.session_state.history_pages = 1
+with st.sidebar:
+    st.title("Settings")
+    model_keys, model_values = list(MODELS.keys()), list(MODELS.values())
+    try: current_model_index = model_values.index(st.session_state.selected_model)
+    except ValueError: current_model_index = 0
+    selected_model_name = st.selectbox("Choose a Model", options=model_keys, index=current_model_index)
+    if MODELS[selected_model_name] != st.session_state.selected_model:
+        st.session_state.selected_model = MODELS[selected_model_name]
+        st.rerun()
+    
+    st.title("Actions")
+    if st.button("New Chat", type="primary"):
+        save_or_update_chat()
+        st.session_state.messages, st.session_state.chat_id, st.session_state.current_chat_title = [], None, "New Chat"
+        st.session_state.conversation_id, st.session_state.summary = uuid.uuid4().hex, (None, 0)
+        st.rerun()
+    # Polls only while this session is waiting for a job, and reruns just this fragment
+    st.fragment(run_every=JOB_POLL_SECONDS if st.session_state.watched_jobs else None)(show_job_updates)()
+    
+    st.title("History")
+    search_query = st.text_input("Search chats", key="history_search", placeholder="Search past conversations...", label_visibility="collapsed")
+    past_sessions, next_cursor = [], None
+    if search_query.strip():
+        for session_id, title, timestamp, snippet in database.search_chat_sessions(search_query):
+            if st.button(f"{title}", key=f"search_{session_id}", help=f"{title}\nUpdated on {timestamp}", use_container_width=True):
+                open_chat_session(session_id, title)
+            st.caption(snippet)
+    else:
+        write_generation = database.get_write_generation()
+        for _ in range(st.session_state.history_pages):
+            page, next_cursor = get_sessions_page(next_cursor, write_generation)
+            past_sessions.extend(page)
+            if next_cursor is None: break
+    # One indexed query per rerun; the worker process updates job rows as it goes
+    active_consolidations = job_queue.get_active_jobs("consolidate")
+    for session_id, title, timestamp in past_sessions:
+        col1, col2, col3, col4 = st.columns([0.6, 0.13, 0.13, 0.13])
+        with col1:
+            if st.button(f"{title}", key=f"session_{session_id}", help=f"{title}\nUpdated on {timestamp}", use_container_width=True):
+                open_chat_session(session_id, title)
+        with col2:
+            job_status = active_consolidations.get(str(session_id))
+            if job_status:
+                st.button("⏳", key=f"consolidate_spin_{session_id}", help=f"Consolidation {job_status}...", disabled=True)
+            else:
+                if st.button("🧠", key=f"consolidate_{session_id}", help="Consolidate Memory"):
+                    queue_consolidation(session_id, title)
+                    st.rerun()
+        with col3:
+            if st.button("✏️", key=f"edit_{session_id}", help="Rename chat"):
+                st.session_state.editing_title_id = session_id
+                st.rerun()
+        with col4:
+            if st.button("🗑️", key=f"delete_{session_id}", help="Delete chat"):
+                get_title_worker().lock(session_id)
+                get_summary_worker().discard(session_id)
+                database.delete_chat_session(session_id)
+                if st.session_state.chat_id == session_id:
+                    get_session_cache().discard(st.session_state.conversation_id)
+                    st.session_state.messages, st.session_state.chat_id, st.session_state.current_chat_title = [], None, "New Chat"
+                    st.session_state.conversation_id, st.session_state.summary = uuid.uuid4().hex, (None, 0)
+                st.rerun()
+    if next_cursor is not None and st.button("Load more", key="load_more_sessions", use_container_width=True):
+        st.session_state.history_pages += 1
+        st.rerun()
+
+if st.session_state.editing_title_id is not None:
+    session_to_edit = database.get_chat_session(st.session_state.editing_title_id)
+    if session_to_edit:
+        st.title("Rename Chat")
+        new_title = st.text_input("Enter new title:", value=session_to_edit[1])
+        if st.button("Save Title"):
+            # A title chosen by the user is never overwritten by a generated one
+            get_title_worker().lock(st.session_state.editing_title_id)
+            database.rename_chat_session(st.session_state.editing_title_id, new_title)
+            if st.session_state.chat_id == st.session_state.editing_title_id:
+                st.session_state.current_chat_title = new_title
+            st.session_state.editing_title_id = None
+            st.rerun()
+        if st.button("Cancel"):
+            st.session_state.editing_title_id = None
+            st.rerun()
+else:
+    st.title(st.session_state.current_chat_title)
+
+st.caption("JARVIS, Your Assistant.")
+
+for msg in st.session_state.messages:
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["content"])
+
+if prompt := st.chat_input("How can I help you, Sir?"):
+    st.session_state.messages.append({"role": "user", "content": prompt})
+    st.rerun()
+startup_profile.first_paint()
+
+# --- Deferred Initialization (after the first paint) ---
+start_google_mirror()
+preload_backends()
+# Loads the selected model (and the title model, if it fits) in the background; a no-op unless the selection changed
+get_residency().set_active(st.session_state.selected_model, prewarm=[MODELS["Fast"]])
+
+if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
+    # One trace per turn; the diagnostics page shows it as a waterfall
+    with tracing.span("turn", model=st.session_state.selected_model) as turn_span:
+        with get_residency().turn(), st.chat_message("assistant"):
+            with st.spinner("Thinking..."):
+                latest_prompt = st.session_state.messages[-1]["content"]
+                # Rolling summary plus the recent turns that fit the model's budget, not the whole transcript
+                summary, summary_count = st.session_state.summary
+                with tracing.span("context"):
+                    history = context_window.build_context(st.session_state.messages[:-1], summary, summary_count,
+                                                           CONTEXT_BUDGETS.get(st.session_state.selected_model, DEFAULT_CONTEXT_BUDGET))
+                
+                # --- The Router Logic ---
+                with tracing.span("route") as route_span:
+                    tool_intents, confidence = get_router().route(latest_prompt)
+                    route_span.set(intents=tool_intents, confidence=confidence)
+
+                streaming_response, response_gen = None, None
+                if tool_intents:
+                    import google_tools
+                if tool_intents and all(name in google_tools.READ_TOOLS for name in tool_intents):
+                    # Read-only requests: fetch every tool at once, then answer in a single LLM call
+                    turn_span.set(path="tools")
+                    st.info("Fetching from Google Tools...", icon="🛠️")
+                    with tracing.span("tools"):
+                        tool_results = google_tools.run_tools_concurrently([(name, {}) for name in tool_intents])
+                    st.caption(f"Ran {len(tool_results)} tool(s) in parallel, slowest took {max(t for _, t in tool_results.values()):.1f}s")
+                    response_gen = stream_tool_answer(latest_prompt, [to_chat_message(m) for m in history], tool_results)
+                elif tool_intents:
+                    turn_span.set(path="agent")
+                    st.info("Using Google Tools Agent...", icon="🛠️")
+                    with tracing.span("agent.setup"):
+                        agent = get_agent(history)
+                    with tracing.span("agent.request"):
+                        streaming_response = agent.stream_chat(latest_prompt)
+                else:
+                    # Default to the simple, reliable RAG Chat Engine
+                    turn_span.set(path="chat")
+                    with tracing.span("chat.setup"):
+                        chat_engine = get_chat_engine(history)
+                    # Retrieval and prompt assembly happen here, before the first token is requested
+                    with tracing.span("chat.request"):
+                        streaming_response = chat_engine.stream_chat(latest_prompt)
+
+                # --- Display Response Stream ---
+                message_placeholder = st.empty()
+                full_response = ""
+                # This robustly handles both agent and chat engine responses
+                if response_gen is None and hasattr(streaming_response, 'response_gen'):
+                    response_gen = streaming_response.response_gen
+                with tracing.span("llm.stream") as stream_span:
+                    if response_gen is not None:
+                        # Redraws are throttled; the final text is always rendered in full
+                        full_response, stream_stats = stream_renderer.render_stream(response_gen, message_placeholder)
+                        stream_span.set(tokens=stream_stats["tokens"], renders=stream_stats["renders"])
+                        tracing.record("llm.first_token", stream_stats["ttft_s"], start=stream_span.start)
+                    else: # Handle non-streaming tool outputs
+                        full_response = str(streaming_response)
+                        message_placeholder.markdown(full_response)
+                
+        st.session_state.messages.append({"role": "assistant", "content": full_response})
+        with tracing.span("save"):
+            save_or_update_chat()
+        with tracing.span("summary"):
+            update_rolling_summary()
+    st.rerun()
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import database
+
+# --- Configuration ---
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 30.0     # seconds before the first retry; doubled for each further attempt
+LEASE_SECONDS = 15 * 60     # a running job whose worker has not finished by then is handed out again
+WORKER_STALE_SECONDS = 30   # a worker that has not sent a heartbeat for this long is considered gone, and its jobs with it
+ACTIVE_STATUSES = ("queued", "running")
+
+_initialized = False
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures that retrying cannot fix."""
+
+
+# --- Schema ---
+def init_queue():
+    global _initialized
+    if _initialized: return
+    with database.transaction() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, dedupe_key TEXT, payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL, run_after REAL NOT NULL, lease_until REAL,
+                created_at REAL NOT NULL, started_at REAL, finished_at REAL, error TEXT, result TEXT
+            )
+        """)
+        database.add_column_if_missing(cursor, "jobs", "worker_pid", "INTEGER")
+        # Claiming scans only runnable jobs; the sidebar's status poll uses the dedupe index
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs (status, run_after, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (kind, dedupe_key, status)")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_workers (pid INTEGER PRIMARY KEY, heartbeat_at REAL NOT NULL)
+        """)
+    _initialized = True
+
+
+# --- Producer API ---
+def enqueue(kind, payload, dedupe_key=None, max_attempts=MAX_ATTEMPTS):
+    """Adds a job and returns its id. A job with the same kind and dedupe_key that is still
+    queued or running is reused instead, so double clicks do not queue duplicate work."""
+    init_queue()
+    now = time.time()
+    with database.transaction() as cursor:
+        if dedupe_key is not None:
+            row = cursor.execute("SELECT id FROM jobs WHERE kind = ? AND dedupe_key = ? AND status IN (?, ?)",
+                                 (kind, dedupe_key, *ACTIVE_STATUSES)).fetchone()
+            if row: return row[0]
+        cursor.execute("""
+            INSERT INTO jobs (kind, dedupe_key, payload, max_attempts, run_after, created_at) VALUES (?, ?, ?, ?, ?, ?)
+        """, (kind, dedupe_key, json.dumps(payload), max_attempts, now, now))
+        return cursor.lastrowid
+
+def get_jobs(job_ids):
+    """Returns {id: (status, attempts, error, result)} for the given jobs."""
+    if not job_ids: return {}
+    init_queue()
+    placeholders = ",".join("?" * len(job_ids))
+    rows = database.get_connection().execute(
+        f"SELECT id, status, attempts, error, result FROM jobs WHERE id IN ({placeholders})", list(job_ids)).fetchall()
+    return {row[0]: (row[1], row[2], row[3], json.loads(row[4]) if row[4] else None) for row in rows}
+
+def get_active_jobs(kind):
+    """Returns {dedupe_key: status} for the kind's queued and running jobs."""
+    init_queue()
+    rows = database.get_connection().execute(
+        "SELECT dedupe_key, status FROM jobs WHERE kind = ? AND status IN (?, ?)", (kind, *ACTIVE_STATUSES)).fetchall()
+    return dict(rows)
+
+def worker_alive():
+    init_queue()
+    row = database.get_connection().execute("SELECT MAX(heartbeat_at) FROM job_workers").fetchone()
+    return row[0] is not None and time.time() - row[0] < WORKER_STALE_SECONDS
+
+
+# --- Worker API ---
+def heartbeat(pid=None):
+    with database.transaction() as cursor:
+        cursor.execute("INSERT OR REPLACE INTO job_workers (pid, heartbeat_at) VALUES (?, ?)", (pid or os.getpid(), time.time()))
+
+def unregister_worker(pid=None):
+    with database.transaction() as cursor:
+        cursor.execute("DELETE FROM job_workers WHERE pid = ?", (pid or os.getpid(),))
+
+def claim_next(kinds, pid=None):
+    """Atomically marks the oldest runnable job of the given kinds as running and returns
+    (id, kind, payload, attempt), or None.
+
+    Running jobs whose lease expired or whose worker stopped sending heartbeats count as runnable
+    while they have attempts left; those out of attempts are marked failed, so a job that keeps
+    killing its worker is not retried forever.
+    """
+    init_queue()
+    now = time.time()
+    placeholders = ",".join("?" * len(kinds))
+    lost = f"""status = 'running' AND kind IN ({placeholders}) AND (lease_until < ? OR (worker_pid IS NOT NULL AND worker_pid NOT IN (
+        SELECT pid FROM job_workers WHERE heartbeat_at >= ?)))"""
+    lost_params = (*kinds, now, now - WORKER_STALE_SECONDS)
+    with database.transaction() as cursor:
+        cursor.execute(f"UPDATE jobs SET status = 'failed', finished_at = ?, error = 'worker lost' WHERE {lost} AND attempts >= max_attempts",
+                       (now, *lost_params))
+        row = cursor.execute(f"""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, lease_until = ?, worker_pid = ?
+            WHERE id = (
+                SELECT id FROM jobs WHERE kind IN ({placeholders})
+                AND ((status = 'queued' AND run_after <= ?) OR ({lost} AND attempts < max_attempts))
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts
+        """, (now, now + LEASE_SECONDS, pid or os.getpid(), *kinds, now, *lost_params)).fetchone()
+    if row is None: return None
+    return row[0], row[1], json.loads(row[2]), row[3]
+
+def complete(job_id, result=None):
+    with database.transaction() as cursor:
+        cursor.execute("UPDATE jobs SET status = 'done', finished_at = ?, error = NULL, result = ? WHERE id = ?",
+                       (time.time(), json.dumps(result) if result is not None else None, job_id))
+
+def fail(job_id, error, retryable=True):
+    """Records a failed attempt: the job is queued again with exponential backoff until it runs out of attempts."""
+    now = time.time()
+    with database.transaction() as cursor:
+        attempts, max_attempts = cursor.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if retryable and attempts < max_attempts:
+            cursor.execute("UPDATE jobs SET status = 'queued', run_after = ?, lease_until = NULL, error = ? WHERE id = ?",
+                           (now + RETRY_BASE_DELAY * 2 ** (attempts - 1), str(error), job_id))
+            return True
+        cursor.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?", (now, str(error), job_id))
+        return False
@@ -0,0 +1,149 @@
+import os
+import time
+import argparse
+import threading
+from datetime import datetime
+import ollama # type: ignore
+import database
+import ingest
+import job_queue
+from job_queue import PermanentJobError
+
+# --- Configuration ---
+POLL_INTERVAL = 2.0         # idle wait between checks for new jobs
+HEARTBEAT_INTERVAL = 10.0   # well under job_queue.WORKER_STALE_SECONDS, also while a long job runs
+CONSOLIDATED_MEM_PATH = os.path.join(ingest.KNOWLEDGE_VAULT_PATH, "consolidated_memories")
+
+
+def generate_text(model_name, prompt, keep_alive=None):
+    response = ollama.chat(model=model_name, messages=[{'role': 'user', 'content': prompt}], keep_alive=keep_alive)
+    return response['message']['content'].strip()
+
+
+def build_consolidation_prompt(current_time_str, user_conv_text):
+    return f"""
+You are a data extraction bot. Your task is to convert a transcript of a user's statements into a structured list of key facts about the user.
+You MUST ignore conversational filler and only extract permanent facts, goals, and decisions.
+CRITICAL: You MUST convert all relative dates and times into absolute dates and times based on the provided current time.
+--- PERFECT EXAMPLE ---
+CURRENT TIME: Sunday, June 22, 2025 at 03:00 PM
+USER STATEMENTS (INPUT):
+"I need to prepare for my meeting tomorrow morning with the Globex team."
+"Okay, my main goal is to secure the new budget."
+"Also, remind me that the presentation slides are due next Friday."
+CORRECT OUTPUT:
+*   Has a meeting with the Globex team on June 23, 2025.
+*   Primary goal for the Globex meeting is to secure the new budget.
+*   A presentation slide deck is due on June 27, 2025.
+--- END OF EXAMPLE ---
+Now, perform the exact same task on the following real user statements. Provide only the Markdown list of facts.
+CURRENT TIME: {current_time_str}
+USER STATEMENTS (INPUT):
+{user_conv_text}
+CORRECT OUTPUT:
+"""
+
+
+class JobWorker:
+    """Runs queued jobs in its own process, reusing one Chroma collection and embed model."""
+
+    def __init__(self):
+        self._collection = None
+        self._embed_model = None
+        self.handlers = {"consolidate": self.consolidate}
+
+    def index_file(self, filepath):
+        if self._collection is None:
+            self._collection, self._embed_model = ingest.open_collection(), ingest.get_embed_model()
+        ingest.ingest_paths([filepath], collection=self._collection, embed_model=self._embed_model)
+
+    def consolidate(self, payload):
+        """Extracts key facts from a chat's user messages into a vault note and indexes it."""
+        timings = {}
+        messages = database.get_messages_for_session(payload["session_id"])
+        if len(messages) <= 1: raise PermanentJobError("Not enough content to consolidate.")
+        user_messages = [m['content'] for m in messages if m['role'] == 'user']
+        if not user_messages: raise PermanentJobError("No user messages to consolidate.")
+
+        started = time.perf_counter()
+        # keep_alive was chosen by the app's residency manager so this job does not evict its chat model
+        keep_alive = payload.get("keep_alive", {})
+        key_facts = generate_text(payload["facts_model"], build_consolidation_prompt(payload["current_time"], "\n".join(user_messages)),
+                                  keep_alive.get(payload["facts_model"]))
+        timings["facts_s"] = round(time.perf_counter() - started, 3)
+        if not key_facts: raise RuntimeError("The AI returned an empty response.")
+
+        started = time.perf_counter()
+        filename_prompt = f"Generate a single, short, descriptive, snake_case filename for these facts. Example: 'project_phoenix_deadline'. 3 words max. Filename only. No commentary.\n\nFacts:\n{key_facts}"
+        try:
+            filename_base = generate_text(payload["filename_model"], filename_prompt, keep_alive.get(payload["filename_model"]))
+        except Exception as e:
+            print(f"Filename generation failed, using the default: {e}")
+            filename_base = None
+        timings["filename_s"] = round(time.perf_counter() - started, 3)
+        if filename_base:
+            clean_filename = filename_base.split('\n')[0].strip().replace("`", "").replace("*", "")
+            clean_filename = "".join(c if c.isalnum() or c in ['_'] else '_' for c in clean_filename)
+        else:
+            clean_filename = "consolidated_memory"
+        timestamp = datetime.now().strftime("%Y-%m-%d")
+        filename = f"{timestamp}_{clean_filename}.md"
+        os.makedirs(CONSOLIDATED_MEM_PATH, exist_ok=True)
+        filepath = os.path.join(CONSOLIDATED_MEM_PATH, filename)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(f"# Memory from chat: {payload['chat_title']}\n\n{key_facts}")
+
+        started = time.perf_counter()
+        self.index_file(filepath)
+        timings["ingest_s"] = round(time.perf_counter() - started, 3)
+        return {"filename": filename, "timings": timings}
+
+    def run_one(self):
+        """Runs the next runnable job, if any. Returns whether there was one."""
+        job = job_queue.claim_next(list(self.handlers))
+        if job is None: return False
+        job_id, kind, payload, attempt = job
+        started = time.perf_counter()
+        try:
+            result = self.handlers[kind](payload)
+        except PermanentJobError as e:
+            job_queue.fail(job_id, e, retryable=False)
+            print(f"Job {job_id} ({kind}) failed: {e}")
+        except Exception as e:
+            retrying = job_queue.fail(job_id, e)
+            print(f"Job {job_id} ({kind}) attempt {attempt} failed{', will retry' if retrying else ''}: {e}")
+        else:
+            result["total_s"] = round(time.perf_counter() - started, 3)
+            job_queue.complete(job_id, result)
+            print(f"Job {job_id} ({kind}) done in {result['total_s']:.1f}s")
+        return True
+
+    def run(self, poll_interval=POLL_INTERVAL):
+        job_queue.init_queue()
+        stop_event = threading.Event()
+        def beat():
+            while True:
+                job_queue.heartbeat()
+                if stop_event.wait(HEARTBEAT_INTERVAL): return
+        threading.Thread(target=beat, name="job-worker-heartbeat", daemon=True).start()
+        try:
+            while True:
+                if not self.run_one(): time.sleep(poll_interval)
+        finally:
+            stop_event.set()
+            job_queue.unregister_worker()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run JARVIS background jobs (memory consolidation).")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between checks when idle.")
+    args = parser.parse_args()
+    print("Job worker started. Press Ctrl+C to stop.")
+    try:
+        JobWorker().run(args.interval)
+    except KeyboardInterrupt:
+        print("Stopping job worker...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# --- Configuration ---
+MEMORY_BUDGET_GB = float(os.environ.get("JARVIS_MODEL_MEMORY_GB", "8"))  # RAM/VRAM the resident models may use together
+# Resident size (weights plus the default context) assumed until Ollama reports the real one
+MODEL_SIZES_GB = {
+    'gemma3:1b-it-qat': 1.2,
+    'gemma3:4b-it-qat': 4.0,
+    'phi4-mini:3.8b-q4_K_M': 3.5,
+    'qwen3:8b-Q4_K_M': 6.5,
+    'nomic-embed-text': 0.6,
+}
+DEFAULT_MODEL_SIZE_GB = 4.0
+PINNED_KEEP_ALIVE = "30m"   # the active chat model and the embedding model
+AUX_KEEP_ALIVE = "5m"       # other models, while they fit next to the pinned ones
+UNLOAD_KEEP_ALIVE = 0       # models that do not fit are unloaded as soon as they have answered
+REFRESH_INTERVAL = 2.0      # minimum seconds between /api/ps polls
+IDLE_WAIT_SECONDS = 60.0    # auxiliary work waits at most this long for a chat turn to finish
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+class ModelResidency:
+    """Decides which Ollama models stay loaded, so the models of one turn do not evict each other.
+
+    The active chat model and the embedding model are pinned with a long keep_alive and prewarmed
+    in the background. Any other model gets a short keep_alive if it fits in the memory budget next
+    to them, and is unloaded right after its request if it does not. Auxiliary work (titles,
+    summaries) waits for the current chat turn and falls back to the chat model when its own
+    model would not fit. Loads and evictions are counted from Ollama's list of running models.
+    """
+
+    def __init__(self, embed_model_name, budget_gb=MEMORY_BUDGET_GB):
+        self.embed_model_name = embed_model_name
+        self.budget_gb = budget_gb
+        self.active = None
+        self._sizes = dict(MODEL_SIZES_GB)
+        self._resident = set()
+        self._unloading = set()
+        self._cond = threading.Condition()
+        self._turns = 0
+        self._last_refresh = 0.0
+        self.stats = {"loads": 0, "evictions": 0, "unloads": 0, "prewarms": 0, "substitutions": 0, "deferred": 0}
+
+    # --- Budget ---
+    def size(self, model):
+        return self._sizes.get(model, DEFAULT_MODEL_SIZE_GB)
+
+    def pinned(self):
+        return {model for model in (self.active, self.embed_model_name) if model}
+
+    def fits(self, model):
+        """Whether `model` can be resident together with the pinned models."""
+        return sum(self.size(m) for m in self.pinned() | {model}) <= self.budget_gb
+
+    def keep_alive(self, model):
+        """The keep_alive to send with a request for `model`."""
+        if model in self.pinned(): return PINNED_KEEP_ALIVE
+        return AUX_KEEP_ALIVE if self.fits(model) else UNLOAD_KEEP_ALIVE
+
+    def model_for(self, model):
+        """The model to run auxiliary work on: `model` if it fits, otherwise the already loaded chat model."""
+        if self.active is None or self.fits(model): return model
+        with self._cond:
+            self.stats["substitutions"] += 1
+        return self.active
+
+    # --- Residency ---
+    def set_active(self, model, prewarm=()):
+        """Pins the selected chat model and loads it in the background, with any of `prewarm` that fit.
+        A previous chat model that no longer fits is unloaded first. Cheap when nothing changed."""
+        with self._cond:
+            previous, self.active = self.active, model
+        if previous == model: return
+        if previous and previous not in self.pinned() and not self.fits(previous):
+            self.unload(previous)
+        candidates = [model, self.embed_model_name, *prewarm]
+        threading.Thread(target=self.prewarm, args=([m for m in dict.fromkeys(candidates) if m in self.pinned() or self.fits(m)],),
+                         name="model-prewarm", daemon=True).start()
+
+    def prewarm(self, models):
+        # ollama is imported on first use in this module, so the app can paint before it is loaded
+        import ollama # type: ignore
+        self.refresh(force=True)
+        for model in models:
+            if model in self._resident: continue
+            try:
+                if model == self.embed_model_name:
+                    ollama.embed(model=model, input="warm up", keep_alive=self.keep_alive(model))
+                else:
+                    # An empty prompt only loads the model
+                    ollama.generate(model=model, prompt="", keep_alive=self.keep_alive(model))
+                with self._cond:
+                    self.stats["prewarms"] += 1
+                print(f"Prewarmed {model}")
+            except Exception as e:
+                print(f"Could not prewarm {model}: {e}")
+        self.refresh(force=True)
+
+    def unload(self, model):
+        import ollama # type: ignore
+        try:
+            with self._cond:
+                self._unloading.add(model)
+            ollama.generate(model=model, prompt="", keep_alive=UNLOAD_KEEP_ALIVE)
+            with self._cond:
+                self.stats["unloads"] += 1
+            print(f"Unloaded {model} to make room")
+        except Exception as e:
+            print(f"Could not unload {model}: {e}")
+
+    def refresh(self, force=False):
+        """Polls Ollama's running models and counts loads and evictions since the last poll."""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < REFRESH_INTERVAL: return
+        self._last_refresh = now
+        import ollama # type: ignore
+        try:
+            running = {m.model: m.size_vram or m.size for m in ollama.ps().models}
+        except Exception as e:
+            print(f"Could not list running models: {e}")
+            return
+        with self._cond:
+            for model, size in running.items():
+                if size: self._sizes[model] = size / 1e9
+            loaded, gone = set(running) - self._resident, self._resident - set(running)
+            self.stats["loads"] += len(loaded)
+            self.stats["evictions"] += len(gone - self._unloading)
+            self._unloading -= gone
+            self._resident = set(running)
+
+    # --- Scheduling ---
+    @contextmanager
+    def turn(self):
+        """Marks a chat turn in progress; auxiliary work waits until it is over."""
+        self.refresh()
+        with self._cond:
+            self._turns += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._turns -= 1
+                self._cond.notify_all()
+            self.refresh()
+
+    def run_auxiliary(self, model, run, wait=IDLE_WAIT_SECONDS):
+        """Calls `run(model, keep_alive)` once no chat turn is in progress, on a model that will not evict the chat model."""
+        with self._cond:
+            if self._turns:
+                self.stats["deferred"] += 1
+                self._cond.wait_for(lambda: self._turns == 0, timeout=wait)
+        model = self.model_for(model)
+        return run(model, self.keep_alive(model))
+
+    def summary(self):
+        with self._cond:
+            resident = sorted(self._resident)
+            return {**self.stats, "active": self.active, "resident": resident,
+                    "resident_gb": round(sum(self.size(m) for m in resident), 1), "budget_gb": self.budget_gb}
+
+
+def start_manager(embed_model_name, budget_gb=MEMORY_BUDGET_GB):
+    """Returns the process-wide manager, creating it on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None: _manager = ModelResidency(embed_model_name, budget_gb)
+        return _manager
+
+def get_manager():
+    """The process-wide manager, or None if the app has not started one."""
+    return _manager
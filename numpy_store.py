@@ -0,0 +1,318 @@
+import os
+import json
+import math
+import time
+import shutil
+import argparse
+import threading
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.vector_stores.types import FilterCondition, FilterOperator, VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+# --- Configuration ---
+NUMPY_STORE_PATH = "./vector_index"
+# float16 halves the file and its page cache footprint, but each search widens the rows to float32 first (several times slower)
+STORE_DTYPE = os.environ.get("JARVIS_VECTOR_DTYPE", "float32")
+FILTER_KEYS = ("file_path", "file_name")    # metadata keys that get a code column for prefiltering
+EXPORT_BATCH_SIZE = 5000                     # rows read from Chroma per get() call
+SEARCH_BLOCK_ROWS = 1024                     # float16 rows are widened to float32 this many at a time
+CURRENT_FILE = "CURRENT"                     # names the live snapshot directory; replaced atomically
+SNAPSHOTS_KEPT = 2                           # superseded snapshots always kept next to the current one
+SNAPSHOT_GRACE_SECONDS = 600                 # older ones are deleted this long after being superseded
+
+
+# --- Snapshot Files ---
+# A snapshot is a directory holding:
+#   vectors.npy     (n, dim) matrix in STORE_DTYPE, memory-mapped for search
+#   sq_norms.npy    (n,) float32 squared row norms, for L2 ranking with a single matrix product
+#   offsets.npy     (n + 1,) int64 byte offsets into records.bin
+#   records.bin     one JSON record per row: [id, document, metadata], read only for the hits
+#   codes_<key>.npy (n,) int32 codes of each FILTER_KEYS value, indexing columns.json
+#   columns.json    the distinct values per filter key
+#   header.json     count, dim, dtype, distance space and the collection version it was exported at
+def collection_space(collection):
+    """The distance function of a Chroma collection ("l2", "cosine" or "ip")."""
+    configuration = getattr(collection, "configuration", None) or {}
+    space = (configuration.get("hnsw") or {}).get("space") or (collection.metadata or {}).get("hnsw:space")
+    return space or "l2"
+
+def export_collection(collection, version, path=NUMPY_STORE_PATH, dtype=STORE_DTYPE):
+    """Writes the collection as a new snapshot tagged with `version` and makes it current. Returns its row count."""
+    started = time.perf_counter()
+    total = collection.count()
+    snapshot_dir = os.path.join(path, f"snapshot-{time.time_ns()}-{os.getpid()}")
+    os.makedirs(snapshot_dir)
+    vectors, sq_norms, offsets = None, np.zeros(total, dtype=np.float32), np.zeros(total + 1, dtype=np.int64)
+    columns = {key: {} for key in FILTER_KEYS}
+    codes = {key: np.full(total, -1, dtype=np.int32) for key in FILTER_KEYS}
+    row = 0
+    with open(os.path.join(snapshot_dir, "records.bin"), 'wb') as records:
+        for offset in range(0, total, EXPORT_BATCH_SIZE):
+            batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=EXPORT_BATCH_SIZE, offset=offset)
+            embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(snapshot_dir, "vectors.npy"), mode='w+',
+                                                    dtype=dtype, shape=(total, embeddings.shape[1] if total else 0))
+            count = min(len(batch["ids"]), total - row)  # rows added since count() are left for the next export
+            vectors[row:row + count] = embeddings[:count]
+            sq_norms[row:row + count] = np.einsum("ij,ij->i", embeddings[:count], embeddings[:count])
+            for i in range(count):
+                metadata = batch["metadatas"][i] or {}
+                data = json.dumps([batch["ids"][i], batch["documents"][i], metadata], ensure_ascii=False).encode("utf-8")
+                records.write(data)
+                offsets[row + i + 1] = offsets[row + i] + len(data)
+                for key in FILTER_KEYS:
+                    value = metadata.get(key)
+                    if value is not None: codes[key][row + i] = columns[key].setdefault(value, len(columns[key]))
+            row += count
+    if vectors is None:
+        vectors = np.lib.format.open_memmap(os.path.join(snapshot_dir, "vectors.npy"), mode='w+', dtype=dtype, shape=(0, 0))
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(snapshot_dir, "sq_norms.npy"), sq_norms[:row])
+    np.save(os.path.join(snapshot_dir, "offsets.npy"), offsets[:row + 1])
+    for key in FILTER_KEYS:
+        np.save(os.path.join(snapshot_dir, f"codes_{key}.npy"), codes[key][:row])
+    with open(os.path.join(snapshot_dir, "columns.json"), 'w', encoding='utf-8') as f:
+        json.dump({key: list(values) for key, values in columns.items()}, f, ensure_ascii=False)
+    with open(os.path.join(snapshot_dir, "header.json"), 'w', encoding='utf-8') as f:
+        json.dump({"count": row, "dtype": dtype, "space": collection_space(collection), "version": version}, f)
+
+    tmp_path = os.path.join(path, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(os.path.basename(snapshot_dir))
+    os.replace(tmp_path, os.path.join(path, CURRENT_FILE))
+    remove_old_snapshots(path, keep=os.path.basename(snapshot_dir))
+    print(f"Exported {row} vector(s) to {snapshot_dir} in {time.perf_counter() - started:.2f}s")
+    return row
+
+def remove_old_snapshots(path, keep):
+    """Deletes superseded snapshots beyond the newest SNAPSHOTS_KEPT once their grace period is over.
+
+    A reader opens every file of a snapshot at once, so it only needs the directory to exist
+    between reading CURRENT and opening it; the grace period covers readers that are that slow.
+    On Windows a delete fails while a reader still maps the files and is retried next time.
+    """
+    # Names are snapshot-<time_ns>-<pid>, so they sort by export time, and the next one's time is when a snapshot was superseded
+    names = sorted((name for name in os.listdir(path) if name.startswith("snapshot-") and name != keep),
+                   key=lambda name: int(name.split("-")[1]))
+    superseded_at = [int(name.split("-")[1]) / 1e9 for name in names[1:]] + [time.time()]
+    for name, superseded in zip(names[:max(len(names) - SNAPSHOTS_KEPT, 0)], superseded_at):
+        if time.time() - superseded > SNAPSHOT_GRACE_SECONDS:
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+def current_snapshot(path=NUMPY_STORE_PATH):
+    try:
+        with open(os.path.join(path, CURRENT_FILE), 'r') as f: return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def snapshot_version(path=NUMPY_STORE_PATH):
+    """The collection version the current snapshot was exported at, or None if there is none."""
+    name = current_snapshot(path)
+    if name is None: return None
+    try:
+        with open(os.path.join(path, name, "header.json"), 'r', encoding='utf-8') as f: return json.load(f)["version"]
+    except FileNotFoundError:
+        return None
+
+
+class Snapshot:
+    """One exported snapshot, opened read-only.
+
+    Opening maps or reads every file up front, so a search keeps working after the directory is
+    deleted. Only columns.json is parsed; the matrices are paged in by the first search.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "header.json"), 'r', encoding='utf-8') as f:
+            self.header = json.load(f)
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode='r')
+        self.sq_norms = np.load(os.path.join(directory, "sq_norms.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode='r')
+        self._records = np.memmap(os.path.join(directory, "records.bin"), dtype=np.uint8, mode='r') if self.offsets[-1] else None
+        self._codes = {key: np.load(os.path.join(directory, f"codes_{key}.npy"), mmap_mode='r') for key in FILTER_KEYS}
+        with open(os.path.join(directory, "columns.json"), 'r', encoding='utf-8') as f:
+            self._columns = {key: {value: code for code, value in enumerate(values)} for key, values in json.load(f).items()}
+
+    def __len__(self):
+        return self.header["count"]
+
+    def record(self, row):
+        """Returns (id, document, metadata) for a row."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self._records[start:end].tobytes())
+
+    def codes(self, key):
+        return self._codes[key]
+
+    def columns(self):
+        return self._columns
+
+    def scores(self, query):
+        """Higher-is-better scores of every row, ordered like Chroma's distances for the snapshot's space."""
+        if self.vectors.dtype == np.float32:
+            dots = self.vectors @ query
+        else:
+            dots = np.empty(len(self), dtype=np.float32)
+            for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+                block = self.vectors[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+                dots[start:start + len(block)] = block @ query
+        space = self.header["space"]
+        if space == "cosine":
+            return dots / np.maximum(np.sqrt(self.sq_norms) * np.linalg.norm(query), 1e-12)
+        if space == "ip":
+            return dots
+        # ||q - x||^2 = ||q||^2 + ||x||^2 - 2 q.x; ||q||^2 is the same for every row
+        return 2 * dots - self.sq_norms
+
+    def distances(self, query, scores):
+        """Chroma's distance for the given scores, so similarities match the Chroma backend."""
+        space = self.header["space"]
+        if space == "l2": return np.maximum(float(query @ query) - scores, 0.0)
+        return 1.0 - scores
+
+    def filter_mask(self, filters):
+        """Boolean row mask for MetadataFilters on FILTER_KEYS (==, !=, in, nin; and/or)."""
+        masks = []
+        for item in filters.filters:
+            if hasattr(item, "filters"):
+                masks.append(self.filter_mask(item))
+                continue
+            if item.key not in FILTER_KEYS:
+                raise ValueError(f"Can only prefilter on {', '.join(FILTER_KEYS)}, not '{item.key}'")
+            lookup, codes = self.columns()[item.key], self.codes(item.key)
+            values = item.value if isinstance(item.value, list) else [item.value]
+            wanted = np.isin(codes, [lookup[v] for v in values if v in lookup])
+            if item.operator in (FilterOperator.EQ, FilterOperator.IN):
+                masks.append(wanted)
+            elif item.operator in (FilterOperator.NE, FilterOperator.NIN):
+                masks.append(~wanted)
+            else:
+                raise ValueError(f"Unsupported filter operator '{item.operator.value}' on {item.key}")
+        if not masks: return np.ones(len(self), dtype=bool)
+        combine = np.logical_or if filters.condition == FilterCondition.OR else np.logical_and
+        return combine.reduce(masks)
+
+    def search(self, query, top_k, mask=None):
+        """Returns [(row, distance)] for the `top_k` nearest rows, nearest first."""
+        if not len(self) or top_k <= 0: return []
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.scores(query)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            top_k = min(top_k, int(mask.sum()))
+            if top_k == 0: return []
+        top_k = min(top_k, len(scores))
+        rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return list(zip(rows.tolist(), self.distances(query, scores[rows]).tolist()))
+
+
+class NumpyVectorStore:
+    """Read-only search over memory-mapped snapshots of the Chroma collection.
+
+    It has no write path (ingest.py writes to Chroma and exports a snapshot), so it is not a
+    llama-index vector store and cannot be handed to an index that would insert into it; the app
+    searches it through NumpyRetriever. Search is an exact matrix-vector product, so results follow
+    Chroma's ranking (which is approximate) and scores use its exp(-distance) similarity. The store
+    notices a newer snapshot exported by another process and switches to it on the next query.
+    """
+
+    def __init__(self, path=NUMPY_STORE_PATH):
+        self.path = path
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def snapshot(self):
+        name = current_snapshot(self.path)
+        with self._lock:
+            if name is None:
+                self._snapshot = None
+            elif self._snapshot is None or os.path.basename(self._snapshot.directory) != name:
+                self._snapshot = Snapshot(os.path.join(self.path, name))
+            return self._snapshot
+
+    def refresh(self, open_collection):
+        """Re-exports from Chroma when the current snapshot is older than ingest's collection version."""
+        import ingest
+        with self._refresh_lock:
+            snapshot = self.snapshot()
+            if snapshot is None or snapshot.header["version"] != ingest.get_collection_version():
+                ingest.export_snapshot(open_collection(), force=True)
+
+    def query(self, query: VectorStoreQuery) -> VectorStoreQueryResult:
+        snapshot = self.snapshot()
+        if snapshot is None: return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+        mask = snapshot.filter_mask(query.filters) if query.filters else None
+        nodes, similarities, ids = [], [], []
+        for row, distance in snapshot.search(query.query_embedding, query.similarity_top_k, mask):
+            node_id, text, metadata = snapshot.record(row)
+            try:
+                node = metadata_dict_to_node(metadata, text=text)
+            except Exception:
+                node = TextNode(text=text or "", id_=node_id, metadata=metadata)
+            nodes.append(node)
+            similarities.append(math.exp(-distance))
+            ids.append(node_id)
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+
+class NumpyRetriever(BaseRetriever):
+    """Top-k retriever over a NumpyVectorStore, the counterpart of VectorStoreIndex.as_retriever() for Chroma.
+
+    With `open_collection`, each query first compares the snapshot with ingest's collection version
+    (as query_cache does) and re-exports a stale one, so a write that was not exported is still found.
+    """
+
+    def __init__(self, store, embed_model, similarity_top_k=2, filters=None, open_collection=None):
+        super().__init__()
+        self._store = store
+        self._embed_model = embed_model
+        self._similarity_top_k = similarity_top_k
+        self._filters = filters
+        self._open_collection = open_collection
+
+    def _retrieve(self, query_bundle):
+        if self._open_collection is not None: self._store.refresh(self._open_collection)
+        embedding = query_bundle.embedding or self._embed_model.get_query_embedding(query_bundle.query_str)
+        result = self._store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=self._similarity_top_k,
+                                                    filters=self._filters))
+        return [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes, result.similarities)]
+
+
+def compare_with_chroma(collection, snapshot, queries, top_k):
+    """Fraction of Chroma's top-k ids that the snapshot also returns, averaged over `queries` (embeddings)."""
+    overlaps = []
+    for query in queries:
+        expected = collection.query(query_embeddings=[query], n_results=top_k, include=[])["ids"][0]
+        got = [snapshot.record(row)[0] for row, _ in snapshot.search(query, top_k)]
+        overlaps.append(len(set(expected) & set(got)) / max(len(expected), 1))
+    return sum(overlaps) / max(len(overlaps), 1)
+
+
+def main():
+    import ingest
+    parser = argparse.ArgumentParser(description="Export the Chroma collection to the memory-mapped NumPy index.")
+    parser.add_argument("--dtype", choices=("float32", "float16"), default=STORE_DTYPE)
+    parser.add_argument("--check", type=int, metavar="N", default=0,
+                        help="Afterwards, compare top-k with Chroma for N stored vectors used as queries.")
+    parser.add_argument("--top-k", type=int, default=2)
+    args = parser.parse_args()
+    collection = ingest.open_collection()
+    version = f"{time.time_ns()}-{os.getpid()}"
+    export_collection(collection, version, dtype=args.dtype)
+    ingest.mark_collection_changed(version)
+    if args.check:
+        snapshot = Snapshot(os.path.join(NUMPY_STORE_PATH, current_snapshot()))
+        rows = np.linspace(0, len(snapshot) - 1, min(args.check, len(snapshot))).astype(int)
+        queries = [np.asarray(snapshot.vectors[row], dtype=np.float32).tolist() for row in rows]
+        print(f"Top-{args.top_k} agreement with Chroma: {compare_with_chroma(collection, snapshot, queries, args.top_k):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import sys
+import time
+from datetime import datetime
+import altair as alt # type: ignore
+import pandas as pd # type: ignore
+import streamlit as st # type: ignore
+import tracing
+import model_residency
+import startup_profile
+
+st.set_page_config(page_title="JARVIS Diagnostics", page_icon="⏱️", layout="wide")
+
+# --- Constants ---
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 24 * 3600, "Last 7 days": 7 * 24 * 3600}
+RECENT_TRACES = 50
+
+st.title("Diagnostics")
+enabled = st.toggle("Record traces", value=tracing.is_enabled(),
+                    help="Applies to this app process until it restarts. Set JARVIS_TRACE=1 to record from startup.")
+if enabled != tracing.is_enabled():
+    tracing.set_enabled(enabled)
+
+# --- Model Residency ---
+st.header("Models")
+residency = model_residency.get_manager()
+if residency is None:
+    st.info("Open the chat page once to start the model residency manager.")
+else:
+    residency.refresh(force=True)
+    summary = residency.summary()
+    cols = st.columns(4)
+    cols[0].metric("Loads", summary["loads"])
+    cols[1].metric("Evictions", summary["evictions"], help="Models Ollama dropped on its own, not counting deliberate unloads.")
+    cols[2].metric("Unloads", summary["unloads"])
+    cols[3].metric("Resident", f"{summary['resident_gb']} / {summary['budget_gb']:g} GB")
+    st.caption(f"Chat model: {summary['active']} · resident: {', '.join(summary['resident']) or 'none'} · "
+               f"{summary['prewarms']} prewarm(s), {summary['substitutions']} auxiliary task(s) moved to the chat model, "
+               f"{summary['deferred']} deferred until a turn finished")
+
+# --- Retrieval Cache ---
+st.header("Retrieval cache")
+# Loaded by the chat page along with the chat stack; importing it here would pull that in too
+query_cache = sys.modules.get("query_cache")
+cache = query_cache.get_cache() if query_cache else None
+if cache is None:
+    st.info("Ask a question on the chat page to start the retrieval cache.")
+else:
+    cache_summary = cache.summary()
+    cols = st.columns(4)
+    for i, level in enumerate(("embedding", "retrieval")):
+        stats = cache_summary[level]
+        hit_rate = "–" if stats["hit_rate"] is None else f"{stats['hit_rate']:.0%}"
+        cols[2 * i].metric(f"{level.title()} hit rate", hit_rate, help=f"{stats['hits']} hit(s), {stats['misses']} miss(es)")
+        cols[2 * i + 1].metric(f"{level.title()} time saved", f"{stats['saved_s']:.2f} s",
+                               help="Hits times the average cost of a miss.")
+
+# --- Startup ---
+st.header("Startup")
+startup = startup_profile.get_report()
+if startup is None:
+    st.info("Open the chat page once to time its first paint.")
+else:
+    cols = st.columns(2)
+    cols[0].metric("Cold first paint", f"{startup['cold_first_paint_ms']:,.0f} ms",
+                   help="From the first script run's start to the chat UI being drawn, including the app's own imports.")
+    cols[1].metric("Last rerun", f"{startup['last_first_paint_ms']:,.0f} ms")
+    if startup["heavy_modules_loaded"]:
+        st.warning(f"Loaded before the first paint: {', '.join(startup['heavy_modules_loaded'])}")
+    st.caption("`python startup_profile.py` reports cold import times and checks the first paint in a fresh process.")
+
+# --- Stage Latencies ---
+st.header("Latency per stage")
+window = st.radio("Window", list(WINDOWS), index=1, horizontal=True, label_visibility="collapsed")
+stats = tracing.stage_stats(time.time() - WINDOWS[window])
+if stats:
+    stats_frame = pd.DataFrame(stats).sort_values("p95_ms", ascending=False)
+    st.dataframe(stats_frame, hide_index=True, use_container_width=True)
+else:
+    st.info("No spans recorded in this window yet.")
+
+# --- Waterfall ---
+st.header("Recent traces")
+kinds = tracing.root_names()
+if not kinds:
+    st.info("Nothing recorded yet. Turn on recording and send JARVIS a message.")
+    st.stop()
+kind = st.selectbox("Trace kind", kinds, index=kinds.index("turn") if "turn" in kinds else 0)
+traces = tracing.recent_traces(kind, RECENT_TRACES)
+
+def describe(trace):
+    _, name, start, duration, attrs = trace
+    details = ", ".join(f"{key}={value}" for key, value in attrs.items())
+    return f"{datetime.fromtimestamp(start):%Y-%m-%d %H:%M:%S} · {duration:,.0f} ms" + (f" · {details}" if details else "")
+
+trace = st.selectbox("Trace", traces, format_func=describe)
+spans = tracing.get_trace(trace[0])
+frame = pd.DataFrame([{
+    "stage": f"{i:02d} {'· ' * span['depth']}{span['name']}",
+    "start_ms": round(span["offset_ms"], 1),
+    "end_ms": round(span["offset_ms"] + span["duration_ms"], 1),
+    "duration_ms": round(span["duration_ms"], 1),
+    "status": span["status"],
+    "attrs": ", ".join(f"{key}={value}" for key, value in span["attrs"].items()),
+} for i, span in enumerate(spans)])
+chart = alt.Chart(frame).mark_bar().encode(
+    x=alt.X("start_ms", title="ms since the trace started"),
+    x2="end_ms",
+    y=alt.Y("stage", sort=None, title=None, axis=alt.Axis(labelLimit=320)),
+    color=alt.Color("status", scale=alt.Scale(domain=["ok", "error"], range=["#4c78a8", "#e45756"]), legend=None),
+    tooltip=["stage", "duration_ms", "start_ms", "attrs"],
+).properties(height=max(120, 24 * len(frame)))
+st.altair_chart(chart, use_container_width=True)
+st.dataframe(frame, hide_index=True, use_container_width=True)
+
+if st.button("Clear recorded traces"):
+    tracing.clear()
+    st.rerun()
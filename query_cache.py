@@ -0,0 +1,198 @@
+import re
+import json
+import time
+import array
+import threading
+from collections import OrderedDict
+from llama_index.core.retrievers import BaseRetriever # type: ignore
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode # type: ignore
+import database
+import ingest
+import tracing
+
+# --- Configuration ---
+CACHE_DB = "query_cache.db"
+MEMORY_ENTRIES = 256            # per level, in front of the on-disk tables
+EMBEDDING_MAX_ROWS = 5000
+EMBEDDING_TTL = 30 * 24 * 3600  # embeddings only change with the model, which is part of the key
+RETRIEVAL_MAX_ROWS = 2000
+RETRIEVAL_TTL = 24 * 3600
+PRUNE_EVERY = 100               # writes between on-disk eviction passes
+
+_initialized = False
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def init_cache():
+    global _initialized
+    if _initialized: return
+    with database.transaction(CACHE_DB) as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT, query TEXT, embedding BLOB, created_at REAL, used_at REAL, PRIMARY KEY (model, query)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS retrievals (
+                model TEXT, query TEXT, version TEXT, top_k INTEGER, nodes TEXT, created_at REAL, used_at REAL,
+                PRIMARY KEY (model, query, version, top_k)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_query_embeddings_used_at ON query_embeddings (used_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_retrievals_used_at ON retrievals (used_at)")
+    _initialized = True
+
+
+def normalize_query(text):
+    return re.sub(r"\s+", " ", text.strip().lower()).rstrip("?!. ")
+
+
+def serialize_nodes(nodes):
+    return json.dumps([{"node": n.node.to_dict(), "score": n.score} for n in nodes])
+
+
+def deserialize_nodes(data):
+    return [NodeWithScore(node=TextNode.from_dict(item["node"]), score=item["score"]) for item in json.loads(data)]
+
+
+class QueryCache:
+    """Two-level cache for RAG lookups: query text -> embedding, and (query, collection version) -> nodes.
+
+    Each level is an in-memory LRU backed by a SQLite table with TTL and size limits, so entries
+    survive restarts. Retrieval results are keyed on ingest's collection version, so any change to
+    the index makes older results unreachable; they age out in the next prune.
+    """
+
+    def __init__(self, model_name, path=CACHE_DB):
+        self.model_name = model_name
+        self.path = path
+        self._memory = {"embedding": OrderedDict(), "retrieval": OrderedDict()}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats = {level: {"hits": 0, "misses": 0, "miss_s": 0.0} for level in self._memory}
+        init_cache()
+
+    # --- Levels ---
+    def get_embedding(self, query, compute):
+        """Returns (embedding, hit); `compute()` embeds the query on a miss."""
+        key = (self.model_name, normalize_query(query))
+        def load():
+            conn = database.get_connection(self.path)
+            row = conn.execute("SELECT embedding, created_at FROM query_embeddings WHERE model = ? AND query = ?", key).fetchone()
+            if row and time.time() - row[1] < EMBEDDING_TTL:
+                with conn: conn.execute("UPDATE query_embeddings SET used_at = ? WHERE model = ? AND query = ?", (time.time(), *key))
+                return array.array('f', row[0]).tolist()
+        def store(embedding):
+            now = time.time()
+            return ("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?, ?)",
+                    (*key, array.array('f', embedding).tobytes(), now, now))
+        return self._get("embedding", key, load, compute, store)
+
+    def get_retrieval(self, query, version, top_k, compute):
+        """Returns (nodes, hit); `compute()` runs the vector search on a miss."""
+        key = (self.model_name, normalize_query(query), version, top_k)
+        def load():
+            conn = database.get_connection(self.path)
+            row = conn.execute("SELECT nodes, created_at FROM retrievals WHERE model = ? AND query = ? AND version = ? AND top_k = ?",
+                               key).fetchone()
+            if row and time.time() - row[1] < RETRIEVAL_TTL:
+                with conn: conn.execute("UPDATE retrievals SET used_at = ? WHERE model = ? AND query = ? AND version = ? AND top_k = ?",
+                                        (time.time(), *key))
+                return deserialize_nodes(row[0])
+        def store(nodes):
+            now = time.time()
+            return "INSERT OR REPLACE INTO retrievals VALUES (?, ?, ?, ?, ?, ?, ?)", (*key, serialize_nodes(nodes), now, now)
+        return self._get("retrieval", key, load, compute, store)
+
+    def _get(self, level, key, load, compute, store):
+        memory, stats = self._memory[level], self.stats[level]
+        with self._lock:
+            if key in memory:
+                memory.move_to_end(key)
+                stats["hits"] += 1
+                return memory[key], True
+        value = load()
+        hit = value is not None
+        if not hit:
+            started = time.perf_counter()
+            value = compute()
+            elapsed = time.perf_counter() - started
+            sql, params = store(value)
+            with database.transaction(self.path) as cursor:
+                cursor.execute(sql, params)
+            self._writes += 1
+            if self._writes % PRUNE_EVERY == 0: self.prune()
+        with self._lock:
+            if hit:
+                stats["hits"] += 1
+            else:
+                stats["misses"] += 1
+                stats["miss_s"] += elapsed
+            memory[key] = value
+            if len(memory) > MEMORY_ENTRIES: memory.popitem(last=False)
+        return value, hit
+
+    # --- Maintenance ---
+    def prune(self):
+        """Drops expired rows, results for older collection versions, and the least recently used overflow."""
+        now, version = time.time(), ingest.get_collection_version()
+        with database.transaction(self.path) as cursor:
+            cursor.execute("DELETE FROM query_embeddings WHERE created_at < ?", (now - EMBEDDING_TTL,))
+            cursor.execute("DELETE FROM retrievals WHERE created_at < ? OR version != ?", (now - RETRIEVAL_TTL, version))
+            for table, max_rows in (("query_embeddings", EMBEDDING_MAX_ROWS), ("retrievals", RETRIEVAL_MAX_ROWS)):
+                cursor.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                               (max_rows,))
+
+    def summary(self):
+        """Hit rate and estimated time saved per level (hits x average cost of a miss)."""
+        result = {}
+        with self._lock:
+            for level, stats in self.stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                avg_miss = stats["miss_s"] / stats["misses"] if stats["misses"] else 0.0
+                result[level] = {"hits": stats["hits"], "misses": stats["misses"],
+                                 "hit_rate": round(stats["hits"] / lookups, 3) if lookups else None,
+                                 "saved_s": round(stats["hits"] * avg_miss, 3)}
+        return result
+
+
+class CachedRetriever(BaseRetriever):
+    """Wraps a vector index retriever with a QueryCache, keyed on the collection version."""
+
+    def __init__(self, retriever, embed_model, cache, top_k):
+        super().__init__()
+        self._retriever = retriever
+        self._embed_model = embed_model
+        self._cache = cache
+        self._top_k = top_k
+
+    def _retrieve(self, query_bundle):
+        query = query_bundle.query_str
+        embedding_hit = None
+        def embed():
+            with tracing.span("retrieval.embed_query"):
+                return self._embed_model.get_query_embedding(query)
+        def search():
+            nonlocal embedding_hit
+            embedding, embedding_hit = self._cache.get_embedding(query, embed)
+            # With the embedding supplied, the vector retriever skips its own embed call
+            with tracing.span("retrieval.search"):
+                return self._retriever.retrieve(QueryBundle(query_str=query, embedding=embedding))
+        with tracing.span("retrieval") as retrieval_span:
+            nodes, hit = self._cache.get_retrieval(query, ingest.get_collection_version(), self._top_k, search)
+            # Hit rates and time saved are aggregated by summary(), shown on the diagnostics page
+            retrieval_span.set(cache_hit=hit, embedding_cache_hit=embedding_hit, nodes=len(nodes))
+        return nodes
+
+
+def start_cache(model_name):
+    """Returns the process-wide cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None: _cache = QueryCache(model_name)
+        return _cache
+
+def get_cache():
+    """The process-wide cache, or None if the app has not started one."""
+    return _cache
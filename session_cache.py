@@ -0,0 +1,72 @@
+import time
+import threading
+from collections import OrderedDict
+
+# --- Configuration ---
+MAX_ENTRIES = 16            # live chat engines / agents across all browser sessions
+IDLE_SECONDS = 30 * 60      # entries unused this long are dropped on the next lookup
+
+
+class SessionCache:
+    """LRU of per-conversation objects (chat engines, agents) kept alive across Streamlit reruns.
+
+    Entries are keyed by (conversation, kind, model, keep_alive); least recently used entries are evicted
+    beyond `max_entries`, and entries idle for `idle_seconds` are swept on every lookup.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, idle_seconds=IDLE_SECONDS):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._entries = OrderedDict()  # key -> (value, last used)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, factory):
+        """Returns the cached value for `key`, creating it with `factory()` on a miss."""
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            if key in self._entries:
+                value, _ = self._entries.pop(key)
+                self.stats["hits"] += 1
+            else:
+                value = factory()
+                self.stats["misses"] += 1
+            self._entries[key] = (value, now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            return value
+
+    def discard(self, conversation):
+        """Drops every entry belonging to a conversation (e.g. after it was deleted)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == conversation]:
+                del self._entries[key]
+
+    def _evict_idle(self, now):
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.idle_seconds: break
+            del self._entries[key]
+            self.stats["evictions"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def sync_memory(memory, messages, to_chat_message):
+    """Brings a chat memory in line with a transcript, converting only the messages it lacks.
+
+    The engines write each turn to their own memory, so normally there is nothing to add. If the
+    memory no longer matches the transcript's prefix it is rebuilt from scratch.
+    """
+    stored = memory.get_all()
+    n = len(stored)
+    # Comparing both ends of the stored prefix catches a transcript whose window has moved on
+    if n <= len(messages) and (n == 0 or (stored[0].content == messages[0]["content"]
+                                          and stored[-1].content == messages[n - 1]["content"])):
+        for message in messages[n:]:
+            memory.put(to_chat_message(message))
+    else:
+        memory.set([to_chat_message(message) for message in messages])
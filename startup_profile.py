@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# --- Configuration ---
+REPORT_PATH = "startup_report.json"
+APP_SCRIPT = "jarvis_app.py"
+# Imported by the app where they are first used; none of them should be loaded when the chat UI first paints
+HEAVY_MODULES = (
+    "llama_index.core", "llama_index.llms.ollama", "llama_index.embeddings.ollama", "llama_index.vector_stores.chroma",
+    "chromadb", "ollama", "googleapiclient.discovery", "google_auth_oauthlib.flow",
+)
+FIRST_PAINT_BUDGET_MS = 1000.0  # cold first paint allowed by the command line check
+
+_run_started = None
+_report = None
+
+
+# --- In-App Timing ---
+def begin_run():
+    """Marks the start of a script run. The app calls it before its own imports."""
+    global _run_started
+    _run_started = time.perf_counter()
+
+def first_paint():
+    """Marks the chat UI as on screen. The first run in a process is the cold start and is written to REPORT_PATH."""
+    global _report
+    if _run_started is None: return
+    elapsed_ms = round((time.perf_counter() - _run_started) * 1000, 1)
+    if _report is None:
+        _report = {"cold_first_paint_ms": elapsed_ms, "heavy_modules_loaded": loaded_heavy_modules(), "recorded_at": time.time()}
+        print(f"First paint after {elapsed_ms:.0f} ms" + (f"; already loaded: {', '.join(_report['heavy_modules_loaded'])}"
+                                                          if _report["heavy_modules_loaded"] else ""))
+        try:
+            with open(REPORT_PATH, 'w', encoding='utf-8') as f: json.dump(_report, f, indent=2)
+        except OSError as e:
+            print(f"Could not write {REPORT_PATH}: {e}")
+    _report["last_first_paint_ms"] = elapsed_ms
+
+def get_report():
+    """This process's first paint timings, or None before the chat page has been drawn."""
+    return _report
+
+def loaded_heavy_modules():
+    return [module for module in HEAVY_MODULES if module in sys.modules]
+
+
+# --- Command Line Report ---
+def measure_import(module):
+    """Seconds a fresh interpreter takes to import `module`, or None if it cannot be imported."""
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0: return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure_first_paint(timeout):
+    """Runs the app once, headless, in a fresh interpreter and returns the report its first paint wrote."""
+    if os.path.exists(REPORT_PATH): os.remove(REPORT_PATH)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), APP_SCRIPT)
+    code = f"from streamlit.testing.v1 import AppTest; AppTest.from_file({script!r}, default_timeout={timeout}).run()"
+    subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    try:
+        with open(REPORT_PATH, 'r', encoding='utf-8') as f: return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import times and the app's cold time to first paint.")
+    parser.add_argument("--budget-ms", type=float, default=FIRST_PAINT_BUDGET_MS, help="Fail if the cold first paint takes longer.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds the headless app run may take.")
+    args = parser.parse_args()
+
+    print(f"{'module':<36} {'cold import ms':>15}")
+    for module in HEAVY_MODULES:
+        elapsed = measure_import(module)
+        print(f"{module:<36} {'not installed' if elapsed is None else f'{elapsed * 1000:.0f}':>15}")
+
+    report = measure_first_paint(args.timeout)
+    if report is None:
+        print(f"\nThe app did not reach its first paint; run `streamlit run {APP_SCRIPT}` to see why.")
+        sys.exit(1)
+    print(f"\nCold first paint: {report['cold_first_paint_ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if report["heavy_modules_loaded"]:
+        print(f"Loaded before the first paint: {', '.join(report['heavy_modules_loaded'])}")
+    if report["cold_first_paint_ms"] > args.budget_ms or report["heavy_modules_loaded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
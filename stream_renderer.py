@@ -0,0 +1,46 @@
+import time
+
+# --- Configuration ---
+RENDER_INTERVAL = 0.05      # redraw the message at most this often while tokens arrive...
+RENDER_MAX_CHARS = 2000     # ...or as soon as this much new text is waiting, whichever comes first
+CURSOR = "▌"
+
+
+def render_stream(tokens, placeholder, interval=RENDER_INTERVAL, max_chars=RENDER_MAX_CHARS):
+    """Streams tokens into a Streamlit placeholder and returns (full text, stats).
+
+    Redrawing re-sends the whole message, so doing it per token is quadratic in the reply
+    length. Tokens are buffered in a list and the placeholder is redrawn on a time or size
+    budget instead, which caps renders at about 1 / `interval` per second.
+    """
+    parts = []
+    stats = {"tokens": 0, "renders": 0, "render_s": 0.0, "ttft_s": None}
+    started = last_render = time.perf_counter()
+    pending_chars = 0
+
+    def render(text):
+        render_started = time.perf_counter()
+        placeholder.markdown(text)
+        stats["renders"] += 1
+        stats["render_s"] += time.perf_counter() - render_started
+
+    for token in tokens:
+        if not token: continue
+        now = time.perf_counter()
+        if stats["ttft_s"] is None: stats["ttft_s"] = now - started
+        parts.append(token)
+        stats["tokens"] += 1
+        pending_chars += len(token)
+        if now - last_render >= interval or pending_chars >= max_chars:
+            render("".join(parts) + CURSOR)
+            last_render, pending_chars = time.perf_counter(), 0
+    full_text = "".join(parts)
+    render(full_text)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    stats["elapsed_s"] = elapsed
+    stats["tokens_per_s"] = stats["tokens"] / elapsed
+    stats["renders_per_s"] = stats["renders"] / elapsed
+    print(f"Streamed {stats['tokens']} tokens in {elapsed:.2f}s ({stats['tokens_per_s']:.1f} tok/s) with "
+          f"{stats['renders']} renders ({stats['renders_per_s']:.1f}/s, {stats['render_s'] * 1000:.0f} ms rendering)")
+    return full_text, stats
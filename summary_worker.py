@@ -0,0 +1,63 @@
+import time
+import threading
+import database
+import tracing
+import context_window
+
+
+class SummaryWorker:
+    """Folds old turns into a session's rolling summary on a background thread, after the reply is shown.
+
+    Requests for the same session are coalesced: a newer request starts from the same stored summary
+    and folds at least as many messages, so it replaces a pending one. A result that covers fewer
+    messages than the session's latest summary is dropped.
+    """
+
+    def __init__(self, generate):
+        self.generate = generate  # prompt -> text, or None on failure
+        self._cond = threading.Condition()
+        self._pending = {}    # session_id -> (summary, summary_count, messages to fold)
+        self.summaries = {}   # session_id -> latest (summary, summary_count), read by the UI on its next rerun
+        self.stats = {"requested": 0, "generated": 0, "failed": 0, "total_s": 0.0}
+        self._thread = threading.Thread(target=self.run, name="summary-worker", daemon=True)
+        self._thread.start()
+
+    def request(self, session_id, summary, summary_count, to_fold):
+        with self._cond:
+            self.stats["requested"] += 1
+            self._pending[session_id] = (summary, summary_count, list(to_fold))
+            self._cond.notify()
+
+    def discard(self, session_id):
+        """Forgets a session, e.g. once it was deleted."""
+        with self._cond:
+            self._pending.pop(session_id, None)
+            self.summaries.pop(session_id, None)
+
+    def _next_job(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            session_id = next(iter(self._pending))
+            return (session_id, *self._pending.pop(session_id))
+
+    def run(self):
+        while True:
+            session_id, summary, summary_count, to_fold = self._next_job()
+            started = time.monotonic()
+            with tracing.span("summary.generate", session_id=session_id, messages=len(to_fold)):
+                new_summary = self.generate(context_window.build_summary_prompt(summary, to_fold))
+            with self._cond:
+                self.stats["total_s"] += time.monotonic() - started
+                if not new_summary:
+                    self.stats["failed"] += 1
+                    continue
+                result = (new_summary, summary_count + len(to_fold))
+                if result[1] <= self.summaries.get(session_id, (None, 0))[1]: continue
+                try:
+                    database.save_session_summary(session_id, *result)
+                except Exception as e:
+                    print(f"Failed to save the summary for session {session_id}: {e}")
+                    continue
+                self.summaries[session_id] = result
+                self.stats["generated"] += 1
@@ -0,0 +1,49 @@
+import intent_router
+
+
+class DownEmbedModel:
+    """Stands in for an embedding server that cannot be reached."""
+    model_name = "down"
+
+    def get_text_embedding(self, text):
+        raise ConnectionError("embedding server unavailable")
+
+    def get_text_embedding_batch(self, texts):
+        raise ConnectionError("embedding server unavailable")
+
+
+class PrototypeEmbedModel:
+    """One-hot embedding of the intent a prototype belongs to; any other text embeds as plain chat."""
+    model_name = "prototypes"
+
+    def get_text_embedding(self, text):
+        intents = list(intent_router.PROTOTYPES)
+        owner = next((i for i, examples in intent_router.PROTOTYPES.items() if text in examples), intent_router.CHAT_INTENT)
+        return [1.0 if intent == owner else 0.0 for intent in intents]
+
+    def get_text_embedding_batch(self, texts):
+        return [self.get_text_embedding(text) for text in texts]
+
+
+def test_router_builds_and_falls_back_to_keywords_when_embedding_fails(tmp_path):
+    cache_path = tmp_path / "prototypes.json"
+    router = intent_router.IntentRouter(DownEmbedModel(), cache_path=str(cache_path), verbose=False)
+
+    intents, confidence = router.route("Check my calendar for tomorrow")
+    assert set(intents) == set(intent_router.PROTOTYPES) - {intent_router.CHAT_INTENT}
+    assert confidence == 0.0
+    assert router.route("Tell me a joke") == ([], 0.0)
+    assert router.stats["fallbacks"] == 2
+    assert not cache_path.exists()
+
+
+def test_router_loads_prototypes_once_the_embedding_server_is_back(tmp_path):
+    cache_path = tmp_path / "prototypes.json"
+    router = intent_router.IntentRouter(DownEmbedModel(), cache_path=str(cache_path), verbose=False)
+    router.route("Show me my tasks.")
+
+    router.embed_model = PrototypeEmbedModel()
+    intents, _ = router.route("Show me my tasks.")
+    assert intents == ["list_google_tasks"]
+    assert router.stats["fallbacks"] == 1
+    assert cache_path.exists()
@@ -0,0 +1,98 @@
+import time
+import hashlib
+import threading
+import database
+import tracing
+
+# --- Configuration ---
+TITLE_DEBOUNCE_SECONDS = 5.0    # a session's title is regenerated once it has been quiet this long
+TITLE_PREFIX_MESSAGES = 6       # only the start of a conversation decides its title...
+TITLE_MESSAGE_CHARS = 400       # ...and each of those messages is cut to this length
+
+
+def build_title_prompt(transcript):
+    return ("Create a 3-7 word title for this conversation. Do not respond with any fillers. Do not use multiple lines "
+            f"or any formatting option. Respond only with the title.\n\n{transcript}")
+
+
+def title_transcript(messages):
+    """The bounded transcript prefix a title is generated from."""
+    return "\n".join(f"<{m['role']}>: {m['content'][:TITLE_MESSAGE_CHARS]}" for m in messages[:TITLE_PREFIX_MESSAGES])
+
+
+def clean_title(text):
+    return text.strip().split("\n")[0].strip().strip('"*#`').strip()
+
+
+class TitleWorker:
+    """Generates chat titles on a background thread so replies are never held up by them.
+
+    Requests for the same session are coalesced and only acted on after TITLE_DEBOUNCE_SECONDS
+    of quiet. Because a title only looks at a bounded prefix of the transcript, a session whose
+    prefix has already been titled is skipped without calling the model.
+    """
+
+    def __init__(self, generate):
+        self.generate = generate  # prompt -> text, or None on failure
+        self._cond = threading.Condition()
+        self._pending = {}  # session_id -> (transcript, digest, due time)
+        self._titled = {}   # session_id -> digest of the transcript its current title came from
+        self._locked = set()
+        self.titles = {}    # session_id -> latest generated title, read by the UI on its next rerun
+        self.stats = {"requested": 0, "generated": 0, "skipped": 0, "failed": 0, "total_s": 0.0}
+        self._thread = threading.Thread(target=self.run, name="title-worker", daemon=True)
+        self._thread.start()
+
+    def request(self, session_id, messages):
+        transcript = title_transcript(messages)
+        digest = hashlib.sha1(transcript.encode("utf-8")).hexdigest()
+        with self._cond:
+            self.stats["requested"] += 1
+            if session_id in self._locked or self._titled.get(session_id) == digest:
+                self.stats["skipped"] += 1
+                return
+            self._pending[session_id] = (transcript, digest, time.monotonic() + TITLE_DEBOUNCE_SECONDS)
+            self._cond.notify()
+
+    def lock(self, session_id):
+        """Stops generating titles for a session, e.g. once the user renamed or deleted it."""
+        with self._cond:
+            self._locked.add(session_id)
+            self._pending.pop(session_id, None)
+            self.titles.pop(session_id, None)
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._pending:
+                    session_id, (transcript, digest, due) = min(self._pending.items(), key=lambda item: item[1][2])
+                    wait = due - time.monotonic()
+                    if wait <= 0:
+                        del self._pending[session_id]
+                        return session_id, transcript, digest
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def run(self):
+        while True:
+            session_id, transcript, digest = self._next_job()
+            started = time.monotonic()
+            with tracing.span("title.generate", session_id=session_id):
+                title = self.generate(build_title_prompt(transcript))
+            title = clean_title(title) if title else None
+            with self._cond:
+                self.stats["total_s"] += time.monotonic() - started
+                if not title:
+                    self.stats["failed"] += 1
+                    continue
+                # The user may have renamed the chat while the model was running
+                if session_id in self._locked: continue
+                try:
+                    database.rename_chat_session(session_id, title)
+                except Exception as e:
+                    print(f"Failed to save generated title for session {session_id}: {e}")
+                    continue
+                self._titled[session_id] = digest
+                self.titles[session_id] = title
+                self.stats["generated"] += 1
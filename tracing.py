@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import argparse
+import functools
+import contextvars
+import statistics
+
+# --- Configuration ---
+TRACE_DB = "traces.db"
+TRACE_ENABLED = os.environ.get("JARVIS_TRACE", "0") == "1"  # can also be switched at runtime from the diagnostics page
+TRACE_RETENTION = 7 * 24 * 3600
+PRUNE_EVERY = 200           # traces written between retention passes
+
+_enabled = TRACE_ENABLED
+_current = contextvars.ContextVar("jarvis_current_span", default=None)
+_initialized = False
+_traces_written = 0
+
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+def is_enabled():
+    return _enabled
+
+
+# --- Spans ---
+class Span:
+    """A timed stage. The outermost span of a context is the trace root; its children are buffered
+    on it and written to TRACE_DB in one transaction when the root ends."""
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start", "_started", "_token", "_buffer")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs = name, attrs
+
+    def __enter__(self):
+        parent = _current.get()
+        self.span_id = os.urandom(8).hex()
+        if parent is None:
+            self.trace_id, self.parent_id, self._buffer = self.span_id, None, []
+        else:
+            self.trace_id, self.parent_id, self._buffer = parent.trace_id, parent.span_id, parent._buffer
+        self.start, self._started = time.time(), time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        _current.reset(self._token)
+        if exc_type is not None: self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self._buffer.append(_row(self.trace_id, self.span_id, self.parent_id, self.name, self.start, duration,
+                                 "ok" if exc_type is None else "error", self.attrs))
+        if self.parent_id is None: _write(self._buffer)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+
+class _NullSpan:
+    """Returned while tracing is off, so an instrumented block costs one flag check."""
+    start = 0.0
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+    def set(self, **attrs): return self
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, **attrs):
+    """Times a `with` block as a child of the current span, or as a new trace if there is none."""
+    return Span(name, attrs) if _enabled else NULL_SPAN
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, duration_s, start=None, **attrs):
+    """Adds an already measured stage (e.g. time to first token) under the current span."""
+    parent = _current.get()
+    if not _enabled or parent is None or duration_s is None: return
+    start = start if start is not None else time.time() - duration_s
+    parent._buffer.append(_row(parent.trace_id, os.urandom(8).hex(), parent.span_id, name, start, duration_s, "ok", attrs))
+
+def bind(fn):
+    """Runs `fn` in the current trace when it is called on another thread (e.g. a thread pool)."""
+    if not _enabled or _current.get() is None: return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+def _row(trace_id, span_id, parent_id, name, start, duration_s, status, attrs):
+    return (trace_id, span_id, parent_id, name, start, duration_s * 1000, status, json.dumps(attrs, default=str) if attrs else None)
+
+
+# --- Trace Store ---
+def init_store():
+    global _initialized
+    if _initialized: return
+    import database  # database is instrumented with this module, so it is imported late
+    with database.get_connection(TRACE_DB) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS spans (
+                trace_id TEXT NOT NULL, span_id TEXT NOT NULL, parent_id TEXT, name TEXT NOT NULL,
+                start REAL NOT NULL, duration_ms REAL NOT NULL, status TEXT NOT NULL, attrs TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_start ON spans (start)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_spans_roots ON spans (parent_id, name, start)")
+    _initialized = True
+
+def _write(rows):
+    """Stores a finished trace. Tracing must never break the traced code, so errors are only printed."""
+    global _traces_written
+    import database
+    try:
+        init_store()
+        with database.transaction(TRACE_DB) as cursor:
+            cursor.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        _traces_written += 1
+        if _traces_written % PRUNE_EVERY == 0: prune()
+    except Exception as e:
+        print(f"Could not write trace: {e}")
+
+def prune(max_age=TRACE_RETENTION):
+    import database
+    init_store()
+    with database.get_connection(TRACE_DB) as conn:
+        conn.execute("DELETE FROM spans WHERE start < ?", (time.time() - max_age,))
+
+def clear():
+    import database
+    init_store()
+    with database.get_connection(TRACE_DB) as conn:
+        conn.execute("DELETE FROM spans")
+
+
+# --- Queries ---
+def root_names():
+    import database
+    init_store()
+    rows = database.get_connection(TRACE_DB).execute("SELECT DISTINCT name FROM spans WHERE parent_id IS NULL ORDER BY name").fetchall()
+    return [name for (name,) in rows]
+
+def recent_traces(name=None, limit=50):
+    """Returns [(trace_id, name, start, duration_ms, attrs)] for the newest traces, optionally of one kind."""
+    import database
+    init_store()
+    sql = "SELECT trace_id, name, start, duration_ms, attrs FROM spans WHERE parent_id IS NULL"
+    params = ()
+    if name is not None:
+        sql, params = sql + " AND name = ?", (name,)
+    rows = database.get_connection(TRACE_DB).execute(sql + " ORDER BY start DESC LIMIT ?", (*params, limit)).fetchall()
+    return [(trace_id, name, start, duration, json.loads(attrs) if attrs else {}) for trace_id, name, start, duration, attrs in rows]
+
+def get_trace(trace_id):
+    """Returns a trace's spans in start order as dicts with their depth and offset from the root."""
+    import database
+    init_store()
+    rows = database.get_connection(TRACE_DB).execute(
+        "SELECT span_id, parent_id, name, start, duration_ms, status, attrs FROM spans WHERE trace_id = ? ORDER BY start, rowid DESC",
+        (trace_id,)).fetchall()
+    if not rows: return []
+    root_start = min(row[3] for row in rows if row[1] is None) if any(row[1] is None for row in rows) else rows[0][3]
+    parents = {row[0]: row[1] for row in rows}
+    def depth(span_id):
+        parent_id = parents.get(span_id)
+        return 0 if parent_id is None else depth(parent_id) + 1
+    spans = []
+    for span_id, parent_id, name, start, duration, status, attrs in rows:
+        spans.append({"span_id": span_id, "parent_id": parent_id, "name": name, "depth": depth(span_id),
+                      "offset_ms": (start - root_start) * 1000, "duration_ms": duration, "status": status,
+                      "attrs": json.loads(attrs) if attrs else {}})
+    return spans
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def stage_stats(since=None):
+    """Returns per-stage latency stats (count, p50, p95, max in ms) for spans started after `since`."""
+    import database
+    init_store()
+    rows = database.get_connection(TRACE_DB).execute(
+        "SELECT name, duration_ms FROM spans WHERE start >= ? ORDER BY name", (since or 0,)).fetchall()
+    durations = {}
+    for name, duration in rows:
+        durations.setdefault(name, []).append(duration)
+    stats = []
+    for name, values in durations.items():
+        values.sort()
+        stats.append({"stage": name, "count": len(values), "p50_ms": round(statistics.median(values), 2),
+                      "p95_ms": round(percentile(values, 0.95), 2), "max_ms": round(values[-1], 2)})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise or export recorded JARVIS traces.")
+    parser.add_argument("--hours", type=float, default=24.0, help="Only consider spans from this many hours back.")
+    parser.add_argument("--export", metavar="PATH", help="Write the spans as JSON lines instead of printing stats.")
+    args = parser.parse_args()
+    since = time.time() - args.hours * 3600
+    if args.export:
+        import database
+        init_store()
+        rows = database.get_connection(TRACE_DB).execute(
+            "SELECT trace_id, span_id, parent_id, name, start, duration_ms, status, attrs FROM spans WHERE start >= ? ORDER BY start",
+            (since,)).fetchall()
+        with open(args.export, 'w', encoding='utf-8') as f:
+            for trace_id, span_id, parent_id, name, start, duration, status, attrs in rows:
+                f.write(json.dumps({"trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "name": name, "start": start,
+                                    "duration_ms": duration, "status": status, "attrs": json.loads(attrs) if attrs else {}}) + "\n")
+        print(f"Exported {len(rows)} span(s) to {args.export}")
+        return
+    stats = stage_stats(since)
+    if not stats:
+        print("No spans recorded. Start the app with JARVIS_TRACE=1 or enable tracing on the diagnostics page.")
+        return
+    print(f"{'stage':<36} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for row in sorted(stats, key=lambda row: -row["p95_ms"]):
+        print(f"{row['stage']:<36} {row['count']:>7} {row['p50_ms']:>10.2f} {row['p95_ms']:>10.2f} {row['max_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import argparse
+import threading
+import ingest
+
+try:
+    from watchdog.observers import Observer # type: ignore
+    from watchdog.events import FileSystemEventHandler # type: ignore
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# --- Configuration ---
+DEBOUNCE_SECONDS = 1.5      # apply a batch once the vault has been quiet this long...
+MAX_BATCH_DELAY = 10.0      # ...or once its oldest event is this old, even during a steady stream
+POLL_INTERVAL = 2.0         # stat scan interval when watchdog/inotify is unavailable
+MAX_PENDING_PATHS = 1000    # beyond this, forget individual paths and do one full rescan
+RETRY_BASE_DELAY = 2.0      # a failed batch is retried after this, doubling per consecutive failure...
+RETRY_MAX_DELAY = 300.0     # ...up to this
+WATCH_STATUS_PATH = "./watch_status.json"
+
+
+def is_vault_file(path):
+    return path.endswith(ingest.SUPPORTED_EXTENSIONS)
+
+
+class VaultWatcher:
+    """Coalesces vault file events and applies them to the index in debounced batches.
+
+    Event sources (inotify via watchdog, or the polling fallback) only call `notify`;
+    the main loop sleeps on a condition until there is something to apply, so an idle
+    vault costs no CPU beyond the event source itself.
+    """
+
+    def __init__(self, collection=None, embed_model=None):
+        self.collection = collection if collection is not None else ingest.open_collection()
+        self.embed_model = embed_model if embed_model is not None else ingest.get_embed_model()
+        self._cond = threading.Condition()
+        self._pending = {}  # path -> monotonic time of its first unapplied event
+        self._full_rescan_since = None
+        self._last_event = 0.0
+        self._retry_at = 0.0
+        self._failures = 0
+        self._stop = False
+        self.stats = {"batches": 0, "files": 0, "last_lag_s": None, "max_lag_s": 0.0, "total_lag_s": 0.0,
+                      "pending": 0, "mode": None, "updated_at": None}
+
+    def notify(self, path=None):
+        """Records a change to `path`; None (or a directory) means something changed that needs a rescan."""
+        now = time.monotonic()
+        with self._cond:
+            if path is None or len(self._pending) >= MAX_PENDING_PATHS:
+                # Bounded memory: a flood of events collapses into a single full rescan
+                if self._full_rescan_since is None: self._full_rescan_since = min(self._pending.values(), default=now)
+                self._pending.clear()
+            elif self._full_rescan_since is None:
+                self._pending.setdefault(path, now)
+            self._last_event = now
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def _next_batch(self):
+        """Blocks until a batch is due. Returns (paths or None for a full rescan, oldest event time)."""
+        with self._cond:
+            while not self._stop:
+                if self._pending or self._full_rescan_since is not None:
+                    oldest = self._full_rescan_since or min(self._pending.values())
+                    now = time.monotonic()
+                    wait = max(min(self._last_event + DEBOUNCE_SECONDS, oldest + MAX_BATCH_DELAY), self._retry_at) - now
+                    if wait <= 0:
+                        paths = None if self._full_rescan_since is not None else list(self._pending)
+                        self._pending, self._full_rescan_since = {}, None
+                        return paths, oldest
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return None, None
+
+    def apply(self, paths):
+        if paths is None:
+            ingest.run_ingestion(collection=self.collection, embed_model=self.embed_model)
+            return
+        existing = [p for p in paths if os.path.isfile(p)]
+        removed = [p for p in paths if not os.path.exists(p)]
+        if removed: ingest.remove_paths(removed, self.collection)
+        if existing: ingest.ingest_paths(existing, self.collection, self.embed_model)
+
+    def run(self):
+        while True:
+            paths, oldest = self._next_batch()
+            if oldest is None: return
+            try:
+                self.apply(paths)
+            except Exception as e:
+                self._requeue(paths, oldest, e)
+                continue
+            self._failures = 0
+            self._record(len(paths) if paths is not None else None, time.monotonic() - oldest)
+
+    def _requeue(self, paths, oldest, error):
+        """Puts a failed batch back with capped exponential backoff, so a transient Ollama or Chroma error loses nothing."""
+        with self._cond:
+            self._failures += 1
+            delay = min(RETRY_BASE_DELAY * 2 ** (self._failures - 1), RETRY_MAX_DELAY)
+            self._retry_at = time.monotonic() + delay
+            if paths is None or self._full_rescan_since is not None or len(self._pending) + len(paths) > MAX_PENDING_PATHS:
+                self._full_rescan_since = min([oldest, *self._pending.values(), self._full_rescan_since or oldest])
+                self._pending.clear()
+            else:
+                for path in paths:
+                    # Keeps the original event time, so the recorded lag includes the failed attempts
+                    self._pending[path] = min(self._pending.get(path, oldest), oldest)
+        print(f"Watcher failed to apply changes ({error}); retrying in {delay:.0f}s")
+
+    def _record(self, n_files, lag):
+        # Indexing lag: time from the first event of a batch until its changes are searchable
+        self.stats["batches"] += 1
+        self.stats["files"] += n_files or 0
+        self.stats["last_lag_s"] = round(lag, 3)
+        self.stats["max_lag_s"] = round(max(self.stats["max_lag_s"], lag), 3)
+        self.stats["total_lag_s"] += lag
+        with self._cond:
+            self.stats["pending"] = len(self._pending)
+        self.stats["updated_at"] = time.time()
+        print(f"Indexed {n_files if n_files is not None else 'all'} file(s), lag {lag:.2f}s")
+        # Written aside and swapped in, so a reader or a crash never sees a half-written status file
+        tmp_path = f"{WATCH_STATUS_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**self.stats, "avg_lag_s": round(self.stats["total_lag_s"] / self.stats["batches"], 3)}, f, indent=4)
+        os.replace(tmp_path, WATCH_STATUS_PATH)
+
+
+class VaultEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"): return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if not path: continue
+            path = ingest.vault_key(os.fsdecode(path))
+            if event.is_directory:
+                if event.event_type in ("moved", "deleted"): self.watcher.notify(None)
+            elif is_vault_file(path):
+                self.watcher.notify(path)
+
+
+def poll_vault(watcher, interval, stop_event):
+    """Fallback event source: compares stat snapshots of the vault, never reading file contents."""
+    snapshot = {path: (s.st_size, s.st_mtime_ns, s.st_ino) for path, s in ingest.scan_vault(ingest.KNOWLEDGE_VAULT_PATH).items()}
+    while not stop_event.wait(interval):
+        current = {path: (s.st_size, s.st_mtime_ns, s.st_ino) for path, s in ingest.scan_vault(ingest.KNOWLEDGE_VAULT_PATH).items()}
+        for path in current.keys() | snapshot.keys():
+            if current.get(path) != snapshot.get(path): watcher.notify(path)
+        snapshot = current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the JARVIS memory index in sync with the knowledge vault.")
+    parser.add_argument("--poll", action="store_true", help="Use stat polling even if watchdog is installed.")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Polling interval in seconds.")
+    args = parser.parse_args()
+
+    watcher = VaultWatcher()
+    print("Catching up with changes made while the watcher was not running...")
+    ingest.run_ingestion(collection=watcher.collection, embed_model=watcher.embed_model)
+
+    stop_event = threading.Event()
+    if Observer is not None and not args.poll:
+        watcher.stats["mode"] = "inotify"
+        observer = Observer()
+        observer.schedule(VaultEventHandler(watcher), ingest.KNOWLEDGE_VAULT_PATH, recursive=True)
+        observer.start()
+    else:
+        watcher.stats["mode"] = "polling"
+        observer = threading.Thread(target=poll_vault, args=(watcher, args.interval, stop_event), daemon=True)
+        observer.start()
+    print(f"Watching '{ingest.KNOWLEDGE_VAULT_PATH}' ({watcher.stats['mode']}). Press Ctrl+C to stop.")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Stopping watcher...")
+    finally:
+        stop_event.set()
+        if hasattr(observer, "stop"): observer.stop()
+        observer.join()
+
+
+if __name__ == "__main__":
+    main()